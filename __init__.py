@@ -49,6 +49,7 @@ if 'bpy' in locals():
         importlib.reload(utils)
 
 import pluginUtils
+import pluginUtils.cache
 from pluginUtils.manager import AppManagerConn
 from pluginUtils.path import getRoot
 
@@ -128,7 +129,36 @@ class V3D_OT_export():
         exportSettings['lzmaEnabled'] = v3d_export.lzma_enabled
         # basic transcoder module is not available for HTML export
         exportSettings['compressTextures'] = v3d_export.compress_textures if self.export_format != 'HTML' else False
+        # number of toktx processes running simultaneously
+        exportSettings['compressThreads'] = v3d_export.compression_threads or os.cpu_count() or 1
         exportSettings['optimizeAttrs'] = v3d_export.optimize_attrs
+        exportSettings['optimizeMeshes'] = v3d_export.optimize_meshes
+        exportSettings['quantizeMeshes'] = v3d_export.quantize_meshes
+        exportSettings['gpuInstancing'] = v3d_export.gpu_instancing
+        exportSettings['incrementalExport'] = v3d_export.incremental_export
+        # max deviation of generated LOD meshes, relative to the mesh size
+        exportSettings['lodMaxError'] = 0.02
+        # max absolute errors of quantized attributes, positions are measured
+        # in scene units, attributes exceeding the bounds are stored as FLOAT
+        exportSettings['quantizeErrors'] = {
+            'POSITION': 0.0005,
+            'NORMAL': 0.005,
+            'TANGENT': 0.005,
+            'TEXCOORD': 0.0001
+        }
+        # vertex welding engine: 'SORT' compares whole vertex records,
+        # 'HASH' compares their 64-bit hashes (faster on large meshes)
+        exportSettings['weldMethod'] = 'HASH'
+        # worker threads used to build mesh primitives, Blender data is
+        # still captured on the main thread
+        exportSettings['extractThreads'] = os.cpu_count() or 1
+        exportSettings['interleaveAttrs'] = v3d_export.interleave_attrs
+        exportSettings['meshoptCompression'] = v3d_export.meshopt_compression
+        # bit counts of the lossy meshopt filters used for animation data
+        exportSettings['meshoptFilterBits'] = {
+            'QUATERNION': 16,
+            'EXPONENTIAL': 16
+        }
         exportSettings['aaMethod'] = v3d_export.aa_method
         exportSettings['useHDR'] = v3d_export.use_hdr
         exportSettings['useOIT'] = v3d_export.use_oit
@@ -141,7 +171,14 @@ class V3D_OT_export():
             exportSettings['moveKeyframes'] = False
 
         exportSettings['uriCache'] = { 'uri': [], 'blDatablocks': [] }
-        exportSettings['binary'] = bytearray()
+        exportSettings['dedupBuffers'] = v3d_export.dedup_buffers
+        exportSettings['binary'] = pluginUtils.buffer.BinaryBuffer(dedup=exportSettings['dedupBuffers'])
+        # built mesh primitives are kept next to the exported file
+        if v3d_export.cache_meshes:
+            exportSettings['meshCache'] = pluginUtils.cache.FileCache(
+                    os.path.splitext(exportSettings['filepath'])[0] + '.v3dcache')
+        else:
+            exportSettings['meshCache'] = None
         exportSettings['binaryfilename'] = os.path.splitext(os.path.basename(self.filepath))[0] + '.bin'
 
         exportSettings['sneakPeek'] = self.export_sneak_peek
@@ -160,6 +197,10 @@ class V3D_OT_export():
         exportSettings['morph'] = True
         exportSettings['morphNormal'] = True
         exportSettings['morphTangent'] = True
+        # morph target deltas are stored as sparse accessors if less than this
+        # fraction of vertices is affected, smaller deltas are treated as zeros
+        exportSettings['morphSparseThreshold'] = 0.5
+        exportSettings['morphSparseTolerance'] = 1e-5
 
         return gltf2_export.save(self, context, exportSettings)
 
@@ -216,7 +257,7 @@ def disableBuiltInGLTFAddon():
         bpy.types.TOPBAR_MT_file_export.remove(io_scene_gltf2.menu_func_export)
 
 def register():
-    from . import custom_props, custom_ui, manual_map
+    from . import custom_props, custom_ui, gltf2_session, manual_map
 
     AppManagerConn.init(getRoot(), 'BLENDER')
 
@@ -230,6 +271,7 @@ def register():
 
     custom_props.register()
     custom_ui.register()
+    gltf2_session.register()
     manual_map.register()
 
     bpy.types.TOPBAR_MT_file_export.append(menuExportGLTF)
@@ -246,7 +288,7 @@ def register():
 
 
 def unregister():
-    from . import custom_props, custom_ui, manual_map
+    from . import custom_props, custom_ui, gltf2_session, manual_map
 
     bpy.utils.unregister_class(V3D_AddonPreferences)
 
@@ -258,6 +300,7 @@ def unregister():
 
     custom_props.unregister()
     custom_ui.unregister()
+    gltf2_session.unregister()
     manual_map.unregister()
 
     bpy.types.TOPBAR_MT_file_export.remove(menuExportGLTF)
@@ -88,6 +88,16 @@ class V3DExportSettings(bpy.types.PropertyGroup):
         options = NO_ANIM_OPTS
     )
 
+    compression_threads: bpy.props.IntProperty(
+        name = 'Compression Threads',
+        description = ('Number of textures compressed simultaneously, '
+                '0 to use all CPU cores'),
+        default = 0,
+        min = 0,
+        max = 64,
+        options = NO_ANIM_OPTS
+    )
+
     optimize_attrs: bpy.props.BoolProperty(
         name = 'Optimize Mesh Attrs',
         description = 'Remove unused geometry attributes (such as tangents) from exported meshes',
@@ -95,6 +105,66 @@ class V3DExportSettings(bpy.types.PropertyGroup):
         options = NO_ANIM_OPTS
     )
 
+    optimize_meshes: bpy.props.BoolProperty(
+        name = 'Optimize Meshes',
+        description = 'Reorder triangles and vertices for better GPU vertex cache usage, less overdraw and faster vertex fetching',
+        default = False,
+        options = NO_ANIM_OPTS
+    )
+
+    gpu_instancing: bpy.props.BoolProperty(
+        name = 'GPU Instancing',
+        description = ('Merge static objects sharing the same mesh and parent into '
+                'instanced nodes (EXT_mesh_gpu_instancing). Merged objects can\'t '
+                'be accessed individually'),
+        default = False,
+        options = NO_ANIM_OPTS
+    )
+
+    incremental_export: bpy.props.BoolProperty(
+        name = 'Incremental Export',
+        description = ('Keep processed meshes in memory and reuse them in the '
+                'next export if they were not changed'),
+        default = False,
+        options = NO_ANIM_OPTS
+    )
+
+    cache_meshes: bpy.props.BoolProperty(
+        name = 'Cache Meshes',
+        description = 'Store processed mesh data next to the exported file to speed up subsequent exports of unchanged meshes',
+        default = False,
+        options = NO_ANIM_OPTS
+    )
+
+    quantize_meshes: bpy.props.BoolProperty(
+        name = 'Quantize Meshes',
+        description = 'Store vertex positions, normals, tangents and UVs as normalized integers (KHR_mesh_quantization) to reduce mesh size',
+        default = False,
+        options = NO_ANIM_OPTS
+    )
+
+    meshopt_compression: bpy.props.BoolProperty(
+        name = 'Meshopt Compression',
+        description = 'Compress meshes and animations with the meshopt codecs (EXT_meshopt_compression), fast to decode in the browser',
+        default = False,
+        options = NO_ANIM_OPTS
+    )
+
+    interleave_attrs: bpy.props.BoolProperty(
+        name = 'Interleave Mesh Attrs',
+        description = 'Store static vertex attributes (positions, normals, UVs, colors) in a single interleaved buffer for better GPU cache locality',
+        default = False,
+        options = NO_ANIM_OPTS
+    )
+
+    dedup_buffers: bpy.props.BoolProperty(
+        name = 'Deduplicate Buffers',
+        description = ('Store identical accessors and buffer views (e.g. keyframe '
+                'times shared by animations) only once'),
+        default = True,
+        options = NO_ANIM_OPTS
+    )
+
     aa_method: bpy.props.EnumProperty(
         name='Anti-aliasing',
         description = 'Preferred anti-aliasing method',
@@ -411,6 +481,35 @@ class V3DObjectSettings(bpy.types.PropertyGroup):
         options = NO_ANIM_OPTS
     )
 
+    lod_levels: bpy.props.IntProperty(
+        name = 'LOD Levels',
+        description = 'Number of simplified levels of detail generated for this object (MSFT_lod)',
+        default = 0,
+        min = 0,
+        max = 4,
+        options = NO_ANIM_OPTS
+    )
+
+    lod_ratios: bpy.props.FloatVectorProperty(
+        name = 'LOD Ratios',
+        description = 'Target triangle ratios of the LOD levels relative to the original mesh',
+        default = (0.5, 0.25, 0.125, 0.0625),
+        size = 4,
+        min = 0.01,
+        max = 1,
+        options = NO_ANIM_OPTS
+    )
+
+    lod_coverage: bpy.props.FloatProperty(
+        name = 'LOD Screen Coverage',
+        description = ('Screen coverage below which the first LOD level replaces the original mesh, '
+                + 'coverage of other levels is scaled by their ratios'),
+        default = 0.25,
+        min = 0,
+        max = 1,
+        options = NO_ANIM_OPTS
+    )
+
     fix_ortho_zoom: bpy.props.BoolProperty(
         name = 'Fix Ortho Zoom',
         description = ('Apply inverse orthographic camera zoom as scaling factor for this object'),
@@ -99,9 +99,37 @@ class V3D_PT_RenderSettings(bpy.types.Panel, V3DPanel):
         row = layout.row()
         row.prop(v3d_export, 'compress_textures')
 
+        row = layout.row()
+        row.active = v3d_export.compress_textures
+        row.prop(v3d_export, 'compression_threads')
+
         row = layout.row()
         row.prop(v3d_export, 'optimize_attrs')
 
+        row = layout.row()
+        row.prop(v3d_export, 'optimize_meshes')
+
+        row = layout.row()
+        row.prop(v3d_export, 'gpu_instancing')
+
+        row = layout.row()
+        row.prop(v3d_export, 'incremental_export')
+
+        row = layout.row()
+        row.prop(v3d_export, 'cache_meshes')
+
+        row = layout.row()
+        row.prop(v3d_export, 'quantize_meshes')
+
+        row = layout.row()
+        row.prop(v3d_export, 'meshopt_compression')
+
+        row = layout.row()
+        row.prop(v3d_export, 'interleave_attrs')
+
+        row = layout.row()
+        row.prop(v3d_export, 'dedup_buffers')
+
         row = layout.row()
         row.prop(v3d_export, 'aa_method')
 
@@ -393,6 +421,32 @@ class V3D_PT_ObjectSettingsRendering(bpy.types.Panel, V3DPanel):
                 row.prop(v3d, 'fix_ortho_zoom')
 
 
+class V3D_PT_ObjectSettingsLOD(bpy.types.Panel, V3DPanel):
+    bl_label = 'Levels of Detail'
+    bl_parent_id = 'V3D_PT_ObjectSettings'
+
+    poll_datablock = 'object'
+
+    @classmethod
+    def poll(cls, context):
+        return (super().poll(context) and
+                context.object.type in ['MESH', 'CURVE', 'SURFACE', 'META', 'FONT'])
+
+    def draw(self, context):
+        layout = self.layout
+        layout.use_property_split = True
+
+        v3d = context.object.v3d
+
+        row = layout.row()
+        row.prop(v3d, 'lod_levels')
+
+        col = layout.column()
+        col.active = v3d.lod_levels > 0
+        col.prop(v3d, 'lod_ratios')
+        col.prop(v3d, 'lod_coverage')
+
+
 class V3D_PT_ObjectSettingsChildRendering(bpy.types.Panel, V3DPanel):
     bl_label = 'Child Rendering'
     bl_parent_id = 'V3D_PT_ObjectSettings'
@@ -1157,6 +1211,7 @@ def register():
     bpy.utils.register_class(V3D_PT_ObjectSettings)
     bpy.utils.register_class(V3D_PT_ObjectSettingsAnimation)
     bpy.utils.register_class(V3D_PT_ObjectSettingsRendering)
+    bpy.utils.register_class(V3D_PT_ObjectSettingsLOD)
     bpy.utils.register_class(V3D_PT_ObjectSettingsChildRendering)
     bpy.utils.register_class(V3D_PT_ObjectSettingsVisibilityBreakpoints)
     bpy.utils.register_class(V3D_PT_ObjectSettingsFitCameraEdge)
@@ -1210,6 +1265,7 @@ def unregister():
     bpy.utils.unregister_class(V3D_PT_ObjectSettings)
     bpy.utils.unregister_class(V3D_PT_ObjectSettingsAnimation)
     bpy.utils.unregister_class(V3D_PT_ObjectSettingsRendering)
+    bpy.utils.unregister_class(V3D_PT_ObjectSettingsLOD)
     bpy.utils.unregister_class(V3D_PT_ObjectSettingsChildRendering)
     bpy.utils.unregister_class(V3D_PT_ObjectSettingsVisibilityBreakpoints)
     bpy.utils.unregister_class(V3D_PT_ObjectSettingsFitCameraEdge)
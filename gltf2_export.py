@@ -15,7 +15,7 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import bpy
-import json, struct, os, tempfile
+import struct, os, tempfile
 
 import pluginUtils
 from pluginUtils.manager import AppManagerConn
@@ -24,6 +24,7 @@ log = pluginUtils.log.getLogger('V3D-BL')
 
 from .gltf2_filter import *
 from .gltf2_generate import *
+from .gltf2_session import exportSession
 
 
 def prepare(exportSettings):
@@ -33,6 +34,8 @@ def prepare(exportSettings):
     if bpy.context.active_object is not None and bpy.context.active_object.mode != 'OBJECT':
         bpy.ops.object.mode_set(mode='OBJECT')
 
+    exportSession.begin(exportSettings)
+
     filterApply(exportSettings)
 
     exportSettings['originalFrame'] = bpy.context.scene.frame_current
@@ -56,6 +59,11 @@ def finish(exportSettings):
     for bl_image in exportSettings['filteredImages']:
         del bl_image['compression_error_status']
 
+    exportSettings['binary'].close()
+
+    if exportSettings['meshCache'] is not None:
+        exportSettings['meshCache'].prune()
+
     del exportSettings['uriCache']['uri'][:]
     del exportSettings['uriCache']['blDatablocks'][:]
 
@@ -69,6 +77,8 @@ def finish(exportSettings):
 
     bpy.context.scene.frame_set(exportSettings['originalFrame'])
 
+    exportSession.end()
+
 def compressLZMA(path, settings):
 
     if settings['sneakPeek']:
@@ -97,6 +107,7 @@ def save(operator, context, exportSettings):
 
     generateGLTF(operator, context, exportSettings, glTF)
 
+    pluginUtils.gltf.clearEntityIndex(glTF)
     cleanupDataKeys(glTF)
 
     indent = None
@@ -110,20 +121,26 @@ def save(operator, context, exportSettings):
         indent = 4
         separators = separators=(', ', ' : ')
 
-    glTF_encoded = json.dumps(glTF, indent=indent, separators=separators,
-            sort_keys=True, ensure_ascii=False)
-
+    def writeJSON(file, encode=False):
+        """Stream JSON chunks to the file, return the number of written bytes/chars"""
+        size = 0
+        for chunk in pluginUtils.gltf.iterEncodeJSON(glTF, indent, separators):
+            if encode:
+                chunk = chunk.encode()
+            file.write(chunk)
+            size += len(chunk)
+        return size
 
     if exportFormat  == 'ASCII':
         file = open(exportSettings['filepath'], 'w', encoding='utf8', newline='\n')
-        file.write(glTF_encoded)
+        writeJSON(file)
         file.write('\n')
         file.close()
 
         binary = exportSettings['binary']
         if len(binary) > 0:
             file = open(exportSettings['filedirectory'] + exportSettings['binaryfilename'], 'wb')
-            file.write(binary)
+            binary.writeTo(file)
             file.close()
 
         compressLZMA(exportSettings['filepath'], exportSettings)
@@ -138,12 +155,21 @@ def save(operator, context, exportSettings):
         else: # HTML
             file = tempfile.NamedTemporaryFile(delete=False)
 
-        glTF_data = glTF_encoded.encode()
         binary = exportSettings['binary']
 
-        length_gtlf = len(glTF_data)
+        # Header (Version 2), total length is written after the JSON chunk
+        file.write('glTF'.encode())
+        file.write(struct.pack('I', 2))
+        file.write(struct.pack('I', 0))
+
+        # Chunk 0 (JSON), chunk length is patched as well
+        file.write(struct.pack('I', 0))
+        file.write('JSON'.encode())
+
+        length_gtlf = writeJSON(file, encode=True)
         spaces_gltf = (4 - (length_gtlf & 3)) & 3
         length_gtlf += spaces_gltf
+        file.write(b' ' * spaces_gltf)
 
         length_bin = len(binary)
         zeros_bin = (4 - (length_bin & 3)) & 3
@@ -153,25 +179,16 @@ def save(operator, context, exportSettings):
         if length_bin > 0:
             length += 8 + length_bin
 
-        # Header (Version 2)
-        file.write('glTF'.encode())
-        file.write(struct.pack('I', 2))
-        file.write(struct.pack('I', length))
-
-        # Chunk 0 (JSON)
-        file.write(struct.pack('I', length_gtlf))
-        file.write('JSON'.encode())
-        file.write(glTF_data)
-        for i in range(0, spaces_gltf):
-            file.write(' '.encode())
+        file.seek(8)
+        file.write(struct.pack('II', length, length_gtlf))
+        file.seek(0, os.SEEK_END)
 
         # Chunk 1 (BIN)
         if length_bin > 0:
             file.write(struct.pack('I', length_bin))
             file.write('BIN\0'.encode())
-            file.write(binary)
-            for i in range(0, zeros_bin):
-                file.write('\0'.encode())
+            binary.writeTo(file)
+            file.write(bytes(zeros_bin))
 
         file.close()
 
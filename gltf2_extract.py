@@ -18,11 +18,12 @@ import bpy
 import copy
 import mathutils
 import mathutils.geometry
-import math, io, lzma, os, re, tempfile
+import hashlib, math, io, lzma, os, re, tempfile
 
 import pluginUtils
 import pluginUtils as pu
 import pluginUtils.gltf as gltf
+import pluginUtils.meshproc
 
 log = pluginUtils.log.getLogger('V3D-BL')
 
@@ -35,6 +36,10 @@ from profilehooks import profile
 GLTF_MAX_COLORS = 8
 CURVE_DATA_SIZE = 256
 
+# FNV-1a parameters used to hash vertex records
+WELD_HASH_OFFSET = np.uint64(0xcbf29ce484222325)
+WELD_HASH_PRIME = np.uint64(0x100000001b3)
+
 
 def npConvertSwizzleLocation(array):
     # x,y,z -> x,z,-y
@@ -59,6 +64,98 @@ def npNormalizeVecs(vectors):
     norms = np.linalg.norm(vectors, axis=1, keepdims=True)
     np.divide(vectors, norms, out=vectors, where=norms != 0)
 
+def npWeldDots(dots, method='SORT'):
+    """
+    Deduplicate loop records, returns unique records and indices into them.
+
+    SORT - np.unique() over the structured records
+    HASH - np.unique() over 64-bit hashes of the record bytes, unique records
+           keep the order of their first appearance. Falls back to SORT in
+           case of a hash collision.
+    """
+
+    if method == 'HASH' and len(dots) and dots.dtype.itemsize % 4 == 0:
+        words = np.ascontiguousarray(dots).view(np.uint32).reshape(len(dots), -1)
+        # -0.0 is equal to 0.0 for the structured comparison
+        words = np.where(words == 0x80000000, np.uint32(0), words)
+
+        hashes = np.full(len(dots), WELD_HASH_OFFSET, dtype=np.uint64)
+        for column in words.T:
+            hashes ^= column
+            hashes *= WELD_HASH_PRIME
+
+        _, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        # make sure equal hashes mean equal records
+        source = first[inverse]
+        if all(np.array_equal(column[source], column) for column in words.T):
+            order = np.argsort(first)
+            rank = np.empty(len(first), dtype=inverse.dtype)
+            rank[order] = np.arange(len(first))
+            return dots[first[order]], rank[inverse]
+
+        log.warning('Vertex hash collision, welding by sorting')
+
+    return np.unique(dots, return_inverse=True)
+
+def npVertexBones(groupCounts, elemGroups, elemWeights, groupToJoint, neutralJoint,
+        minInfluence=0.0001):
+    """
+    Build per-vertex (joint, weight) tables from flat vertex group elements.
+
+    groupCounts - number of group elements for each vertex
+    elemGroups, elemWeights - group indices/weights of all elements, vertex by vertex
+    groupToJoint - joint index for each vertex group, -1 if the group is not a joint
+
+    Influences are sorted by weight in descending order (stable, like
+    list.sort()), vertices without influences are assigned to the neutral
+    joint. Returns (joints, weights) arrays of shape (vertices, 4 * jointSets)
+    padded with zero joints/weights.
+    """
+
+    numVerts = len(groupCounts)
+
+    elemVerts = np.repeat(np.arange(numVerts), groupCounts)
+
+    # skip weak influences, unknown groups and groups which are not joints
+    keep = (elemWeights > minInfluence) & (elemGroups < len(groupToJoint))
+    elemJoints = np.full(len(elemGroups), -1, dtype=np.int64)
+    elemJoints[keep] = groupToJoint[elemGroups[keep]]
+    keep &= elemJoints >= 0
+
+    elemVerts = elemVerts[keep]
+    elemJoints = elemJoints[keep]
+    elemWeights = elemWeights[keep]
+
+    # CSR layout: elements sorted by vertex, then by weight (descending)
+    order = np.lexsort((-elemWeights, elemVerts))
+    elemVerts = elemVerts[order]
+    elemJoints = elemJoints[order]
+    elemWeights = elemWeights[order]
+
+    counts = np.bincount(elemVerts, minlength=numVerts)
+    indptr = np.zeros(numVerts + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+
+    maxInfluences = max(int(counts.max()) if numVerts else 0, 1)
+    # how many joint sets do we need? 1 set = 4 influences
+    numJointSets = (maxInfluences + 3) // 4
+
+    joints = np.zeros((numVerts, 4 * numJointSets), dtype=np.uint32)
+    weights = np.zeros((numVerts, 4 * numJointSets), dtype=np.float32)
+
+    ranks = np.arange(len(elemVerts)) - indptr[elemVerts]
+    joints[elemVerts, ranks] = elemJoints
+    weights[elemVerts, ranks] = elemWeights
+
+    # is not assigned to any bone, use the joint created later
+    unassigned = counts == 0
+    joints[unassigned, 0] = neutralJoint
+    weights[unassigned, 0] = 1.0
+
+    return joints, weights
+
 def convertSwizzleLocation(loc):
     """
     Converts a location from Blender coordinate system to glTF coordinate system.
@@ -114,322 +211,223 @@ def convertSwizzleMatrix(matrix):
 
     return mat_trans @ mat_rot @ mat_sca
 
-def extractPrimitiveFloor(a, indices, use_tangents):
-    """
-    Shift indices, that the first one starts with 0. It is assumed, that the indices are packed.
-    """
-
-    attributes = {}
-
-    if use_tangents:
-        attributes['TANGENT'] = []
-
-    result_primitive = {
-        'material' : a['material'],
-        'useNodeAttrs' : a['useNodeAttrs'],
-        # 'indices' : [],
-        'attributes' : attributes
-    }
-
-    source_attributes = a['attributes']
-
-
-    texcoord_index = 0
-    process_texcoord = True
-    while process_texcoord:
-        texcoord_id = 'TEXCOORD_' + str(texcoord_index)
-        if source_attributes.get(texcoord_id) is not None:
-            texcoord_index += 1
-        else:
-            process_texcoord = False
+def checkUseNodeAttrs(bl_mat):
+    mat_type = getMaterialType(bl_mat)
 
-    texcoord_max = texcoord_index
+    if mat_type == 'EEVEE':
+        return True
+    else:
+        return False
 
+def captureMeshData(bl_mesh, bl_vertex_groups, bl_joint_indices, exportSettings):
+    """
+    Capture all mesh data needed for primitive extraction into plain NumPy
+    arrays. This is the only part of the extraction touching Blender data,
+    so it must be called from the main thread.
+    """
 
-    color_index = 0
-    process_color = True
-    while process_color:
-        color_id = 'COLOR_' + str(color_index)
-        if source_attributes.get(color_id) is not None:
-            color_index += 1
-        else:
-            process_color = False
+    log.info('Capturing {} mesh data'.format(bl_mesh.name))
 
-    color_max = color_index
+    use_normals = True
 
+    # COMPAT: < Blender 4.1
+    if bpy.app.version < (4, 1, 0) and (bl_mesh.has_custom_normals or bl_mesh.use_auto_smooth or use_normals):
+        bl_mesh.calc_normals_split()
 
-    skinAttrIndex = 0
-    process_bone = True
-    while process_bone:
-        joint_id = 'JOINTS_' + str(skinAttrIndex)
-        if source_attributes.get(joint_id) is not None:
-            skinAttrIndex += 1
-        else:
-            process_bone = False
+    use_tangents = False
+    if meshNeedTangentsForExport(bl_mesh, exportSettings['optimizeAttrs']):
+        try:
+            bl_mesh.calc_tangents(uvmap=meshPreferredTangentsUvMap(bl_mesh))
+            use_tangents = True
+        except:
+            log.warning('Could not calculate tangents. Please try to triangulate the mesh first.')
 
-    skinAttrIndexMax = skinAttrIndex
+    texcoord_max = 0
+    if bl_mesh.uv_layers.active:
+        texcoord_max = len(bl_mesh.uv_layers)
 
+    bl_shape_keys = []
 
-    morph_index = 0
-    process_morph = True
-    while process_morph:
-        morph_position_id = 'MORPH_POSITION_' + str(morph_index)
-        if source_attributes.get(morph_position_id) is not None:
-            morph_index += 1
-        else:
-            process_morph = False
+    # Shape Keys can't be retrieve when using Apply Modifiers (Blender/bpy limitation)
+    if bl_mesh.shape_keys:
+        bl_shape_keys = [
+            key_block
+            for key_block in bl_mesh.shape_keys.key_blocks
+            if not (key_block == key_block.relative_key or key_block.mute or key_block == bl_mesh.shape_keys.reference_key)
+        ]
 
-    morph_max = morph_index
+    vertex_colors = list(bl_mesh.color_attributes)[:GLTF_MAX_COLORS]
 
-    min_index = indices.min()
-    max_index = indices.max() + 1
+    need_skin_attributes = exportSettings['skins'] and len(bl_joint_indices) > 0
 
-    result_primitive['indices'] = indices - min_index
-    attributes['POSITION'] = source_attributes['POSITION'][min_index * 3 : max_index * 3]
-    attributes['NORMAL'] = source_attributes['NORMAL'][min_index * 3 : max_index * 3]
+    num_verts = len(bl_mesh.vertices)
+    num_loops = len(bl_mesh.loops)
+
+    meshData = {
+        'name': bl_mesh.name,
+        'use_normals': use_normals,
+        'use_tangents': use_tangents,
+        'use_morph_normals': exportSettings['morph'] and use_normals,
+        'use_morph_tangents': exportSettings['morph'] and use_tangents,
+        'need_skin_attributes': need_skin_attributes,
+        # (name, useNodeAttrs) for each material slot
+        'materials': [(bl_mat.name, checkUseNodeAttrs(bl_mat)) if bl_mat is not None else None
+                      for bl_mat in bl_mesh.materials]
+    }
 
-    if use_tangents:
-        attributes['TANGENT'] = source_attributes['TANGENT'][min_index * 4 : max_index * 4]
-
-    for texcoord_index in range(0, texcoord_max):
-        texcoord_id = 'TEXCOORD_' + str(texcoord_index)
-        attributes[texcoord_id] = source_attributes[texcoord_id][min_index * 2 : max_index * 2]
-
-    for color_index in range(0, color_max):
-        color_id = 'COLOR_' + str(color_index)
-        attributes[color_id] = source_attributes[color_id][min_index * 4 : max_index * 4]
-
-    for skinAttrIndex in range(0, skinAttrIndexMax):
-        joint_id = 'JOINTS_' + str(skinAttrIndex)
-        weight_id = 'WEIGHTS_' + str(skinAttrIndex)
-        attributes[joint_id] = source_attributes[joint_id][min_index * 4 : max_index * 4]
-        attributes[weight_id] = source_attributes[weight_id][min_index * 4 : max_index * 4]
-
-    for morph_index in range(0, morph_max):
-        morph_position_id = 'MORPH_POSITION_' + str(morph_index)
-        morph_normal_id = 'MORPH_NORMAL_' + str(morph_index)
-        morph_tangent_id = 'MORPH_TANGENT_' + str(morph_index)
-        attributes[morph_position_id] = source_attributes[morph_position_id][min_index * 3 : max_index * 3]
-        attributes[morph_normal_id] = source_attributes[morph_normal_id][min_index * 3 : max_index * 3]
-        if use_tangents:
-            attributes[morph_tangent_id] = source_attributes[morph_tangent_id][min_index * 4 : max_index * 4]
+    # POSITIONS
+    locs = np.empty(num_verts * 3, dtype=np.float32)
+    bl_mesh.vertices.foreach_get('co', locs)
+    meshData['locs'] = locs.reshape(num_verts, 3)
 
-    return result_primitive
+    meshData['morph_locs'] = []
+    for key_block in bl_shape_keys:
+        vs = np.empty(num_verts * 3, dtype=np.float32)
+        key_block.data.foreach_get('co', vs)
+        meshData['morph_locs'].append(vs.reshape(num_verts, 3))
 
+    vidxs = np.empty(num_loops, dtype=np.uint32)
+    bl_mesh.loops.foreach_get('vertex_index', vidxs)
+    meshData['loop_vidxs'] = vidxs
 
-def extractPrimitivePack(a, indices, use_tangents):
-    """
-    Packs indices, that the first one starts with 0. Current indices can have gaps.
-    """
+    if use_normals:
+        normals = np.empty(num_loops * 3, dtype=np.float32)
+        bl_mesh.loops.foreach_get('normal', normals)
+        meshData['normals'] = normals.reshape(num_loops, 3)
 
-    attributes = {
-        'POSITION' : [],
-        'NORMAL' : []
-    }
+        meshData['morph_normals'] = [
+            np.array(key_block.normals_split_get(), dtype=np.float32).reshape(num_loops, 3)
+            for key_block in bl_shape_keys
+        ]
 
     if use_tangents:
-        attributes['TANGENT'] = []
+        tangents = np.empty(num_loops * 3, dtype=np.float32)
+        bl_mesh.loops.foreach_get('tangent', tangents)
+        meshData['tangents'] = tangents.reshape(num_loops, 3)
 
-    result_primitive = {
-        'material' : a['material'],
-        'useNodeAttrs' : a['useNodeAttrs'],
-        'indices' : [],
-        'attributes' : attributes
-    }
+        signs = np.empty(num_loops, dtype=np.float32)
+        bl_mesh.loops.foreach_get('bitangent_sign', signs)
+        meshData['bitangent_signs'] = signs
 
-    source_attributes = a['attributes']
+    meshData['uvs'] = []
+    for uv_i in range(texcoord_max):
+        uvs = np.empty(num_loops * 2, dtype=np.float32)
+        bl_mesh.uv_layers[uv_i].data.foreach_get('uv', uvs)
+        meshData['uvs'].append(uvs.reshape(num_loops, 2))
 
-    texcoord_index = 0
-    process_texcoord = True
-    while process_texcoord:
-        texcoord_id = 'TEXCOORD_' + str(texcoord_index)
-        if source_attributes.get(texcoord_id) is not None:
-            texcoord_index += 1
+    # (colors, is per-vertex, is sRGB)
+    meshData['colors'] = []
+    for vertex_color in vertex_colors:
+        if bpy.app.version >= (3, 2, 0):
+            per_vertex = vertex_color.domain == "POINT"
+            is_srgb = False
         else:
-            process_texcoord = False
+            per_vertex = False
+            is_srgb = True
 
-    texcoord_max = texcoord_index
+        colors = np.empty((num_verts if per_vertex else num_loops) * 4, dtype=np.float32)
+        vertex_color.data.foreach_get('color', colors)
+        meshData['colors'].append((colors.reshape(-1, 4), per_vertex, is_srgb))
 
-    color_index = 0
-    process_color = True
-    while process_color:
-        color_id = 'COLOR_' + str(color_index)
-        if source_attributes.get(color_id) is not None:
-            color_index += 1
-        else:
-            process_color = False
+    if need_skin_attributes:
+        meshData['group_to_joint'] = np.array([bl_joint_indices.get(g.name, -1) for g in bl_vertex_groups],
+                dtype=np.int64)
+        # vertices without bones are assigned to a joint that will be created later
+        meshData['neutral_joint'] = len(bl_joint_indices)
+
+        # flatten group elements, this is the only per-element Python loop
+        vert_groups = [vertex.groups for vertex in bl_mesh.vertices]
+        meshData['group_counts'] = np.fromiter((len(groups) for groups in vert_groups),
+                dtype=np.int64, count=len(vert_groups))
+        group_elems = [elem for groups in vert_groups for elem in groups]
+        del vert_groups
+
+        meshData['elem_groups'] = np.fromiter((elem.group for elem in group_elems),
+                dtype=np.int64, count=len(group_elems))
+        meshData['elem_weights'] = np.fromiter((elem.weight for elem in group_elems),
+                dtype=np.float64, count=len(group_elems))
+        del group_elems
 
-    color_max = color_index
+    bl_mesh.calc_loop_triangles()
+    loop_indices = np.empty(len(bl_mesh.loop_triangles) * 3, dtype=np.uint32)
+    bl_mesh.loop_triangles.foreach_get('loops', loop_indices)
+    meshData['loop_indices'] = loop_indices
 
+    tri_material_idxs = np.empty(len(bl_mesh.loop_triangles), dtype=np.uint32)
+    bl_mesh.loop_triangles.foreach_get('material_index', tri_material_idxs)
+    meshData['tri_material_idxs'] = tri_material_idxs
 
-    skinAttrIndex = 0
-    process_bone = True
-    while process_bone:
-        joint_id = 'JOINTS_' + str(skinAttrIndex)
-        weight_id = 'WEIGHTS_' + str(skinAttrIndex)
-        if source_attributes.get(joint_id) is not None:
-            skinAttrIndex += 1
-        else:
-            process_bone = False
+    return meshData
 
-    skinAttrIndexMax = skinAttrIndex
+def getMeshDataFingerprint(meshData, exportSettings):
+    """
+    Get a hex digest identifying the primitives built from the captured mesh
+    data, used as a key of the persistent mesh cache.
+    """
 
+    h = hashlib.blake2b(digest_size=20)
 
-    morph_index = 0
-    process_morph = True
-    while process_morph:
-        morph_position_id = 'MORPH_POSITION_' + str(morph_index)
-        morph_normal_id = 'MORPH_NORMAL_' + str(morph_index)
-        morph_tangent_id = 'MORPH_TANGENT_' + str(morph_index)
-        if source_attributes.get(morph_position_id) is not None:
-            morph_index += 1
+    def update(value):
+        if isinstance(value, np.ndarray):
+            h.update('{}{}'.format(value.dtype.str, value.shape).encode())
+            h.update(np.ascontiguousarray(value).data)
+        elif isinstance(value, (list, tuple)):
+            h.update('[{}'.format(len(value)).encode())
+            for elem in value:
+                update(elem)
         else:
-            process_morph = False
-
-    morph_max = morph_index
-
-
-    unqie, init_indxs = np.unique(indices, return_index=True)
-    indx_fields = [('old_index', np.uint32), ('old_index_index', np.uint32)]
-    unique_indices = np.empty(len(init_indxs), dtype=np.dtype(indx_fields))
-    unique_indices['old_index'] = unique
-    unique_indices['old_index_index'] = init_indxs
-    unique_indices.sort('old_index_index')
-    del unique
-    del init_indxs
-
-    # index_in_new_indices = np.searchsorted(unique, unique_indices['old_index'])
-    new_indices = np.searchsorted(unique_indices['old_index'], indices)
-    result_primitive['indices'] = new_indices
-
-    old_unique_indices = unique_indices['old_index'][new_indices]
-
-    attributes['POSITION'] = source_attributes['POSITION'].reshape(-1, 3)[old_unique_indices].reshape(-1)
-    attributes['NORMAL'] = source_attributes['NORMAL'].reshape(-1, 3)[old_unique_indices].reshape(-1)
-
-    if use_tangents:
-        attributes['TANGENT'] = source_attributes['TANGENT'].reshape(-1, 4)[old_unique_indices].reshape(-1)
-
-    for texcoord_index in range(0, texcoord_max):
-        texcoord_id = 'TEXCOORD_' + str(texcoord_index)
-        attributes[texcoord_id] = source_attributes[texcoord_id].reshape(-1, 2)[old_unique_indices].reshape(-1)
-
-    for color_index in range(0, color_max):
-        color_id = 'COLOR_' + str(color_index)
-        attributes[color_id] = source_attributes[color_id].reshape(-1, 4)[old_unique_indices].reshape(-1)
-
-    for skinAttrIndex in range(0, skinAttrIndexMax):
-        joint_id = 'JOINTS_' + str(skinAttrIndex)
-        weight_id = 'WEIGHTS_' + str(skinAttrIndex)
-
-        attributes[joint_id] = source_attributes[joint_id].reshape(-1, 4)[old_unique_indices].reshape(-1)
-        attributes[weight_id] = source_attributes[weight_id].reshape(-1, 4)[old_unique_indices].reshape(-1)
-
-    for morph_index in range(0, morph_max):
-        morph_position_id = 'MORPH_POSITION_' + str(morph_index)
-        morph_normal_id = 'MORPH_NORMAL_' + str(morph_index)
-        morph_tangent_id = 'MORPH_TANGENT_' + str(morph_index)
-        attributes[morph_position_id] = source_attributes[morph_position_id].reshape(-1, 3)[old_unique_indices].reshape(-1)
-        attributes[morph_normal_id] = source_attributes[morph_normal_id].reshape(-1, 3)[old_unique_indices].reshape(-1)
-        if use_tangents:
-            attributes[morph_tangent_id] = source_attributes[morph_tangent_id].reshape(-1, 4)[old_unique_indices].reshape(-1)
+            h.update(repr(value).encode())
 
-    return result_primitive
+    # settings used by buildPrimitives() and the following optimizations
+    update([exportSettings['weldMethod'], exportSettings['indices'],
+            exportSettings['optimizeMeshes']])
 
+    for key in sorted(meshData):
+        if key != 'name':
+            update(key)
+            update(meshData[key])
 
-def checkUseNodeAttrs(bl_mat):
-    mat_type = getMaterialType(bl_mat)
-
-    if mat_type == 'EEVEE':
-        return True
-    else:
-        return False
+    return h.hexdigest()
 
 def extractPrimitives(glTF, bl_mesh, bl_vertex_groups,
         bl_joint_indices, exportSettings):
     """
-    Extracting primitives from a mesh. Polygons are triangulated and sorted by material.
-    Furthermore, primitives are splitted up, if the indices range is exceeded.
-    Finally, triangles are also splitted up/dublicatted, if face normals are used instead of vertex normals.
+    Extracting primitives from a mesh, see captureMeshData() and buildPrimitives().
     """
 
-    log.info('Extracting {} primitives'.format(bl_mesh.name))
-
-    use_normals = True
-
-    # COMPAT: < Blender 4.1
-    if bpy.app.version < (4, 1, 0) and (bl_mesh.has_custom_normals or bl_mesh.use_auto_smooth or use_normals):
-        bl_mesh.calc_normals_split()
+    return buildPrimitives(captureMeshData(bl_mesh, bl_vertex_groups,
+            bl_joint_indices, exportSettings), exportSettings)
 
-    use_tangents = False
-    if meshNeedTangentsForExport(bl_mesh, exportSettings['optimizeAttrs']):
-        try:
-            bl_mesh.calc_tangents(uvmap=meshPreferredTangentsUvMap(bl_mesh))
-            use_tangents = True
-        except:
-            log.warning('Could not calculate tangents. Please try to triangulate the mesh first.')
-
-    texcoord_max = 0
-    if bl_mesh.uv_layers.active:
-        texcoord_max = len(bl_mesh.uv_layers)
-
-
-    morph_max = 0
-    use_morph_normals = exportSettings['morph'] and use_normals
-    use_morph_tangents = exportSettings['morph'] and use_tangents
-    bl_shape_keys = []
+def buildPrimitives(meshData, exportSettings):
+    """
+    Extracting primitives from the captured mesh data. Polygons are triangulated and sorted by material.
+    Furthermore, primitives are splitted up, if the indices range is exceeded.
+    Finally, triangles are also splitted up/dublicatted, if face normals are used instead of vertex normals.
 
-    # Shape Keys can't be retrieve when using Apply Modifiers (Blender/bpy limitation)
-    if bl_mesh.shape_keys:
-        bl_shape_keys = [
-            key_block
-            for key_block in bl_mesh.shape_keys.key_blocks
-            if not (key_block == key_block.relative_key or key_block.mute or key_block == bl_mesh.shape_keys.reference_key)
-        ]
+    Uses NumPy only, so it's safe to call from worker threads.
+    """
 
-    vertex_colors = {}
-    color_max = 0
-    color_index = 0
-    for vertex_color in bl_mesh.color_attributes:
-        vertex_color_name = 'COLOR_' + str(color_index)
-        vertex_colors[vertex_color_name] = vertex_color
+    log.info('Extracting {} primitives'.format(meshData['name']))
 
-        color_index += 1
-        if color_index >= GLTF_MAX_COLORS:
-            break
-    color_max = color_index
+    use_normals = meshData['use_normals']
+    use_tangents = meshData['use_tangents']
+    use_morph_normals = meshData['use_morph_normals']
+    use_morph_tangents = meshData['use_morph_tangents']
+    need_skin_attributes = meshData['need_skin_attributes']
 
+    texcoord_max = len(meshData['uvs'])
+    color_max = len(meshData['colors'])
+    morph_max = len(meshData['morph_locs'])
 
-    need_skin_attributes = exportSettings['skins'] and len(bl_joint_indices) > 0
-    skinAttrIndexMax = 0
-    if need_skin_attributes:
-        for vertex in bl_mesh.vertices:
-            # any vertex should be skinned to at least one bone - to the
-            # armature itself if no groups are specified
-            bones_count = max(len(vertex.groups), 1)
-            if bones_count % 4 == 0:
-                bones_count -= 1
-            skinAttrIndexMax = max(skinAttrIndexMax, bones_count // 4 + 1)
+    num_loops = len(meshData['loop_vidxs'])
 
     # Gathering position, normal and texcoords.
 
-    # Fetch vert positions and bone data (joint,weights)
-
     # POSITIONS
-    locs = np.empty(len(bl_mesh.vertices) * 3, dtype=np.float32)
-    bl_mesh.vertices.foreach_get('co', locs)
-    locs = locs.reshape(len(bl_mesh.vertices), 3)
-
-    morph_locs = []
-    for key_block in bl_shape_keys:
-        vs = np.empty(len(bl_mesh.vertices) * 3, dtype=np.float32)
-        key_block.data.foreach_get('co', vs)
-        vs = vs.reshape(len(bl_mesh.vertices), 3)
-        morph_locs.append(vs)
+    locs = meshData['locs'].copy()
 
     # glTF stores deltas in morph targets
-    for vs in morph_locs:
-        vs -= locs
+    morph_locs = [vs - meshData['locs'] for vs in meshData['morph_locs']]
 
     npConvertSwizzleLocation(locs)
     for vs in morph_locs:
@@ -463,36 +461,22 @@ def extractPrimitives(glTF, bl_mesh, bl_vertex_groups,
             ('color%da' % col_i, np.float32),
         ]
     if use_morph_normals:
-        for morph_i, _ in enumerate(bl_shape_keys):
+        for morph_i in range(morph_max):
             dot_fields += [
                 ('morph%dnx' % morph_i, np.float32),
                 ('morph%dny' % morph_i, np.float32),
                 ('morph%dnz' % morph_i, np.float32),
             ]
 
-    dots = np.empty(len(bl_mesh.loops), dtype=np.dtype(dot_fields))
+    dots = np.empty(num_loops, dtype=np.dtype(dot_fields))
 
-    vidxs = np.empty(len(bl_mesh.loops))
-    bl_mesh.loops.foreach_get('vertex_index', vidxs)
-    dots['vertex_index'] = vidxs
-    del vidxs
+    dots['vertex_index'] = meshData['loop_vidxs']
 
     if use_normals:
-        if bl_shape_keys and False:
-            normals = bl_shape_keys[0].relative_key.normals_split_get()
-            normals = np.array(normals, dtype=np.float32)
-        else:
-            normals = np.empty(len(bl_mesh.loops) * 3, dtype=np.float32)
-
-            bl_mesh.loops.foreach_get('normal', normals)
-
-        normals = normals.reshape(len(bl_mesh.loops), 3)
-        normals = np.round(normals, 6) # Round normals to avoid vertex split
+        normals = np.round(meshData['normals'], 6) # Round normals to avoid vertex split
 
         morph_normals = []
-        for key_block in bl_shape_keys:
-            ns = np.array(key_block.normals_split_get(), dtype=np.float32)
-            ns = ns.reshape(len(bl_mesh.loops), 3)
+        for ns in meshData['morph_normals']:
             ns = np.round(ns, 6)
             npNormalizeVecs(ns)
             morph_normals.append(ns)
@@ -528,9 +512,7 @@ def extractPrimitives(glTF, bl_mesh, bl_vertex_groups,
 
 
     if use_tangents:
-        tangents = np.empty(len(bl_mesh.loops) * 3, dtype=np.float32)
-        bl_mesh.loops.foreach_get('tangent', tangents)
-        tangents = tangents.reshape(len(bl_mesh.loops), 3)
+        tangents = meshData['tangents'].copy()
         npNormalizeVecs(tangents)
         npConvertSwizzleLocation(tangents)
 
@@ -539,42 +521,19 @@ def extractPrimitives(glTF, bl_mesh, bl_vertex_groups,
         dots['tz'] = tangents[:, 2]
         del tangents
 
-        signs = np.empty(len(bl_mesh.loops), dtype=np.float32)
-        bl_mesh.loops.foreach_get('bitangent_sign', signs)
-        dots['tw'] = signs
-        del signs
+        dots['tw'] = meshData['bitangent_signs']
 
 
-    for uv_i in range(texcoord_max):
-        layer = bl_mesh.uv_layers[uv_i]
-        uvs = np.empty(len(bl_mesh.loops) * 2, dtype=np.float32)
-        layer.data.foreach_get('uv', uvs)
-        uvs = uvs.reshape(len(bl_mesh.loops), 2)
+    for uv_i, uvs in enumerate(meshData['uvs']):
         # Blender UV space -> glTF UV space
         # u,v -> u,1-v
-        uvs[:, 1] *= -1
-        uvs[:, 1] += 1
-
         dots['uv%dx' % uv_i] = uvs[:, 0]
-        dots['uv%dy' % uv_i] = uvs[:, 1]
-        del uvs
-
-    for col_i in range(color_max):
-        color_name = 'COLOR_' + str(col_i)
-        if bpy.app.version >= (3, 2, 0):
-            if bl_mesh.color_attributes[col_i].domain == "POINT":
-                colors = np.empty(len(bl_mesh.vertices) * 4, dtype=np.float32)
-            else:
-                colors = np.empty(len(bl_mesh.loops) * 4, dtype=np.float32)
-        else:
-            colors = np.empty(len(bl_mesh.loops) * 4, dtype=np.float32)
+        dots['uv%dy' % uv_i] = 1 - uvs[:, 1]
 
-        vertex_colors[color_name].data.foreach_get('color', colors)
-        colors = colors.reshape(-1, 4)
-
-        if bpy.app.version < (3, 2, 0):
-            colors = npSRGBToLinear(colors)
-        elif vertex_colors[color_name].domain == "POINT":
+    for col_i, (colors, per_vertex, is_srgb) in enumerate(meshData['colors']):
+        if is_srgb:
+            colors = npSRGBToLinear(colors.copy())
+        elif per_vertex:
             colors = colors[dots['vertex_index']]
 
         dots['color%dr' % col_i] = colors[:, 0]
@@ -584,54 +543,20 @@ def extractPrimitives(glTF, bl_mesh, bl_vertex_groups,
         del colors
 
     if need_skin_attributes:
-        need_neutral_bone = False
-        min_influence = 0.0001
-        joint_name_to_index = bl_joint_indices
-        group_to_joint = [joint_name_to_index.get(g.name) for g in bl_vertex_groups]
-
-        # List of (joint, weight) pairs for each vert
-        vert_bones = []
-        max_num_influences = 0
-
-        for vertex in bl_mesh.vertices:
-            bones = []
-            if vertex.groups:
-                for group_element in vertex.groups:
-                    weight = group_element.weight
-                    if weight <= min_influence:
-                        continue
-                    try:
-                        joint = group_to_joint[group_element.group]
-                    except Exception:
-                        continue
-                    if joint is None:
-                        continue
-                    bones.append((joint, weight))
-            bones.sort(key=lambda x: x[1], reverse=True)
-            if not bones:
-                # Is not assign to any bone
-                bones = ((len(bl_joint_indices), 1.0),)  # Assign to a joint that will be created later
-                need_neutral_bone = True
-            vert_bones.append(bones)
-            if len(bones) > max_num_influences:
-                max_num_influences = len(bones)
-
-        # How many joint sets do we need? 1 set = 4 influences
-        num_joint_sets = (max_num_influences + 3) // 4
+        vert_joints, vert_weights = npVertexBones(meshData['group_counts'],
+                meshData['elem_groups'], meshData['elem_weights'],
+                meshData['group_to_joint'], meshData['neutral_joint'])
+        num_joint_sets = vert_joints.shape[1] // 4
 
     # Calculate triangles and sort them into primitives.
 
-    bl_mesh.calc_loop_triangles()
-    loop_indices = np.empty(len(bl_mesh.loop_triangles) * 3, dtype=np.uint32)
-    bl_mesh.loop_triangles.foreach_get('loops', loop_indices)
+    loop_indices = meshData['loop_indices']
 
     prim_indices = {}  # maps material index to TRIANGLES-style indices into dots
 
-    tri_material_idxs = np.empty(len(bl_mesh.loop_triangles), dtype=np.uint32)
-    bl_mesh.loop_triangles.foreach_get('material_index', tri_material_idxs)
+    tri_material_idxs = meshData['tri_material_idxs']
     loop_material_idxs = np.repeat(tri_material_idxs, 3)  # material index for every loop
     unique_material_idxs = np.unique(tri_material_idxs)
-    del tri_material_idxs
 
     for material_idx in unique_material_idxs:
         prim_indices[material_idx] = loop_indices[loop_material_idxs == material_idx]
@@ -643,7 +568,7 @@ def extractPrimitives(glTF, bl_mesh, bl_vertex_groups,
         # Extract just dots used by this primitive, deduplicate them, and
         # calculate indices into this deduplicated list.
         prim_dots = dots[dot_indices]
-        prim_dots, indices = np.unique(prim_dots, return_inverse=True)
+        prim_dots, indices = npWeldDots(prim_dots, exportSettings['weldMethod'])
 
         if len(prim_dots) == 0:
             continue
@@ -657,12 +582,12 @@ def extractPrimitives(glTF, bl_mesh, bl_vertex_groups,
             'useNodeAttrs': False,
             'material': DEFAULT_MAT_NAME
         }
+        materials = meshData['materials']
         if (material_idx is not None
-                and len(bl_mesh.materials) > material_idx
-                and bl_mesh.materials[material_idx] is not None):
+                and len(materials) > material_idx
+                and materials[material_idx] is not None):
 
-            primitive['useNodeAttrs'] = checkUseNodeAttrs(bl_mesh.materials[material_idx])
-            primitive['material'] = bl_mesh.materials[material_idx].name
+            primitive['material'], primitive['useNodeAttrs'] = materials[material_idx]
 
 
         # Now just move all the data for prim_dots into attribute arrays
@@ -689,7 +614,7 @@ def extractPrimitives(glTF, bl_mesh, bl_vertex_groups,
             attributes['TANGENT'] = tangents.reshape(-1)
 
         if use_morph_normals:
-            for morph_i, _ in enumerate(bl_shape_keys):
+            for morph_i in range(morph_max):
                 ns = np.empty((len(prim_dots), 3), dtype=np.float32)
                 ns[:, 0] = prim_dots['morph%dnx' % morph_i]
                 ns[:, 1] = prim_dots['morph%dny' % morph_i]
@@ -697,16 +622,11 @@ def extractPrimitives(glTF, bl_mesh, bl_vertex_groups,
                 attributes['MORPH_NORMAL_%d' % morph_i] = ns.reshape(-1)
 
                 if use_morph_tangents:
-                    morph_normal_deltas = ns
-                    morph_tangent_deltas = np.empty((len(normals), 3), dtype=np.float32)
-                    for i in range(len(normals)):
-                        n = mathutils.Vector(normals[i])
-                        morph_n = n + mathutils.Vector(morph_normal_deltas[i])  # convert back to non-delta
-                        t = mathutils.Vector(tangents[i, :3])
-                        rotation = morph_n.rotation_difference(n)
-                        t_morph = mathutils.Vector(t)
-                        t_morph.rotate(rotation)
-                        morph_tangent_deltas[i] = t_morph - t  # back to delta
+                    morph_normals = normals + ns  # convert back to non-delta
+                    t = tangents[:, :3].astype(np.float64)
+                    rotations = pluginUtils.meshproc.rotationDifference(morph_normals, normals)
+                    t_morph = pluginUtils.meshproc.rotateVecs(rotations, t)
+                    morph_tangent_deltas = (t_morph - t).astype(np.float32)  # back to delta
 
                     attributes['MORPH_TANGENT_%d' % morph_i] = morph_tangent_deltas.reshape(-1)
 
@@ -725,22 +645,12 @@ def extractPrimitives(glTF, bl_mesh, bl_vertex_groups,
             attributes['COLOR_%d' % color_i] = colors.reshape(-1)
 
         if need_skin_attributes:
-            joints = [[] for _ in range(num_joint_sets)]
-            weights = [[] for _ in range(num_joint_sets)]
-
-            for vi in blender_idxs:
-                bones = vert_bones[vi]
-                for j in range(0, 4 * num_joint_sets):
-                    if j < len(bones):
-                        joint, weight = bones[j]
-                    else:
-                        joint, weight = 0, 0.0
-                    joints[j//4].append(joint)
-                    weights[j//4].append(weight)
-
-            for i, (js, ws) in enumerate(zip(joints, weights)):
-                attributes['JOINTS_%d' % i] = js
-                attributes['WEIGHTS_%d' % i] = ws
+            joints = vert_joints[blender_idxs]
+            weights = vert_weights[blender_idxs]
+
+            for i in range(num_joint_sets):
+                attributes['JOINTS_%d' % i] = joints[:, i*4 : i*4 + 4].reshape(-1)
+                attributes['WEIGHTS_%d' % i] = weights[:, i*4 : i*4 + 4].reshape(-1)
 
         primitives.append(primitive)
 
@@ -768,73 +678,78 @@ def extractPrimitives(glTF, bl_mesh, bl_vertex_groups,
 
 
         if max_index >= range_indices:
-            # Spliting result_primitives.
-
-            # At start, all indicees are pending.
-            pending_primitive = {
-                'material' : primitive['material'],
-                'useNodeAttrs' : primitive['useNodeAttrs'],
-                'indices' : primitive['indices'],
-                'attributes' : primitive['attributes']
-            }
-
-            pending_indices = pending_primitive['indices']
+            # Splitting into runs of consecutive triangles, each one
+            # referencing at most range_indices unique vertices.
+            attributes = primitive['attributes']
+            vertex_count = len(attributes['POSITION']) // 3
 
-            # Continue until all are processed.
-            while len(pending_indices) > 0:
+            for start, end in npSplitIndices(indices, range_indices, 3):
+                part_verts, part_indices = np.unique(indices[start * 3 : end * 3],
+                        return_inverse=True)
 
-                process_indices = pending_primitive['indices']
-                rnum = (np.max(process_indices) // range_indices) + 1
-                all_local_indices = []
+                part_attributes = {}
+                for name, data in attributes.items():
+                    data = np.asarray(data).reshape(vertex_count, -1)
+                    part_attributes[name] = data[part_verts].reshape(-1)
 
-                process_indices = process_indices.reshape(-1, 3)
-                face_min_indices = np.amin(process_indices, axis=1)
-                face_max_indices = np.amax(process_indices, axis=1)
+                current_primitive = {
+                    'material' : primitive['material'],
+                    'useNodeAttrs' : primitive['useNodeAttrs'],
+                    'indices' : part_indices.reshape(-1).astype(np.uint32),
+                    'max_index' : len(part_verts) - 1,
+                    'attributes' : part_attributes
+                }
 
-                written_mask = np.zeros(len(process_indices), dtype=bool)
+                result_primitives.append(current_primitive)
 
-                # For all faces ...
-                for i in range(0, rnum):
-                    offset = i * range_indices
+                log.debug('Adding primitive with splitting. Indices: ' + str(len(current_primitive['indices'])) + ' Vertices: ' + str(len(part_verts)))
 
-                    # ... check if it can be but in a range of maximum indices.
-                    # Yes, so store the primitive with its indices.
-                    mask = (face_min_indices >= offset) & (face_max_indices < (offset + range_indices))
-                    all_local_indices.append(process_indices[mask])
+        else:
+            # No splitting needed.
+            result_primitives.append(primitive)
 
-                    written_mask |= mask
+            log.debug('Adding primitive without splitting. Indices: ' + str(len(primitive['indices'])) + ' Vertices: ' + str(len(primitive['attributes']['POSITION']) // 3))
 
-                # If not written, the triangel face has indices from different ranges.
-                pending_indices = process_indices[~written_mask]
-                pending_indices = pending_indices.reshape(-1)
+    log.debug('Primitives created: ' + str(len(result_primitives)))
+    return result_primitives
 
 
-                # Only add result_primitives, which do have indices in it.
-                for local_indices in all_local_indices:
-                    if len(local_indices) > 0:
-                        current_primitive = extractPrimitiveFloor(pending_primitive, local_indices, use_tangents)
+def npSplitIndices(indices, maxVerts, primSize):
+    """
+    Greedily split LINES (primSize=2) or TRIANGLES (primSize=3) indices into
+    runs of consecutive primitives, each run referencing at most maxVerts
+    unique vertices. Returns a list of (start, end) primitive ranges.
+    """
 
-                        result_primitives.append(current_primitive)
+    numPrims = len(indices) // primSize
 
-                        log.debug('Adding primitive with splitting. Indices: ' + str(len(current_primitive['indices'])) + ' Vertices: ' + str(len(current_primitive['attributes']['POSITION']) // 3))
+    ranges = []
 
-                # Process primitive faces having indices in several ranges.
-                if len(pending_indices) > 0:
-                    pending_primitive = extractPrimitivePack(pending_primitive, pending_indices, use_tangents)
+    start = 0
+    while start < numPrims:
+        # this number of primitives always fits, grow the window until it doesn't
+        window = max(maxVerts // primSize, 1)
 
-                    pending_attributes = pending_primitive['attributes']
+        while True:
+            end = min(start + window, numPrims)
+            segment = indices[start * primSize : end * primSize]
 
-                    log.debug('Creating temporary primitive for splitting')
+            # number of unique vertices used after each primitive of the window
+            _, firstPos = np.unique(segment, return_index=True)
+            isFirst = np.zeros(len(segment), dtype=np.int64)
+            isFirst[firstPos] = 1
+            uniqueCounts = np.cumsum(isFirst.reshape(-1, primSize).sum(axis=1))
 
-        else:
-            # No splitting needed.
-            result_primitives.append(primitive)
+            if uniqueCounts[-1] > maxVerts or end == numPrims:
+                break
 
-            log.debug('Adding primitive without splitting. Indices: ' + str(len(primitive['indices'])) + ' Vertices: ' + str(len(primitive['attributes']['POSITION']) // 3))
+            window *= 2
 
-    log.debug('Primitives created: ' + str(len(result_primitives)))
-    return result_primitives
+        count = max(int(np.searchsorted(uniqueCounts, maxVerts, side='right')), 1)
+        ranges.append((start, start + count))
+        start += count
 
+    return ranges
 
 def extractLinePrimitives(glTF, bl_mesh, exportSettings):
     """
@@ -848,30 +763,33 @@ def extractLinePrimitives(glTF, bl_mesh, exportSettings):
     mat_name = (bl_mesh.materials[0].name if bl_mesh.materials
             and bl_mesh.materials[0] is not None else '')
 
-    primitive = {
-        'material' : mat_name,
-        'useNodeAttrs' : False,
-        'indices' : [],
-        'attributes' : { 'POSITION': [] }
-    }
+    edge_verts = np.empty(len(bl_mesh.edges) * 2, dtype=np.uint32)
+    bl_mesh.edges.foreach_get('vertices', edge_verts)
 
-    orig_indices = primitive['indices']
-    orig_positions = primitive['attributes']['POSITION']
+    if len(edge_verts) == 0:
+        return []
 
-    vertex_index_to_new_index = {}
-
-    for bl_edge in bl_mesh.edges:
-        for vertex_index in bl_edge.vertices:
-            vertex = bl_mesh.vertices[vertex_index]
+    locs = np.empty(len(bl_mesh.vertices) * 3, dtype=np.float32)
+    bl_mesh.vertices.foreach_get('co', locs)
+    locs = locs.reshape(len(bl_mesh.vertices), 3)
+    npConvertSwizzleLocation(locs)
 
-            new_index = vertex_index_to_new_index.get(vertex_index, -1)
-            if new_index == -1:
-                orig_positions.extend(convertSwizzleLocation(vertex.co))
-                new_index = len(orig_positions) // 3 - 1
-                vertex_index_to_new_index[vertex_index] = new_index
+    # keep used vertices only, in order of their first appearance in the edges
+    used_verts, first_pos, inverse = np.unique(edge_verts, return_index=True,
+            return_inverse=True)
+    order = np.argsort(first_pos)
+    new_index = np.empty(len(used_verts), dtype=np.uint32)
+    new_index[order] = np.arange(len(used_verts), dtype=np.uint32)
 
-            orig_indices.append(new_index)
+    orig_indices = new_index[inverse.reshape(-1)]
+    orig_positions = locs[used_verts[order]]
 
+    primitive = {
+        'material' : mat_name,
+        'useNodeAttrs' : False,
+        'indices' : orig_indices,
+        'attributes' : { 'POSITION': orig_positions.reshape(-1) }
+    }
 
     result_primitives = []
 
@@ -883,59 +801,19 @@ def extractLinePrimitives(glTF, bl_mesh, exportSettings):
     elif exportSettings['indices'] == 'UNSIGNED_INT':
         range_indices = 4294967295
 
-    if len(set(orig_indices)) >= range_indices:
+    if len(used_verts) >= range_indices:
         # Splitting the bunch of a primitive's edges into several parts.
-        split_parts = []
-
-        # Process every edge.
-        for i in range(0, len(orig_indices), 2):
-            edge = orig_indices[i:i+2]
-
-            part_count = len(split_parts)
-            part_suitabilities = [0]*part_count
-
-            # Define which split_part is more suitable for a particular edge.
-            # The best case is when the both edge indices are already contained
-            # in a split_part, so we won't increase the number of the part's
-            # unique indices by adding the edge into it.
-            for i in range(0, part_count):
-                if edge[0] in split_parts[i]:
-                    part_suitabilities[i] += 1
-                if edge[1] in split_parts[i]:
-                    part_suitabilities[i] += 1
-
-            # Sort split_parts by their suitability, e.g. 2,1,1,1,0,0.
-            split_part_order = sorted(range(part_count),
-                    key=lambda i: part_suitabilities[i], reverse=True)
-
-            # Trying to find the first most suitable split_part with free space.
-            need_new_part = True
-            for i in split_part_order:
-                if len(set(split_parts[i] + edge)) <= range_indices:
-                    split_parts[i].extend(edge)
-                    need_new_part = False
-                    break
-
-            # Create new split_part if no existed part can contain an edge.
-            if need_new_part:
-                split_parts.append(edge)
-
-        # Create new primitives based on the calculated split_parts.
-        for old_indices in split_parts:
+        for start, end in npSplitIndices(orig_indices, range_indices, 2):
+            old_indices = orig_indices[start * 2 : end * 2]
+            part_verts, part_indices = np.unique(old_indices, return_inverse=True)
 
             part_primitive = {
                 'material' : mat_name,
                 'useNodeAttrs' : False,
-                'indices' : [],
-                'attributes' : { 'POSITION': [] }
+                'indices' : part_indices.reshape(-1).astype(np.uint32),
+                'attributes' : { 'POSITION': orig_positions[part_verts].reshape(-1) }
             }
 
-            sorted_indices = sorted(set(old_indices))
-            for i in sorted_indices:
-                part_primitive['attributes']['POSITION'].extend(orig_positions[i*3:i*3+3])
-
-            part_primitive['indices'] = [sorted_indices.index(i) for i in old_indices]
-
             result_primitives.append(part_primitive)
 
     else:
@@ -1791,21 +1669,22 @@ def extractAxisParam(param, prefix, use_negative):
         log.error('Incorrect axis param: ' + param)
         return ''
 
-def extractImageBindata(bl_image, scene, exportSettings):
+def extractImageBindata(bl_image, scene, exportSettings, ktx2Job=None):
+    """
+    ktx2Job is an optional future with the KTX2 data compressed in advance,
+    see extractImageKTX2Src().
+    """
 
     fileFormat = bl_image.file_format
 
     if imgNeedsCompression(bl_image, exportSettings):
-        if fileFormat == 'JPEG':
-            data = imageSaveRender(bl_image, scene, 'JPEG', 'RGB', quality=90)
-        elif fileFormat == 'HDR':
-            data = imageSaveRender(bl_image, scene, 'HDR', 'RGB')
-        else:
-            data = imageSaveRender(bl_image, scene, 'PNG', 'RGBA', color_depth='8', compression=90)
-
         if fileFormat == 'HDR':
+            data = imageSaveRender(bl_image, scene, 'HDR', 'RGB')
             return lzma.compress(data)
+        elif ktx2Job is not None:
+            return ktx2Job.result()
         else:
+            data = extractImageKTX2Src(bl_image, scene)
             return pu.convert.compressKTX2(srcData=data, method=bl_image.v3d.compression_method)
 
     elif fileFormat == 'JPEG':
@@ -1820,6 +1699,16 @@ def extractImageBindata(bl_image, scene, exportSettings):
     else:
         return imageSaveRender(bl_image, scene, 'PNG', 'RGBA', color_depth='8', compression=90)
 
+def extractImageKTX2Src(bl_image, scene):
+    """
+    Image data passed to the KTX2 compressor.
+    """
+
+    if bl_image.file_format == 'JPEG':
+        return imageSaveRender(bl_image, scene, 'JPEG', 'RGB', quality=90)
+    else:
+        return imageSaveRender(bl_image, scene, 'PNG', 'RGBA', color_depth='8', compression=90)
+
 def imageSaveRender(bl_image, scene, file_format, color_mode, color_depth=None, compression=None,
                     quality=None):
 
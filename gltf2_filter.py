@@ -23,6 +23,7 @@ log = pluginUtils.log.getLogger('V3D-BL')
 
 from .gltf2_get import *
 from .gltf2_extract import *
+from .gltf2_session import exportSession, getMeshSessionKey
 from .node_material_wrapper import NodeMaterialWrapper
 from .utils import *
 
@@ -44,13 +45,16 @@ def flattenCollectionUnique(collection, dest_set):
                 flattenCollectionUnique(bl_obj.instance_collection, dest_set)
 
 
-def meshObjGetExportData(obj_original, bake_modifiers, optimize_tangents):
+def meshObjsGetExportData(objs_original, bake_modifiers, optimize_tangents):
     """
-    Prepare the data of the given MESH object before export by making such
+    Prepare the data of the given MESH objects before export by making such
     operations as:
         - applying all suitable modifiers if any
         - triangulate mesh ngons if tangents export is needed
         - restore shape keys after the previous operations if it's possible or needed
+
+    Each operation is performed for all objects at once, so that the view layer
+    is updated only once per operation. Returns the list of resulting meshes.
     """
 
     generated_objs = []
@@ -58,81 +62,134 @@ def meshObjGetExportData(obj_original, bake_modifiers, optimize_tangents):
 
 
     # APPLY MODIFIERS
-    need_apply_mods = bake_modifiers is True and objHasExportedModifiers(obj_original)
+    need_apply_mods = [bake_modifiers is True and objHasExportedModifiers(obj)
+                       for obj in objs_original]
+
+    objs_mods_applied = []
+    for obj_original, need in zip(objs_original, need_apply_mods):
+        if need:
+            obj_mods_applied = obj_original.copy()
+            objDelNotExportedModifiers(obj_mods_applied)
+            generated_objs.append(obj_mods_applied)
+        else:
+            obj_mods_applied = obj_original
 
-    obj_mods_applied = obj_original
-    if need_apply_mods:
-        obj_mods_applied = obj_original.copy()
-        objDelNotExportedModifiers(obj_mods_applied)
-        objApplyModifiers(obj_mods_applied)
+        objs_mods_applied.append(obj_mods_applied)
 
-        generated_objs.append(obj_mods_applied)
-        generated_meshes.append(obj_mods_applied.data)
+    objs_to_apply = [obj for obj, need in zip(objs_mods_applied, need_apply_mods) if need]
+    objsApplyModifiers(objs_to_apply)
+    generated_meshes.extend(obj.data for obj in objs_to_apply)
 
 
     # TRIANGULATE
-    need_tangents = meshNeedTangentsForExport(obj_mods_applied.data, optimize_tangents)
-    if not need_tangents:
-        log.debug('Tangent attribute will not be exported for mesh "%s"' % obj_original.data.name)
-    need_triangulation = need_tangents and meshHasNgons(obj_mods_applied.data)
+    objs_triangulated = []
+    objs_to_apply = []
+    for obj_original, obj_mods_applied in zip(objs_original, objs_mods_applied):
+        need_tangents = meshNeedTangentsForExport(obj_mods_applied.data, optimize_tangents)
+        if not need_tangents:
+            log.debug('Tangent attribute will not be exported for mesh "%s"' % obj_original.data.name)
+        need_triangulation = need_tangents and meshHasNgons(obj_mods_applied.data)
 
-    obj_triangulated = obj_mods_applied
-    if need_triangulation:
-        obj_triangulated = obj_mods_applied.copy()
-        objDelNotExportedModifiers(obj_triangulated)
-        objAddTriModifier(obj_triangulated)
+        obj_triangulated = obj_mods_applied
+        if need_triangulation:
+            obj_triangulated = obj_mods_applied.copy()
+            objDelNotExportedModifiers(obj_triangulated)
+            objAddTriModifier(obj_triangulated)
 
-        # Triangulation modifier doesn't affect vertices, therefore this operation
-        # can preserve shape keys. To do this we need to remove shape keys to not
-        # bake them into the new mesh.
+            # Triangulation modifier doesn't affect vertices, therefore this operation
+            # can preserve shape keys. To do this we need to remove shape keys to not
+            # bake them into the new mesh.
 
-        # NOTE: need to copy object data before changes because it's shared with
-        # the object coming from the previous operation (due to .copy() not
-        # creating a new mesh datablock)
-        tmp_data = obj_triangulated.data.copy()
-        obj_triangulated.data = tmp_data
-        obj_triangulated.shape_key_clear()
+            # NOTE: need to copy object data before changes because it's shared with
+            # the object coming from the previous operation (due to .copy() not
+            # creating a new mesh datablock)
+            tmp_data = obj_triangulated.data.copy()
+            obj_triangulated.data = tmp_data
+            obj_triangulated.shape_key_clear()
 
-        objApplyModifiers(obj_triangulated)
+            generated_objs.append(obj_triangulated)
+            generated_meshes.append(tmp_data)
+            objs_to_apply.append(obj_triangulated)
 
-        generated_objs.append(obj_triangulated)
-        generated_meshes.append(tmp_data)
-        generated_meshes.append(obj_triangulated.data)
+        objs_triangulated.append(obj_triangulated)
+
+    objsApplyModifiers(objs_to_apply)
+    generated_meshes.extend(obj.data for obj in objs_to_apply)
 
 
     # TRANSFER SHAPE KEYS
 
-    # transfer shape keys to the new object only if:
-    #   - shape keys were removed during mesh processing
-    #   - shape keys were not baked into the mesh geometry (always baked during
-    #     the APPLY MODIFIERS operation; TRIANGULATION doesn't bake them)
-    shape_keys_removed = (obj_original.data.shape_keys is not None
-            and obj_triangulated.data.shape_keys is None)
-    need_transfer_sk = shape_keys_removed and not need_apply_mods
-
-    obj_sk_transfered = obj_triangulated
-    if need_transfer_sk:
-        obj_sk_transfered = obj_triangulated.copy()
-        dg = bpy.context.evaluated_depsgraph_get()
+    resulting_meshes = []
+
+    dg = bpy.context.evaluated_depsgraph_get()
+
+    for obj_original, obj_triangulated, need in zip(objs_original, objs_triangulated, need_apply_mods):
+        # transfer shape keys to the new object only if:
+        #   - shape keys were removed during mesh processing
+        #   - shape keys were not baked into the mesh geometry (always baked during
+        #     the APPLY MODIFIERS operation; TRIANGULATION doesn't bake them)
+        shape_keys_removed = (obj_original.data.shape_keys is not None
+                and obj_triangulated.data.shape_keys is None)
+        need_transfer_sk = shape_keys_removed and not need
+
+        obj_sk_transfered = obj_triangulated
+        if need_transfer_sk:
+            obj_sk_transfered = obj_triangulated.copy()
 
-        success = objTransferShapeKeys(obj_original, obj_sk_transfered, dg)
-        if not success:
-            log.warning('Could not generate shape keys because they '
-                    + 'change vertex count. Object "' + obj_original.name + '".')
+            success = objTransferShapeKeys(obj_original, obj_sk_transfered, dg)
+            if not success:
+                log.warning('Could not generate shape keys because they '
+                        + 'change vertex count. Object "' + obj_original.name + '".')
 
-        generated_objs.append(obj_sk_transfered)
-        # no new mesh was generated
+            generated_objs.append(obj_sk_transfered)
+            # no new mesh was generated
 
+        resulting_meshes.append(obj_sk_transfered.data)
 
-    resulting_mesh = obj_sk_transfered.data
+
+    resulting_meshes_set = set(resulting_meshes)
 
     for tmp_obj in generated_objs:
         bpy.data.objects.remove(tmp_obj)
     for tmp_mesh in generated_meshes:
-        if tmp_mesh != resulting_mesh:
+        if tmp_mesh not in resulting_meshes_set:
             bpy.data.meshes.remove(tmp_mesh)
 
-    return resulting_mesh
+    return resulting_meshes
+
+def objsToMeshes(objs, clear_modifiers):
+    """
+    Convert CURVE, SURFACE and FONT objects to new meshes. Temporary copies of
+    all objects are evaluated with a single view layer update. Returns the list
+    of new meshes, None for objects that can't be converted.
+    """
+
+    if not objs:
+        return []
+
+    dg = bpy.context.evaluated_depsgraph_get()
+
+    copy_objs = []
+    for obj in objs:
+        copy_obj = obj.copy()
+
+        if clear_modifiers:
+            copy_obj.modifiers.clear()
+
+        dg.scene.collection.objects.link(copy_obj)
+        copy_obj.update_tag()
+
+        copy_objs.append(copy_obj)
+
+    bpy.context.view_layer.update()
+
+    meshes = [bpy.data.meshes.new_from_object(copy_obj.evaluated_get(dg)) for copy_obj in copy_objs]
+
+    for copy_obj in copy_objs:
+        dg.scene.collection.objects.unlink(copy_obj)
+        bpy.data.objects.remove(copy_obj)
+
+    return meshes
 
 
 def filterApply(exportSettings):
@@ -156,6 +213,37 @@ def filterApply(exportSettings):
     exportSettings['filteredObjectsShallow'] = filteredObjectsShallow
     exportSettings['filteredObjectsWithIC'] = filteredObjectsWithIC
 
+    # datablock -> objects using it, built once to avoid scanning all
+    # objects for every datablock
+    dataObjects = {}
+    for bl_obj in filteredObjectsWithIC:
+        if bl_obj.data is not None:
+            if bl_obj.data not in dataObjects:
+                dataObjects[bl_obj.data] = []
+            dataObjects[bl_obj.data].append(bl_obj)
+
+    exportSettings['dataObjects'] = dataObjects
+
+
+    jointIndices = {}
+
+    if exportSettings['skins']:
+        for bl_obj in filteredObjectsWithIC:
+
+            if bl_obj.type != 'MESH':
+                continue
+
+            armature_object = findArmature(bl_obj)
+            if armature_object is None or len(armature_object.pose.bones) == 0:
+                continue
+
+            grp = jointIndices[bl_obj.data.name] = {}
+
+            for bl_bone in armature_object.pose.bones:
+                grp[bl_bone.name] = len(grp)
+
+    exportSettings['jointIndices'] = jointIndices
+
 
     # meshes
 
@@ -163,41 +251,64 @@ def filterApply(exportSettings):
     filteredVertexGroups = {}
     temporaryMeshes = []
 
+    # mesh pointer -> (object pointer, dependency key), see gltf2_session
+    sessionMeshKeys = {}
+    # mesh pointer -> (primitives, metadata, cache key) reused from the previous export
+    sessionMeshes = {}
+
+    # (mesh, object to take the mesh data from)
+    meshUsers = []
+
     for bl_mesh in bpy.data.meshes:
 
         if bl_mesh.users == 0:
             continue
 
-        current_bl_mesh = bl_mesh
-
-        current_bl_object = None
+        bl_users = dataObjects.get(bl_mesh)
+        if not bl_users:
+            continue
 
-        skip = True
+        meshUsers.append((bl_mesh, bl_users[0]))
 
-        for bl_obj in filteredObjectsWithIC:
+        if exportSettings['incrementalExport'] and not objDataUsesLineRendering(bl_mesh):
+            meshPtr = getPtr(bl_mesh)
+            objPtr = getPtr(bl_users[0])
+            depKey = getMeshSessionKey(exportSettings, bl_mesh, bl_users[0])
 
-            current_bl_object = bl_obj
+            sessionMeshKeys[meshPtr] = (objPtr, depKey)
 
-            if current_bl_object.type != 'MESH':
-                continue
+            sessionEntry = exportSession.getMeshPrimitives(meshPtr, objPtr, depKey)
+            # materials are collected from the original mesh below, reuse it
+            # only if baked modifiers (e.g. geometry nodes) didn't change them
+            if sessionEntry is not None and sessionEntry[1]['materials'] == [
+                    bl_mat.name if bl_mat is not None else None for bl_mat in bl_mesh.materials]:
+                sessionMeshes[meshPtr] = sessionEntry
 
-            if current_bl_object.data == current_bl_mesh:
+    exportSettings['sessionMeshKeys'] = sessionMeshKeys
+    exportSettings['sessionMeshes'] = sessionMeshes
 
-                skip = False
+    # unchanged meshes don't need to be baked again
+    meshesForExport = meshObjsGetExportData([bl_obj for bl_mesh, bl_obj in meshUsers
+                                             if getPtr(bl_mesh) not in sessionMeshes],
+            exportSettings['bakeModifiers'], exportSettings['optimizeAttrs'])
+    meshesForExport = iter(meshesForExport)
 
-                mesh_for_export = meshObjGetExportData(current_bl_object,
-                        exportSettings['bakeModifiers'], exportSettings['optimizeAttrs'])
+    for bl_mesh, current_bl_object in meshUsers:
 
-                if mesh_for_export != current_bl_mesh:
-                    # a new mesh was generated
-                    mesh_for_export[TO_MESH_SOURCE_CUSTOM_PROP] = current_bl_object
-                    temporaryMeshes.append(mesh_for_export)
-                    current_bl_mesh = mesh_for_export
+        current_bl_mesh = bl_mesh
 
-                break
+        if getPtr(bl_mesh) in sessionMeshes:
+            # primitives and mesh-level data are reused, the original mesh is
+            # only needed to get the source datablock and materials
+            mesh_for_export = bl_mesh
+        else:
+            mesh_for_export = next(meshesForExport)
 
-        if skip:
-            continue
+        if mesh_for_export != current_bl_mesh:
+            # a new mesh was generated
+            mesh_for_export[TO_MESH_SOURCE_CUSTOM_PROP] = current_bl_object
+            temporaryMeshes.append(mesh_for_export)
+            current_bl_mesh = mesh_for_export
 
         filteredMeshes.append(current_bl_mesh)
         filteredVertexGroups[getPtr(bl_mesh)] = current_bl_object.vertex_groups
@@ -207,6 +318,9 @@ def filterApply(exportSettings):
 
     filteredCurves = []
 
+    # (curve, object to take the mesh data from)
+    curveUsers = []
+
     for bl_curve in bpy.data.curves:
 
         if bl_curve.users == 0:
@@ -218,55 +332,26 @@ def filterApply(exportSettings):
 
         # convert to mesh
         else:
-            current_bl_curve = bl_curve
-            current_bl_mesh = None
-            current_bl_object = None
-
-            skip = True
-
-            for bl_obj in filteredObjectsWithIC:
-
-                current_bl_object = bl_obj
-
-                if current_bl_object.type not in ['CURVE', 'SURFACE', 'FONT']:
-                    continue
-
-                if current_bl_object.data == current_bl_curve:
-
-                    skip = False
-
-                    copy_obj = current_bl_object.copy()
-
-                    if not exportSettings['bakeModifiers']:
-                        copy_obj.modifiers.clear()
-
-                    dg = bpy.context.evaluated_depsgraph_get()
-
-                    dg.scene.collection.objects.link(copy_obj)
-                    copy_obj.update_tag()
-                    bpy.context.view_layer.update()
+            bl_users = dataObjects.get(bl_curve)
+            if not bl_users:
+                continue
 
-                    copy_obj_eval = copy_obj.evaluated_get(dg)
-                    current_bl_mesh = bpy.data.meshes.new_from_object(copy_obj_eval)
+            curveUsers.append((bl_curve, bl_users[0]))
 
-                    dg.scene.collection.objects.unlink(copy_obj)
+    curveMeshes = objsToMeshes([bl_obj for _, bl_obj in curveUsers],
+            not exportSettings['bakeModifiers'])
 
-                    if current_bl_mesh is not None:
-                        current_bl_mesh.name = bl_curve.name
-                        current_bl_mesh[TO_MESH_SOURCE_CUSTOM_PROP] = current_bl_object
-                        temporaryMeshes.append(current_bl_mesh)
-                    else:
-                        skip = True
+    for (bl_curve, current_bl_object), current_bl_mesh in zip(curveUsers, curveMeshes):
 
-                    bpy.data.objects.remove(copy_obj)
+        if current_bl_mesh is None:
+            continue
 
-                    break
+        current_bl_mesh.name = bl_curve.name
+        current_bl_mesh[TO_MESH_SOURCE_CUSTOM_PROP] = current_bl_object
+        temporaryMeshes.append(current_bl_mesh)
 
-            if skip:
-                continue
-
-            filteredMeshes.append(current_bl_mesh)
-            filteredVertexGroups[getPtr(bl_curve)] = current_bl_object.vertex_groups
+        filteredMeshes.append(current_bl_mesh)
+        filteredVertexGroups[getPtr(bl_curve)] = current_bl_object.vertex_groups
 
 
     # fonts
@@ -287,36 +372,23 @@ def filterApply(exportSettings):
         if bl_meta.users == 0:
             continue
 
-        current_bl_meta = bl_meta
-        current_bl_mesh = None
-        current_bl_obj = None
-
-        skip = True
-
-        for bl_obj in filteredObjectsWithIC:
-
-            current_bl_obj = bl_obj
-
-            if current_bl_obj.type == 'META' and current_bl_obj.data == current_bl_meta:
-
-                skip = False
-
-                dg = bpy.context.evaluated_depsgraph_get()
-                obj_eval = current_bl_obj.evaluated_get(dg)
-                current_bl_mesh = bpy.data.meshes.new_from_object(obj_eval)
+        bl_users = dataObjects.get(bl_meta)
+        if not bl_users:
+            continue
 
-                if current_bl_mesh is not None:
-                    current_bl_mesh.name = bl_meta.name
-                    current_bl_mesh[TO_MESH_SOURCE_CUSTOM_PROP] = current_bl_obj
-                    temporaryMeshes.append(current_bl_mesh)
-                else:
-                    skip = True
+        current_bl_obj = bl_users[0]
 
-                break
+        dg = bpy.context.evaluated_depsgraph_get()
+        obj_eval = current_bl_obj.evaluated_get(dg)
+        current_bl_mesh = bpy.data.meshes.new_from_object(obj_eval)
 
-        if skip:
+        if current_bl_mesh is None:
             continue
 
+        current_bl_mesh.name = bl_meta.name
+        current_bl_mesh[TO_MESH_SOURCE_CUSTOM_PROP] = current_bl_obj
+        temporaryMeshes.append(current_bl_mesh)
+
         filteredMeshes.append(current_bl_mesh)
         filteredVertexGroups[getPtr(bl_meta)] = current_bl_obj.vertex_groups
 
@@ -333,30 +405,32 @@ def filterApply(exportSettings):
     filteredMaterials = []
     temporaryMaterials = []
 
-    for bl_mat in getUsedMaterials():
+    # material -> meshes, objects (object-linked slots) and curves using it
+    materialUsers = {}
 
-        if bl_mat.users == 0:
-            continue
+    def addMaterialUser(mat, user):
+        if mat is not None:
+            if mat not in materialUsers:
+                materialUsers[mat] = []
+            materialUsers[mat].append(user)
 
-        for bl_mesh in filteredMeshes:
-            for mat in bl_mesh.materials:
-                if mat == bl_mat and mat not in filteredMaterials:
-                    filteredMaterials.append(mat)
+    for bl_mesh in filteredMeshes:
+        for mat in bl_mesh.materials:
+            addMaterialUser(mat, bl_mesh)
 
-        for bl_obj in filteredObjectsWithIC:
-            if bl_obj.material_slots:
-                for bl_material_slot in bl_obj.material_slots:
-                    if bl_material_slot.link == 'DATA':
-                        continue
+    for bl_obj in filteredObjectsWithIC:
+        for bl_material_slot in bl_obj.material_slots:
+            if bl_material_slot.link != 'DATA':
+                addMaterialUser(bl_material_slot.material, bl_obj)
 
-                    mat = bl_material_slot.material
-                    if mat == bl_mat and mat not in filteredMaterials:
-                        filteredMaterials.append(mat)
+    for bl_curve in filteredCurves:
+        for mat in bl_curve.materials:
+            addMaterialUser(mat, bl_curve)
 
-        for bl_curve in filteredCurves:
-            for mat in bl_curve.materials:
-                if mat == bl_mat and mat not in filteredMaterials:
-                    filteredMaterials.append(mat)
+    # keep the order of bpy.data.materials
+    for bl_mat in getUsedMaterials():
+        if bl_mat.users != 0 and bl_mat in materialUsers:
+            filteredMaterials.append(bl_mat)
 
     curr_world = bpy.context.scene.world
     if curr_world is not None:
@@ -394,55 +468,53 @@ def filterApply(exportSettings):
     exportSettings['filteredMaterials'] = filteredMaterials
     exportSettings['temporaryMaterials'] = temporaryMaterials
 
+    # only groups used by 'EEVEE' materials
+    usedNodeTrees = set()
+    for bl_mat in filteredMaterials:
+        if getMaterialType(bl_mat) == 'EEVEE':
+            usedNodeTrees.update(extractMaterialNodeTrees(bl_mat.node_tree))
+
     filteredNodeGroups = []
     for group in bpy.data.node_groups:
-        if group.users == 0:
-            continue
-
-        # only groups used by 'EEVEE' materials
-        for bl_mat in filteredMaterials:
-            mat_type = getMaterialType(bl_mat)
-            if mat_type == 'EEVEE':
-                if (group not in filteredNodeGroups and
-                        group in extractMaterialNodeTrees(bl_mat.node_tree)):
-                    filteredNodeGroups.append(group)
+        if group.users != 0 and group in usedNodeTrees:
+            filteredNodeGroups.append(group)
 
     exportSettings['filteredNodeGroups'] = filteredNodeGroups
 
 
     filteredTextures = []
+    filteredTexturesSet = set()
 
-    for bl_mat in filteredMaterials:
-        if bl_mat.node_tree and bl_mat.use_nodes:
-            for bl_node in bl_mat.node_tree.nodes:
-                if (isinstance(bl_node, (bpy.types.ShaderNodeTexImage, bpy.types.ShaderNodeTexEnvironment)) and
-                        getTexImage(bl_node) is not None and
-                        getTexImage(bl_node).users != 0 and
-                        getTexImage(bl_node).size[0] > 0 and
-                        getTexImage(bl_node).size[1] > 0 and
-                        bl_node not in filteredTextures):
-                    filteredTextures.append(bl_node)
-
-    for node_group in filteredNodeGroups:
-        for bl_node in node_group.nodes:
-            if (isinstance(bl_node, (bpy.types.ShaderNodeTexImage, bpy.types.ShaderNodeTexEnvironment)) and
-                    getTexImage(bl_node) is not None and
-                    getTexImage(bl_node).users != 0 and
-                    getTexImage(bl_node).size[0] > 0 and
-                    getTexImage(bl_node).size[1] > 0 and
-                    bl_node not in filteredTextures):
+    def texNodeNeedsExport(bl_node):
+        if not isinstance(bl_node, (bpy.types.ShaderNodeTexImage, bpy.types.ShaderNodeTexEnvironment)):
+            return False
+
+        img = getTexImage(bl_node)
+        return (img is not None and img.users != 0 and img.size[0] > 0 and img.size[1] > 0
+                and bl_node not in filteredTexturesSet)
+
+    texNodeTrees = [bl_mat.node_tree for bl_mat in filteredMaterials
+                    if bl_mat.node_tree and bl_mat.use_nodes]
+    texNodeTrees += filteredNodeGroups
+
+    for node_tree in texNodeTrees:
+        for bl_node in node_tree.nodes:
+            if texNodeNeedsExport(bl_node):
                 filteredTextures.append(bl_node)
+                filteredTexturesSet.add(bl_node)
 
     exportSettings['filteredTextures'] = filteredTextures
 
 
     filteredImages = []
+    filteredImagesSet = set()
 
     for bl_texture in filteredTextures:
         img = getTexImage(bl_texture)
-        if img not in filteredImages:
+        if img not in filteredImagesSet:
             img['compression_error_status'] = 0 # no error
             filteredImages.append(img)
+            filteredImagesSet.add(img)
 
     exportSettings['filteredImages'] = filteredImages
 
@@ -488,26 +560,6 @@ def filterApply(exportSettings):
     exportSettings['filteredLightProbes'] = filteredLightProbes
 
 
-    jointIndices = {}
-
-    if exportSettings['skins']:
-        for bl_obj in filteredObjectsWithIC:
-
-            if bl_obj.type != 'MESH':
-                continue
-
-            armature_object = findArmature(bl_obj)
-            if armature_object is None or len(armature_object.pose.bones) == 0:
-                continue
-
-            grp = jointIndices[bl_obj.data.name] = {}
-
-            for bl_bone in armature_object.pose.bones:
-                grp[bl_bone.name] = len(grp)
-
-    exportSettings['jointIndices'] = jointIndices
-
-
     filteredClippingPlanes = []
 
     for bl_obj in bpy.data.objects:
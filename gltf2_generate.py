@@ -15,6 +15,8 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import bpy
+import collections
+import concurrent.futures
 import copy
 import json
 import math
@@ -26,6 +28,7 @@ norm = os.path.normpath
 
 import pluginUtils
 import pluginUtils.gltf as gltf
+import pluginUtils.meshproc
 import pluginUtils.rawdata
 
 log = pluginUtils.log.getLogger('V3D-BL')
@@ -33,6 +36,7 @@ log = pluginUtils.log.getLogger('V3D-BL')
 from .gltf2_animate import *
 from .gltf2_extract import *
 from .gltf2_filter import *
+from .gltf2_session import exportSession
 from .gltf2_get import *
 from .utils import *
 
@@ -40,6 +44,12 @@ from profilehooks import profile
 
 VERSION = '4.9.0'
 
+LOD_MESH_SUFFIX = '_LOD_{ratio}'
+LOD_NODE_SUFFIX = '_LOD{level}'
+
+# min number of objects merged into a single EXT_mesh_gpu_instancing node
+INSTANCING_MIN_COUNT = 2
+
 # Blender default grey color
 PRIMITIVE_MODE_LINES = 1
 PRIMITIVE_MODE_TRIANGLES = 4
@@ -103,6 +113,22 @@ def generateAnimChannel(glTF, blObj, samplerName, path, nodeName, samplers, chan
 
     return None
 
+def generateAnimAccessor(glTF, exportSettings, data, componentType, count, type, filter='NONE'):
+    """
+    Generate an accessor for animation sampler data (keyframe times or values).
+    With meshopt compression enabled the data is compressed and processed with
+    the given filter.
+    """
+
+    compression = getMeshoptMode(exportSettings, 'ATTRIBUTES')
+
+    if compression is not None and filter != 'NONE':
+        return gltf.generateFilteredAccessor(glTF, exportSettings['binary'], data,
+                count, type, filter, exportSettings['meshoptFilterBits'][filter])
+
+    return gltf.generateAccessor(glTF, exportSettings['binary'], data, componentType,
+            count, type, '', compression=compression)
+
 def generateAnimationsParameter(animType, operator, context, exportSettings, glTF, actionName,
         blFcurves, channels, samplers, blObj, blBone, matName, matNodeName, constraintName=None):
     """
@@ -232,12 +258,12 @@ def generateAnimationsParameter(animType, operator, context, exportSettings, glT
                     sampler['interpolation'] = 'LINEAR'
 
                 type = 'SCALAR'
-                input = gltf.generateAccessor(glTF, exportSettings['binary'], finalKeys, componentType, count, type, '')
+                input = generateAnimAccessor(glTF, exportSettings, finalKeys, componentType, count, type)
                 sampler['input'] = input
 
                 count = len(values) // 3
                 type = 'VEC3'
-                output = gltf.generateAccessor(glTF, exportSettings['binary'], values, componentType, count, type, '')
+                output = generateAnimAccessor(glTF, exportSettings, values, componentType, count, type, 'EXPONENTIAL')
                 sampler['output'] = output
 
                 sampler['name'] = samplerName
@@ -334,12 +360,14 @@ def generateAnimationsParameter(animType, operator, context, exportSettings, glT
                 sampler['interpolation'] = 'LINEAR'
 
             type = 'SCALAR'
-            input = gltf.generateAccessor(glTF, exportSettings['binary'], finalKeys, componentType, count, type, '')
+            input = generateAnimAccessor(glTF, exportSettings, finalKeys, componentType, count, type)
             sampler['input'] = input
 
             count = len(values) // 4
             type = 'VEC4'
-            output = gltf.generateAccessor(glTF, exportSettings['binary'], values, componentType, count, type, '')
+            # cubic spline tangents are not unit quaternions
+            outputFilter = 'QUATERNION' if sampler['interpolation'] != 'CUBICSPLINE' else 'NONE'
+            output = generateAnimAccessor(glTF, exportSettings, values, componentType, count, type, outputFilter)
             sampler['output'] = output
 
             sampler['name'] = samplerName
@@ -392,12 +420,12 @@ def generateAnimationsParameter(animType, operator, context, exportSettings, glT
                     sampler['interpolation'] = 'LINEAR'
 
                 type = 'SCALAR'
-                input = gltf.generateAccessor(glTF, exportSettings['binary'], finalKeys, componentType, count, type, '')
+                input = generateAnimAccessor(glTF, exportSettings, finalKeys, componentType, count, type)
                 sampler['input'] = input
 
                 count = len(values) // 3
                 type = 'VEC3'
-                output = gltf.generateAccessor(glTF, exportSettings['binary'], values, componentType, count, type, '')
+                output = generateAnimAccessor(glTF, exportSettings, values, componentType, count, type, 'EXPONENTIAL')
                 sampler['output'] = output
 
                 sampler['name'] = samplerName
@@ -449,12 +477,12 @@ def generateAnimationsParameter(animType, operator, context, exportSettings, glT
                     sampler['interpolation'] = 'LINEAR'
 
                 type = 'SCALAR'
-                input = gltf.generateAccessor(glTF, exportSettings['binary'], finalKeys, componentType, count, type, '')
+                input = generateAnimAccessor(glTF, exportSettings, finalKeys, componentType, count, type)
                 sampler['input'] = input
 
                 count = len(values)
                 type = 'SCALAR'
-                output = gltf.generateAccessor(glTF, exportSettings['binary'], values, componentType, count, type, '')
+                output = generateAnimAccessor(glTF, exportSettings, values, componentType, count, type)
                 sampler['output'] = output
 
                 sampler['name'] = samplerName
@@ -506,7 +534,7 @@ def generateAnimationsParameter(animType, operator, context, exportSettings, glT
                     sampler['interpolation'] = 'LINEAR'
 
                 type = 'SCALAR'
-                input = gltf.generateAccessor(glTF, exportSettings['binary'], finalKeys, componentType, count, type, '')
+                input = generateAnimAccessor(glTF, exportSettings, finalKeys, componentType, count, type)
                 sampler['input'] = input
 
                 count = len(values) // defValDim
@@ -514,7 +542,7 @@ def generateAnimationsParameter(animType, operator, context, exportSettings, glT
                     type = 'SCALAR'
                 else:
                     type = 'VEC4'
-                output = gltf.generateAccessor(glTF, exportSettings['binary'], values, componentType, count, type, '')
+                output = generateAnimAccessor(glTF, exportSettings, values, componentType, count, type)
                 sampler['output'] = output
 
                 sampler['name'] = samplerName
@@ -562,12 +590,12 @@ def generateAnimationsParameter(animType, operator, context, exportSettings, glT
                     sampler['interpolation'] = 'LINEAR'
 
                 type = 'SCALAR'
-                input = gltf.generateAccessor(glTF, exportSettings['binary'], finalKeys, componentType, count, type, '')
+                input = generateAnimAccessor(glTF, exportSettings, finalKeys, componentType, count, type)
                 sampler['input'] = input
 
                 count = len(values)
                 type = 'SCALAR'
-                output = gltf.generateAccessor(glTF, exportSettings['binary'], values, componentType, count, type, '')
+                output = generateAnimAccessor(glTF, exportSettings, values, componentType, count, type)
                 sampler['output'] = output
 
                 sampler['name'] = samplerName
@@ -637,12 +665,12 @@ def generateAnimationsParameter(animType, operator, context, exportSettings, glT
                 values[i] *= ratio
 
             type = 'SCALAR'
-            input = gltf.generateAccessor(glTF, exportSettings['binary'], finalKeys, componentType, count, type, '')
+            input = generateAnimAccessor(glTF, exportSettings, finalKeys, componentType, count, type)
             sampler['input'] = input
 
             count = len(values)
             type = 'SCALAR'
-            output = gltf.generateAccessor(glTF, exportSettings['binary'], values, componentType, count, type, '')
+            output = generateAnimAccessor(glTF, exportSettings, values, componentType, count, type)
             sampler['output'] = output
 
             sampler['name'] = samplerName
@@ -1347,6 +1375,495 @@ def generateLightProbes(operator, context, exportSettings, glTF):
         gltf.appendExtension(glTF, 'S8S_v3d_light_probes', glTF, {'lightProbes': probes})
 
 
+INTERLEAVED_ATTR_LAYOUT = {
+    'POSITION': (3, 'VEC3'),
+    'NORMAL': (3, 'VEC3'),
+    'TANGENT': (4, 'VEC4'),
+    'TEXCOORD_': (2, 'VEC2'),
+    'COLOR_': (4, 'VEC4')
+}
+
+# max values of the normalized integer types used by KHR_mesh_quantization
+QUANTIZED_TYPE_MAX = {
+    'BYTE': 127,
+    'UNSIGNED_BYTE': 255,
+    'SHORT': 32767,
+    'UNSIGNED_SHORT': 65535
+}
+
+def getInterleavedAttrLayout(attrName):
+    return (INTERLEAVED_ATTR_LAYOUT.get(attrName) or
+            INTERLEAVED_ATTR_LAYOUT.get(attrName.rstrip('0123456789')))
+
+def optimizeMeshPrimitive(internal_primitive):
+    """
+    Reorder triangles for the post-transform vertex cache and overdraw, then
+    reorder vertices in the order of their first use.
+    """
+
+    attributes = internal_primitive['attributes']
+    vertexCount = len(attributes['POSITION']) // 3
+
+    indices = pluginUtils.meshproc.optimizeVertexCache(internal_primitive['indices'], vertexCount)
+    indices = pluginUtils.meshproc.optimizeOverdraw(indices, attributes['POSITION'], vertexCount)
+
+    compactMeshPrimitive(internal_primitive, indices)
+
+def compactMeshPrimitive(internal_primitive, indices):
+    """
+    Assign new indices to the primitive, vertices are reordered in the order
+    of their first use, unused vertices are removed.
+    """
+
+    attributes = internal_primitive['attributes']
+    vertexCount = len(attributes['POSITION']) // 3
+
+    newToOld = pluginUtils.meshproc.optimizeVertexFetchRemap(indices, vertexCount)
+    oldToNew = np.zeros(vertexCount, dtype=np.uint32)
+    oldToNew[newToOld] = np.arange(len(newToOld), dtype=np.uint32)
+
+    internal_primitive['indices'] = oldToNew[indices]
+    if 'max_index' in internal_primitive:
+        internal_primitive['max_index'] = len(newToOld) - 1
+
+    for name, data in attributes.items():
+        attributes[name] = np.asarray(data).reshape(vertexCount, -1)[newToOld].reshape(-1)
+
+def getMeshSrcDatablock(bl_mesh):
+    return (bl_mesh.get(TO_MESH_SOURCE_CUSTOM_PROP).data
+            if bl_mesh.get(TO_MESH_SOURCE_CUSTOM_PROP) else bl_mesh)
+
+def getObjLODRatios(bl_obj):
+    """
+    Triangle ratios of the object LOD levels, from the most to the least
+    detailed one.
+    """
+
+    v3d = bl_obj.v3d
+    ratios = {round(ratio, 4) for ratio in v3d.lod_ratios[:v3d.lod_levels] if ratio < 1}
+    return sorted(ratios, reverse=True)
+
+def getMeshLODRatios(exportSettings, srcDatablock):
+    """
+    LOD ratios requested by all objects using the given mesh datablock.
+    """
+
+    ratios = set()
+
+    for bl_obj in exportSettings['dataObjects'].get(srcDatablock, []):
+        ratios.update(getObjLODRatios(bl_obj))
+
+    return sorted(ratios, reverse=True)
+
+def getLODMeshId(srcPtr, ratio):
+    return '{}_LOD_{}'.format(srcPtr, ratio)
+
+def simplifyMeshPrimitives(exportSettings, internal_primitives, ratio):
+    """
+    Generate LOD primitives having the given ratio of the source triangles.
+    """
+
+    lod_primitives = []
+
+    for internal_primitive in internal_primitives:
+        attributes = internal_primitive['attributes']
+        indices = internal_primitive['indices']
+
+        indices = pluginUtils.meshproc.simplifyMesh(indices, attributes['POSITION'],
+                len(attributes['POSITION']) // 3, int(len(indices) * ratio),
+                exportSettings['lodMaxError'])
+
+        if len(indices) == 0:
+            continue
+
+        lod_primitive = {
+            'material': internal_primitive['material'],
+            'useNodeAttrs': internal_primitive['useNodeAttrs'],
+            'indices': indices,
+            'attributes': dict(attributes)
+        }
+
+        if exportSettings['optimizeMeshes']:
+            optimizeMeshPrimitive(lod_primitive)
+        else:
+            compactMeshPrimitive(lod_primitive, indices)
+
+        lod_primitives.append(lod_primitive)
+
+    return lod_primitives
+
+def meshUsersAllowDequant(exportSettings, srcDatablock):
+    """
+    Check that the dequantization transform can be folded into the nodes of
+    all objects using the given mesh datablock. The transform is not allowed
+    for nodes having children, animations, constraints or skinning, as well as
+    for nodes affected by the engine in runtime.
+    """
+
+    for bl_obj in exportSettings['dataObjects'].get(srcDatablock, []):
+        if (len(bl_obj.children) or bl_obj.animation_data is not None or
+                len(bl_obj.constraints) or findArmature(bl_obj) is not None or
+                bl_obj.instance_type == 'COLLECTION' or
+                objHasFixOrthoZoom(bl_obj) or objHasCanvasFitParams(bl_obj) or
+                bl_obj.v3d.canvas_break_enabled):
+            return False
+
+    return True
+
+def calcMeshDequantization(exportSettings, internal_primitives):
+    """
+    Calculate (offset, scale) of the dequantization transform shared by all
+    primitives of the mesh, positions are stored as normalized SHORT values.
+    Returns None if the position error bound can't be met.
+    """
+
+    bboxMin = None
+    bboxMax = None
+
+    for internal_primitive in internal_primitives:
+        positions = np.asarray(internal_primitive['attributes']['POSITION'],
+                dtype=np.float64).reshape(-1, 3)
+
+        if not len(positions):
+            continue
+
+        primMin = positions.min(axis=0)
+        primMax = positions.max(axis=0)
+
+        bboxMin = primMin if bboxMin is None else np.minimum(bboxMin, primMin)
+        bboxMax = primMax if bboxMax is None else np.maximum(bboxMax, primMax)
+
+    if bboxMin is None:
+        return None
+
+    offset = (bboxMin + bboxMax) / 2
+    # NOTE: uniform scale, so that normals are not affected
+    scale = max(float(np.max(bboxMax - bboxMin)) / 2, 1e-8)
+
+    if scale / QUANTIZED_TYPE_MAX['SHORT'] / 2 > exportSettings['quantizeErrors']['POSITION']:
+        return None
+
+    return offset, scale
+
+def getQuantizedType(exportSettings, errorName, signed):
+    """
+    Get the smallest normalized integer type satisfying the error bound or
+    None if only FLOAT can be used.
+    """
+
+    maxError = exportSettings['quantizeErrors'][errorName]
+
+    for componentType in (['BYTE', 'SHORT'] if signed else ['UNSIGNED_BYTE', 'UNSIGNED_SHORT']):
+        if 0.5 / QUANTIZED_TYPE_MAX[componentType] <= maxError:
+            return componentType
+
+    return None
+
+def quantizeNormalized(data, componentType):
+    maxValue = QUANTIZED_TYPE_MAX[componentType]
+    minValue = 0 if componentType.startswith('UNSIGNED') else -maxValue
+
+    data = np.rint(np.asarray(data, dtype=np.float64) * maxValue)
+    return np.clip(data, minValue, maxValue).astype(gltf.GLTF_TO_NP_DTYPE[componentType])
+
+def quantizeMeshAttrs(exportSettings, internal_attributes, dequant):
+    """
+    Convert static vertex attributes to the normalized integer types allowed by
+    KHR_mesh_quantization. Returns converted attributes along with the dict of
+    their component types, attributes not present in the dict are stored as
+    FLOAT. Morph target deltas are kept as FLOAT, position deltas are scaled
+    to match the quantized positions.
+    """
+
+    attrs = dict(internal_attributes)
+    attrTypes = {}
+
+    if dequant is not None:
+        offset, scale = dequant
+
+        positions = np.asarray(attrs['POSITION'], dtype=np.float64).reshape(-1, 3)
+        attrs['POSITION'] = quantizeNormalized((positions - offset) / scale, 'SHORT').reshape(-1)
+        attrTypes['POSITION'] = 'SHORT'
+
+        for attrName in internal_attributes:
+            if attrName.startswith('MORPH_POSITION_'):
+                attrs[attrName] = (np.asarray(attrs[attrName], dtype=np.float64)
+                        / scale).astype(np.float32)
+
+    for attrName in ['NORMAL', 'TANGENT']:
+        if attrs.get(attrName) is None:
+            continue
+
+        componentType = getQuantizedType(exportSettings, attrName, True)
+        if componentType is not None:
+            attrs[attrName] = quantizeNormalized(attrs[attrName], componentType)
+            attrTypes[attrName] = componentType
+
+    for attrName in internal_attributes:
+        if not attrName.startswith('TEXCOORD_') or attrs[attrName] is None:
+            continue
+
+        # normalized values can represent the [0, 1] range only
+        texcoords = np.asarray(attrs[attrName])
+        if not texcoords.size or texcoords.min() < 0 or texcoords.max() > 1:
+            continue
+
+        componentType = getQuantizedType(exportSettings, 'TEXCOORD', False)
+        if componentType is not None:
+            attrs[attrName] = quantizeNormalized(texcoords, componentType)
+            attrTypes[attrName] = componentType
+
+    return attrs, attrTypes
+
+def calcDequantMatrix(dequant):
+    """
+    Dequantization transform in Blender coordinates, to be applied on top of
+    the object's matrix.
+    """
+
+    offset, scale = dequant
+
+    mat_trans = mathutils.Matrix.Translation((offset[0], -offset[2], offset[1]))
+    mat_sca = mathutils.Matrix.Scale(scale, 4)
+
+    return mat_trans @ mat_sca
+
+def generateInterleavedAttrs(glTF, exportSettings, internal_attributes, attrTypes):
+    """
+    Pack static vertex attributes of a primitive into a single strided buffer
+    view. Returns a dict of the generated accessors, empty if interleaving is
+    disabled or not possible. Skinning and morph target data are always
+    written as separate accessors.
+    """
+
+    if not exportSettings['interleaveAttrs']:
+        return {}
+
+    names = []
+    attrs = []
+
+    for name, data in internal_attributes.items():
+        layout = getInterleavedAttrLayout(name)
+        if layout is None or data is None:
+            continue
+
+        componentType = attrTypes.get(name, 'FLOAT')
+
+        names.append(name)
+        attrs.append((data, componentType, len(data) // layout[0], layout[1],
+                componentType != 'FLOAT'))
+
+    # nothing to interleave
+    if len(attrs) < 2:
+        return {}
+
+    accessors = gltf.generateInterleavedAccessors(glTF, exportSettings['binary'],
+            attrs, 'ARRAY_BUFFER', getMeshoptMode(exportSettings, 'ATTRIBUTES'))
+
+    if accessors is None:
+        return {}
+
+    return dict(zip(names, accessors))
+
+def generateMeshAttrAccessor(glTF, exportSettings, interleaved, attrName, data,
+        componentType, count, type, srcData=None):
+    """
+    Get the accessor of the given vertex attribute, using the interleaved one
+    if available. srcData is the unquantized attribute data used for meshopt
+    filters.
+    """
+
+    if attrName in interleaved:
+        return interleaved[attrName]
+
+    compression = getMeshoptMode(exportSettings, 'ATTRIBUTES')
+
+    # quantized normals and tangents are better compressed with the
+    # octahedral filter, which has the same output types
+    if (compression is not None and srcData is not None and
+            attrName in ['NORMAL', 'TANGENT'] and componentType != 'FLOAT'):
+        return gltf.generateFilteredAccessor(glTF, exportSettings['binary'], srcData,
+                count, type, 'OCTAHEDRAL', getOctFilterBits(exportSettings, attrName),
+                'ARRAY_BUFFER')
+
+    # quantized attributes are normalized, their elements should be aligned to
+    # 4 bytes, which is guaranteed by the strided layout
+    if componentType != 'FLOAT':
+        accessors = gltf.generateInterleavedAccessors(glTF, exportSettings['binary'],
+                [(data, componentType, count, type, True)], 'ARRAY_BUFFER', compression)
+        return accessors[0] if accessors is not None else -1
+
+    return gltf.generateAccessor(glTF, exportSettings['binary'], data,
+            componentType, count, type, 'ARRAY_BUFFER', compression=compression)
+
+def generateMorphAccessor(glTF, exportSettings, data, componentType, count, type, scale=1.0):
+    """
+    Generate an accessor for morph target deltas, stored as a sparse accessor
+    if the fraction of non-zero deltas is below the threshold. scale is the
+    dequantization scale applied to the deltas, so that the zero tolerance is
+    measured in scene units.
+    """
+
+    tolerance = exportSettings['morphSparseTolerance'] / scale
+
+    deltas = np.asarray(data, dtype=np.float32).reshape(count, -1)
+    nonZeroCount = np.count_nonzero(np.any(np.abs(deltas) > tolerance, axis=1))
+
+    if nonZeroCount < count * exportSettings['morphSparseThreshold']:
+        return gltf.generateSparseAccessor(glTF, exportSettings['binary'], deltas,
+                componentType, count, type, tolerance,
+                getMeshoptMode(exportSettings, 'ATTRIBUTES'))
+
+    return gltf.generateAccessor(glTF, exportSettings['binary'], data, componentType,
+            count, type, '', compression=getMeshoptMode(exportSettings, 'ATTRIBUTES'))
+
+def getMeshoptMode(exportSettings, mode):
+    """
+    Get the EXT_meshopt_compression mode for generated buffer views or None
+    if the compression is disabled.
+    """
+
+    return mode if exportSettings['meshoptCompression'] else None
+
+def getOctFilterBits(exportSettings, attrName):
+    """
+    Get the smallest bit count of the octahedral filter satisfying the
+    attribute error bound, the error is estimated conservatively.
+    """
+
+    maxError = exportSettings['quantizeErrors'][attrName]
+
+    for bits in range(8, 16):
+        if 2 / ((1 << (bits - 1)) - 1) <= maxError:
+            return bits
+
+    return 16
+
+def buildMeshPrimitives(exportSettings, meshData, cacheKey=None):
+    """
+    Worker part of the mesh extraction, touches no Blender data.
+    """
+
+    internal_primitives = buildPrimitives(meshData, exportSettings)
+
+    if exportSettings['optimizeMeshes']:
+        for internal_primitive in internal_primitives:
+            optimizeMeshPrimitive(internal_primitive)
+
+    if cacheKey is not None:
+        exportSettings['meshCache'].put(cacheKey, internal_primitives)
+
+    return internal_primitives
+
+def getMeshMetadata(exportSettings, bl_mesh):
+    """
+    Mesh-level data exported along with the primitives. It's taken from the
+    mesh the primitives are extracted from (e.g. the one with baked
+    modifiers), so it's kept together with them in the export session.
+    """
+
+    shapeKeys = None
+    if bl_mesh.shape_keys is not None and len(bl_mesh.shape_keys.key_blocks) > 1:
+        shapeKeys = [(bl_shape_key.name, bl_shape_key.value)
+                     for bl_shape_key in bl_mesh.shape_keys.key_blocks
+                     if (bl_shape_key != bl_shape_key.relative_key
+                         and bl_shape_key != bl_mesh.shape_keys.reference_key)]
+
+    return {
+        'materials': [bl_mat.name if bl_mat is not None else None for bl_mat in bl_mesh.materials],
+        # (name, active render)
+        'uvLayers': [(uv_layer.name, uv_layer.active_render) for uv_layer in bl_mesh.uv_layers],
+        'colorLayers': [color_attr.name for color_attr in bl_mesh.color_attributes],
+        # (name, value) of exported shape keys or None if there are no morph targets
+        'shapeKeys': shapeKeys,
+        'customProps': createCustomProperty(bl_mesh) if exportSettings['exportCustomProps'] else None
+    }
+
+def extractMeshesPrimitives(glTF, exportSettings, bl_meshes):
+    """
+    Extract internal primitives and metadata of the given meshes, yielded in
+    the same order. Blender data is captured on the main thread, while the
+    NumPy-heavy part is performed in a pool of worker threads or loaded from
+    the mesh cache.
+    """
+
+    filteredVertexGroups = exportSettings['filteredVertexGroups']
+    jointIndices = exportSettings['jointIndices']
+    meshCache = exportSettings['meshCache']
+    sessionMeshes = exportSettings['sessionMeshes']
+
+    numThreads = exportSettings['extractThreads']
+
+    # limit the number of captured meshes kept in memory
+    maxPending = 2 * numThreads
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=numThreads) as executor:
+        pending = collections.deque()
+
+        for bl_mesh in bl_meshes:
+            srcDatablock = getMeshSrcDatablock(bl_mesh)
+            srcPtr = getPtr(srcDatablock)
+
+            cacheKey = None
+
+            if objDataUsesLineRendering(srcDatablock):
+                meshMeta = getMeshMetadata(exportSettings, bl_mesh)
+                future = concurrent.futures.Future()
+                future.set_result(extractLinePrimitives(glTF, bl_mesh, exportSettings))
+            elif srcPtr in sessionMeshes:
+                log.info('Reusing {} primitives from the previous export'.format(srcDatablock.name))
+                internal_primitives, meshMeta, cacheKey = sessionMeshes[srcPtr]
+                future = concurrent.futures.Future()
+                future.set_result(internal_primitives)
+
+                # keep the mesh cache entry from being pruned
+                if meshCache is not None:
+                    if cacheKey is None:
+                        # extracted with the mesh cache disabled
+                        meshCache.keepUnused()
+                    elif not meshCache.markUsed(cacheKey):
+                        meshCache.put(cacheKey, internal_primitives)
+            else:
+                meshMeta = getMeshMetadata(exportSettings, bl_mesh)
+
+                srcName = srcDatablock.name
+                meshData = captureMeshData(bl_mesh, filteredVertexGroups[getPtr(srcDatablock)],
+                        jointIndices.get(srcName, {}), exportSettings)
+
+                cached = None
+                if meshCache is not None:
+                    cacheKey = getMeshDataFingerprint(meshData, exportSettings)
+                    cached = meshCache.get(cacheKey)
+
+                if cached is not None:
+                    log.info('Using cached {} primitives'.format(bl_mesh.name))
+                    future = concurrent.futures.Future()
+                    future.set_result(cached)
+                else:
+                    future = executor.submit(buildMeshPrimitives, exportSettings, meshData, cacheKey)
+
+            pending.append((srcPtr, future, meshMeta, cacheKey))
+
+            while len(pending) > maxPending or (pending and pending[0][1].done()):
+                yield getExtractedPrimitives(exportSettings, *pending.popleft())
+
+        while pending:
+            yield getExtractedPrimitives(exportSettings, *pending.popleft())
+
+def getExtractedPrimitives(exportSettings, srcPtr, future, meshMeta, cacheKey):
+    """
+    Wait for the extracted primitives and keep them in the export session.
+    """
+
+    internal_primitives = future.result()
+
+    sessionKey = exportSettings['sessionMeshKeys'].get(srcPtr)
+    if sessionKey is not None:
+        exportSession.setMeshPrimitives(srcPtr, sessionKey[0], sessionKey[1],
+                internal_primitives, meshMeta, cacheKey)
+
+    return internal_primitives, meshMeta
+
 def generateMeshes(operator, context, exportSettings, glTF):
     """
     Generates the top level meshes entry.
@@ -1356,29 +1873,55 @@ def generateMeshes(operator, context, exportSettings, glTF):
 
     filteredMeshes = exportSettings['filteredMeshes']
 
-    filteredVertexGroups = exportSettings['filteredVertexGroups']
-
-    jointIndices = exportSettings['jointIndices']
+    # mesh index -> (offset, scale) of quantized positions, see generateNodeInstance()
+    dequantTransforms = exportSettings['meshDequantTransforms'] = {}
 
+    # LOD meshes (lodRatio is not None) follow the mesh they are generated from
+    meshJobs = []
     for bl_mesh in filteredMeshes:
+        meshJobs.append((bl_mesh, None))
+
+        srcDatablock = getMeshSrcDatablock(bl_mesh)
+        if not objDataUsesLineRendering(srcDatablock):
+            for lodRatio in getMeshLODRatios(exportSettings, srcDatablock):
+                meshJobs.append((bl_mesh, lodRatio))
 
-        srcDatablock = (bl_mesh.get(TO_MESH_SOURCE_CUSTOM_PROP).data
-                if bl_mesh.get(TO_MESH_SOURCE_CUSTOM_PROP) else bl_mesh)
+    # (internal primitives, dequantization, metadata) of the last processed LOD source
+    lodSource = None
+
+    extractedPrimitives = extractMeshesPrimitives(glTF, exportSettings, filteredMeshes)
+
+    for bl_mesh, lodRatio in meshJobs:
+
+        srcDatablock = getMeshSrcDatablock(bl_mesh)
         srcName = srcDatablock.name
         srcPtr = getPtr(srcDatablock)
         is_line = objDataUsesLineRendering(srcDatablock)
 
-        if is_line:
-            internal_primitives = extractLinePrimitives(glTF, bl_mesh,
-                    exportSettings)
+        if lodRatio is not None:
+            if lodSource is None:
+                continue
+            log.info('Generating {} LOD with ratio {}'.format(srcName, lodRatio))
+            internal_primitives = simplifyMeshPrimitives(exportSettings, lodSource[0], lodRatio)
+            meshMeta = lodSource[2]
         else:
-            internal_primitives = extractPrimitives(glTF, bl_mesh,
-                    filteredVertexGroups[srcPtr], jointIndices.get(srcName, {}),
-                    exportSettings)
+            lodSource = None
+            internal_primitives, meshMeta = next(extractedPrimitives)
 
         if len(internal_primitives) == 0:
             continue
 
+        dequant = None
+        if lodRatio is not None:
+            # LOD positions fit into the range of the source mesh
+            dequant = lodSource[1]
+        elif exportSettings['quantizeMeshes'] and not is_line:
+            if meshUsersAllowDequant(exportSettings, srcDatablock):
+                dequant = calcMeshDequantization(exportSettings, internal_primitives)
+
+        if lodRatio is None:
+            lodSource = (internal_primitives, dequant, meshMeta)
+
 
         # Property: mesh
 
@@ -1394,6 +1937,8 @@ def generateMeshes(operator, context, exportSettings, glTF):
 
         primitives = []
 
+        is_quantized = False
+
         for internal_primitive in internal_primitives:
 
             primitive = {}
@@ -1416,7 +1961,7 @@ def generateMeshes(operator, context, exportSettings, glTF):
 
             componentType = "UNSIGNED_BYTE"
 
-            max_index = max(indices)
+            max_index = int(np.max(indices))
 
             # NOTE: avoiding WebGL2 PRIMITIVE_RESTART_FIXED_INDEX behavior
             # see: https://www.khronos.org/registry/webgl/specs/latest/2.0/#5.18
@@ -1430,6 +1975,10 @@ def generateMeshes(operator, context, exportSettings, glTF):
                 log.error('Invalid max_index: ' + str(max_index))
                 continue
 
+            # meshopt index codecs support 16 and 32-bit indices only
+            if exportSettings['meshoptCompression'] and componentType == "UNSIGNED_BYTE":
+                componentType = "UNSIGNED_SHORT"
+
             if exportSettings['forceIndices']:
                 componentType = exportSettings['indices']
 
@@ -1437,7 +1986,8 @@ def generateMeshes(operator, context, exportSettings, glTF):
 
             type = "SCALAR"
 
-            indices_index = gltf.generateAccessor(glTF, exportSettings['binary'], indices, componentType, count, type, "ELEMENT_ARRAY_BUFFER")
+            indices_index = gltf.generateAccessor(glTF, exportSettings['binary'], indices, componentType, count, type, "ELEMENT_ARRAY_BUFFER",
+                    compression=getMeshoptMode(exportSettings, 'INDICES' if is_line else 'TRIANGLES'))
 
             if indices_index < 0:
                 log.error('Could not create accessor for indices')
@@ -1451,15 +2001,26 @@ def generateMeshes(operator, context, exportSettings, glTF):
 
             internal_attributes = internal_primitive['attributes']
 
+            attrTypes = {}
+            if exportSettings['quantizeMeshes'] and not is_line:
+                internal_attributes, attrTypes = quantizeMeshAttrs(exportSettings,
+                        internal_attributes, dequant)
+                is_quantized = is_quantized or len(attrTypes) > 0
+
+            interleaved = {}
+            if not is_line:
+                interleaved = generateInterleavedAttrs(glTF, exportSettings,
+                        internal_attributes, attrTypes)
+
             internal_position = internal_attributes['POSITION']
 
-            componentType = "FLOAT"
+            componentType = attrTypes.get('POSITION', "FLOAT")
 
             count = len(internal_position) // 3
 
             type = "VEC3"
 
-            position = gltf.generateAccessor(glTF, exportSettings['binary'], internal_position, componentType, count, type, "ARRAY_BUFFER")
+            position = generateMeshAttrAccessor(glTF, exportSettings, interleaved, 'POSITION', internal_position, componentType, count, type)
 
             if position < 0:
                 log.error('Could not create accessor for position')
@@ -1471,14 +2032,15 @@ def generateMeshes(operator, context, exportSettings, glTF):
             if internal_attributes.get('NORMAL') is not None:
                 internal_normal = internal_attributes['NORMAL']
 
-                componentType = "FLOAT"
+                componentType = attrTypes.get('NORMAL', "FLOAT")
 
                 count = len(internal_normal) // 3
 
                 type = "VEC3"
 
-                normal = gltf.generateAccessor(glTF, exportSettings['binary'],
-                        internal_normal, componentType, count, type, "ARRAY_BUFFER")
+                normal = generateMeshAttrAccessor(glTF, exportSettings, interleaved,
+                        'NORMAL', internal_normal, componentType, count, type,
+                        internal_primitive['attributes']['NORMAL'])
 
                 if normal < 0:
                     log.error('Could not create accessor for normal')
@@ -1491,13 +2053,14 @@ def generateMeshes(operator, context, exportSettings, glTF):
             if internal_attributes.get('TANGENT') is not None:
                 internal_tangent = internal_attributes['TANGENT']
 
-                componentType = "FLOAT"
+                componentType = attrTypes.get('TANGENT', "FLOAT")
 
                 count = len(internal_tangent) // 4
 
                 type = "VEC4"
 
-                tangent = gltf.generateAccessor(glTF, exportSettings['binary'], internal_tangent, componentType, count, type, "ARRAY_BUFFER")
+                tangent = generateMeshAttrAccessor(glTF, exportSettings, interleaved, 'TANGENT', internal_tangent, componentType, count, type,
+                        internal_primitive['attributes']['TANGENT'])
 
                 if tangent < 0:
                     log.error('Could not create accessor for tangent')
@@ -1509,6 +2072,8 @@ def generateMeshes(operator, context, exportSettings, glTF):
 
             v3dExt['uvLayers'] = {}
 
+            uvLayers = meshMeta['uvLayers']
+
             texcoord_index = 0
             process_texcoord = True
             while process_texcoord:
@@ -1517,13 +2082,13 @@ def generateMeshes(operator, context, exportSettings, glTF):
                 if internal_attributes.get(texcoord_id) is not None:
                     internal_texcoord = internal_attributes[texcoord_id]
 
-                    componentType = "FLOAT"
+                    componentType = attrTypes.get(texcoord_id, "FLOAT")
 
                     count = len(internal_texcoord) // 2
 
                     type = "VEC2"
 
-                    texcoord = gltf.generateAccessor(glTF, exportSettings['binary'], internal_texcoord, componentType, count, type, "ARRAY_BUFFER")
+                    texcoord = generateMeshAttrAccessor(glTF, exportSettings, interleaved, texcoord_id, internal_texcoord, componentType, count, type)
 
                     if texcoord < 0:
                         process_texcoord = False
@@ -1531,7 +2096,7 @@ def generateMeshes(operator, context, exportSettings, glTF):
                         continue
 
                     if internal_primitive['useNodeAttrs']:
-                        uv_layer_name = bl_mesh.uv_layers[texcoord_index].name
+                        uv_layer_name = uvLayers[texcoord_index][0]
                         v3dExt['uvLayers'][uv_layer_name] = texcoord_id;
 
                     attributes[texcoord_id] = texcoord
@@ -1541,9 +2106,9 @@ def generateMeshes(operator, context, exportSettings, glTF):
                     process_texcoord = False
 
             # swap UV coords, set active render UV as first (as TEXCOORD_0)
-            if len(bl_mesh.uv_layers) > 0 and not bl_mesh.uv_layers[0].active_render:
-                for texcoord_index in range(len(bl_mesh.uv_layers)):
-                    if bl_mesh.uv_layers[texcoord_index].active_render:
+            if len(uvLayers) > 0 and not uvLayers[0][1]:
+                for texcoord_index in range(len(uvLayers)):
+                    if uvLayers[texcoord_index][1]:
                         texcoord_id = 'TEXCOORD_' + str(texcoord_index)
 
                         texcoord_0 = attributes['TEXCOORD_0']
@@ -1551,10 +2116,10 @@ def generateMeshes(operator, context, exportSettings, glTF):
                         attributes[texcoord_id] = texcoord_0
 
                         if internal_primitive['useNodeAttrs']:
-                            old_uv_layer_name = bl_mesh.uv_layers[0].name
+                            old_uv_layer_name = uvLayers[0][0]
                             v3dExt['uvLayers'][old_uv_layer_name] = texcoord_id;
 
-                            new_uv_layer_name = bl_mesh.uv_layers[texcoord_index].name
+                            new_uv_layer_name = uvLayers[texcoord_index][0]
                             v3dExt['uvLayers'][new_uv_layer_name] = 'TEXCOORD_0';
                         break
 
@@ -1576,7 +2141,7 @@ def generateMeshes(operator, context, exportSettings, glTF):
 
                     type = "VEC4"
 
-                    color = gltf.generateAccessor(glTF, exportSettings['binary'], internal_color, componentType, count, type, "ARRAY_BUFFER")
+                    color = generateMeshAttrAccessor(glTF, exportSettings, interleaved, color_id, internal_color, componentType, count, type)
 
                     if color < 0:
                         process_color = False
@@ -1584,7 +2149,7 @@ def generateMeshes(operator, context, exportSettings, glTF):
                         continue
 
                     if internal_primitive['useNodeAttrs']:
-                        vc_layer_name = bl_mesh.color_attributes[color_index].name
+                        vc_layer_name = meshMeta['colorLayers'][color_index]
                         v3dExt['colorLayers'][vc_layer_name] = color_id;
 
                     attributes[color_id] = color
@@ -1612,7 +2177,8 @@ def generateMeshes(operator, context, exportSettings, glTF):
 
                         type = "VEC4"
 
-                        joint = gltf.generateAccessor(glTF, exportSettings['binary'], internal_joint, componentType, count, type, "ARRAY_BUFFER")
+                        joint = gltf.generateAccessor(glTF, exportSettings['binary'], internal_joint, componentType, count, type, "ARRAY_BUFFER",
+                                compression=getMeshoptMode(exportSettings, 'ATTRIBUTES'))
 
                         if joint < 0:
                             process_bone = False
@@ -1632,7 +2198,8 @@ def generateMeshes(operator, context, exportSettings, glTF):
 
                         type = "VEC4"
 
-                        weight = gltf.generateAccessor(glTF, exportSettings['binary'], internal_weight, componentType, count, type, "ARRAY_BUFFER")
+                        weight = gltf.generateAccessor(glTF, exportSettings['binary'], internal_weight, componentType, count, type, "ARRAY_BUFFER",
+                                compression=getMeshoptMode(exportSettings, 'ATTRIBUTES'))
 
                         if weight < 0:
                             process_bone = False
@@ -1650,82 +2217,82 @@ def generateMeshes(operator, context, exportSettings, glTF):
 
 
             if exportSettings['morph']:
-                if bl_mesh.shape_keys is not None:
+                if meshMeta['shapeKeys'] is not None:
                     targets = []
 
                     morph_index = 0
-                    for bl_shape_key in bl_mesh.shape_keys.key_blocks:
-                        if bl_shape_key != bl_shape_key.relative_key and bl_shape_key != bl_mesh.shape_keys.reference_key:
+                    for _ in meshMeta['shapeKeys']:
 
-                            target_position_id = 'MORPH_POSITION_' + str(morph_index)
-                            target_normal_id = 'MORPH_NORMAL_' + str(morph_index)
-                            target_tangent_id = 'MORPH_TANGENT_' + str(morph_index)
+                        target_position_id = 'MORPH_POSITION_' + str(morph_index)
+                        target_normal_id = 'MORPH_NORMAL_' + str(morph_index)
+                        target_tangent_id = 'MORPH_TANGENT_' + str(morph_index)
 
-                            if internal_attributes.get(target_position_id) is not None:
-                                internal_target_position = internal_attributes[target_position_id]
+                        if internal_attributes.get(target_position_id) is not None:
+                            internal_target_position = internal_attributes[target_position_id]
 
-                                componentType = "FLOAT"
+                            componentType = "FLOAT"
 
-                                count = len(internal_target_position) // 3
+                            count = len(internal_target_position) // 3
 
-                                type = "VEC3"
+                            type = "VEC3"
 
-                                target_position = gltf.generateAccessor(glTF, exportSettings['binary'], internal_target_position, componentType, count, type, "")
+                            target_position = generateMorphAccessor(glTF, exportSettings, internal_target_position, componentType, count, type,
+                                    dequant[1] if dequant is not None else 1.0)
 
-                                if target_position < 0:
-                                    log.error('Could not create accessor for ' + target_position_id)
-                                    continue
+                            if target_position < 0:
+                                log.error('Could not create accessor for ' + target_position_id)
+                                continue
 
 
 
-                                target = {
-                                    'POSITION' : target_position
-                                }
+                            target = {
+                                'POSITION' : target_position
+                            }
 
 
-                                if exportSettings['morphNormal'] and internal_attributes.get(target_normal_id) is not None:
+                            if exportSettings['morphNormal'] and internal_attributes.get(target_normal_id) is not None:
 
-                                    internal_target_normal = internal_attributes[target_normal_id]
+                                internal_target_normal = internal_attributes[target_normal_id]
 
-                                    componentType = "FLOAT"
+                                componentType = "FLOAT"
 
-                                    count = len(internal_target_normal) // 3
+                                count = len(internal_target_normal) // 3
 
-                                    type = "VEC3"
+                                type = "VEC3"
 
-                                    target_normal = gltf.generateAccessor(glTF, exportSettings['binary'], internal_target_normal, componentType, count, type, "")
+                                target_normal = generateMorphAccessor(glTF, exportSettings, internal_target_normal, componentType, count, type)
 
-                                    if target_normal < 0:
-                                        log.error('Could not create accessor for ' + target_normal_id)
-                                        continue
+                                if target_normal < 0:
+                                    log.error('Could not create accessor for ' + target_normal_id)
+                                    continue
 
-                                    target['NORMAL'] = target_normal
+                                target['NORMAL'] = target_normal
 
 
-                                if exportSettings['morphTangent'] and internal_attributes.get(target_tangent_id) is not None:
+                            if exportSettings['morphTangent'] and internal_attributes.get(target_tangent_id) is not None:
 
-                                    internal_target_tangent = internal_attributes[target_tangent_id]
+                                internal_target_tangent = internal_attributes[target_tangent_id]
 
-                                    componentType = "FLOAT"
+                                componentType = "FLOAT"
 
-                                    count = len(internal_target_tangent) // 3
+                                count = len(internal_target_tangent) // 3
 
-                                    type = "VEC3"
+                                type = "VEC3"
 
-                                    target_tangent = gltf.generateAccessor(glTF, exportSettings['binary'], internal_target_tangent, componentType, count, type, "")
+                                target_tangent = generateMorphAccessor(glTF, exportSettings, internal_target_tangent, componentType, count, type)
 
-                                    if target_tangent < 0:
-                                        log.error('Could not create accessor for ' + target_tangent_id)
-                                        continue
+                                if target_tangent < 0:
+                                    log.error('Could not create accessor for ' + target_tangent_id)
+                                    continue
 
-                                    target['TANGENT'] = target_tangent
+                                target['TANGENT'] = target_tangent
 
 
 
 
-                                targets.append(target)
+                            targets.append(target)
 
-                                morph_index += 1
+                            morph_index += 1
 
                     if len(targets) > 0:
                         primitive['targets'] = targets
@@ -1736,28 +2303,25 @@ def generateMeshes(operator, context, exportSettings, glTF):
 
 
         if exportSettings['morph']:
-            if bl_mesh.shape_keys is not None:
-                morph_max = len(bl_mesh.shape_keys.key_blocks) - 1
-                if morph_max > 0:
+            if meshMeta['shapeKeys'] is not None:
 
-                    weights = []
-                    targetNames = []
+                weights = []
+                targetNames = []
 
-                    for bl_shape_key in bl_mesh.shape_keys.key_blocks:
-                        if bl_shape_key != bl_shape_key.relative_key and bl_shape_key != bl_mesh.shape_keys.reference_key:
-                            weights.append(bl_shape_key.value)
-                            targetNames.append(bl_shape_key.name)
+                for name, value in meshMeta['shapeKeys']:
+                    weights.append(value)
+                    targetNames.append(name)
 
 
-                    mesh['weights'] = weights
+                mesh['weights'] = weights
 
-                    if 'extras' not in mesh:
-                        mesh['extras'] = {}
-                    mesh['extras']['targetNames'] = targetNames
+                if 'extras' not in mesh:
+                    mesh['extras'] = {}
+                mesh['extras']['targetNames'] = targetNames
 
 
         if exportSettings['exportCustomProps']:
-            props = createCustomProperty(bl_mesh)
+            props = meshMeta['customProps']
 
             if props is not None:
                 if 'extras' not in mesh:
@@ -1767,12 +2331,22 @@ def generateMeshes(operator, context, exportSettings, glTF):
 
         mesh['primitives'] = primitives
 
-        mesh['name'] = srcName
-        # also a pointer to object.data
-        mesh['id'] = srcPtr
+        if is_quantized:
+            gltf.appendExtension(glTF, 'KHR_mesh_quantization', isRequired=True)
+
+        if lodRatio is None:
+            mesh['name'] = srcName
+            # also a pointer to object.data
+            mesh['id'] = srcPtr
+        else:
+            mesh['name'] = srcName + LOD_MESH_SUFFIX.format(ratio=lodRatio)
+            mesh['id'] = getLODMeshId(srcPtr, lodRatio)
 
         meshes.append(mesh)
 
+        if dequant is not None:
+            dequantTransforms[len(meshes) - 1] = dequant
+
 
     if len (meshes) > 0:
         glTF['meshes'] = meshes
@@ -1807,6 +2381,10 @@ def generateDuplicateMesh(operator, context, exportSettings, glTF, bl_obj):
 
     new_mesh['name'] = new_name
 
+    dequantTransforms = exportSettings['meshDequantTransforms']
+    if mesh_index in dequantTransforms:
+        dequantTransforms[len(glTF['meshes'])] = dequantTransforms[mesh_index]
+
     # remove unnecessary parameters
     if findArmature(bl_obj) is None:
         for prim in primitives:
@@ -1855,18 +2433,17 @@ def getMeshIndexDupliCheck(operator, context, exportSettings, glTF, bl_obj):
         # duplicate the mesh (to have both skinned and unskinned variants)
         if not need_dublicate and findArmature(bl_obj) is None:
             idname = getPtr(bl_obj.data)
-            for meshData in glTF['meshes']:
-                key = 'id' if meshData.get('id') != None else 'name'
-                if meshData.get(key) == idname:
-                    need_dublicate = False
-                    for prim in meshData['primitives']:
-                        if 'JOINTS_0' in prim['attributes'] or 'WEIGHTS_0' in prim['attributes']:
-                            need_dublicate = True
-                            break
-
-                    if not need_dublicate:
+            for index in gltf.getEntityIndices(glTF, 'meshes', glTF['meshes'], idname):
+                meshData = glTF['meshes'][index]
+                need_dublicate = False
+                for prim in meshData['primitives']:
+                    if 'JOINTS_0' in prim['attributes'] or 'WEIGHTS_0' in prim['attributes']:
+                        need_dublicate = True
                         break
 
+                if not need_dublicate:
+                    break
+
         if need_dublicate:
             mesh = generateDuplicateMesh(operator, context, exportSettings, glTF, bl_obj)
 
@@ -1954,6 +2531,13 @@ def generateNodeInstance(operator, context, exportSettings, glTF, bl_obj):
         if plane >= 0:
             gltf.appendExtension(glTF, 'S8S_v3d_clipping_planes', node, {'clippingPlane' : plane})
 
+    # fold dequantization of KHR_mesh_quantization positions into the node
+    dequant = exportSettings['meshDequantTransforms'].get(node.get('mesh'))
+    if dequant is not None:
+        for key in ['translation', 'rotation', 'scale']:
+            node.pop(key, None)
+        generateNodeParameter(node_matrix @ calcDequantMatrix(dequant), node)
+
     v3dExt['hidden'] = bl_obj.hide_render
     v3dExt['renderOrder'] = bl_obj.v3d.render_order
     v3dExt['frustumCulling'] = bl_obj.v3d.frustum_culling
@@ -2108,7 +2692,17 @@ def generateNodes(operator, context, exportSettings, glTF):
     filteredObjectsShallow = exportSettings['filteredObjectsShallow']
     filteredObjectsWithIC = exportSettings['filteredObjectsWithIC']
 
+    # node name -> instancing node or None for objects merged into it
+    instancingNodes = {}
+    if exportSettings['gpuInstancing']:
+        instancingNodes = generateInstancingNodes(operator, context, exportSettings, glTF)
+
     for bl_obj in filteredObjectsShallow:
+        if bl_obj.name in instancingNodes:
+            if instancingNodes[bl_obj.name] is not None:
+                nodes.append(instancingNodes[bl_obj.name])
+            continue
+
         node = generateNodeInstance(operator, context, exportSettings, glTF, bl_obj)
         nodes.append(node)
 
@@ -2125,8 +2719,14 @@ def generateNodes(operator, context, exportSettings, glTF):
 
             for bl_instance_obj in bl_obj.instance_collection.objects:
 
+                instanceName = 'Instance_' + bl_obj.name + '_' + bl_instance_obj.name
+                if instanceName in instancingNodes:
+                    if instancingNodes[instanceName] is not None:
+                        nodes.append(instancingNodes[instanceName])
+                    continue
+
                 node = generateNodeInstance(operator, context, exportSettings, glTF, bl_instance_obj)
-                node['name'] = 'Instance_' + bl_obj.name + '_' + bl_instance_obj.name
+                node['name'] = instanceName
 
                 nodeParent = getByName(nodes, bl_obj.name)
                 inheritParentProps(node, nodeParent)
@@ -2251,6 +2851,10 @@ def generateNodes(operator, context, exportSettings, glTF):
     for bl_obj in filteredObjectsShallow:
         node_index = gltf.getNodeIndex(glTF, bl_obj.name)
 
+        # merged into an instancing node
+        if node_index < 0:
+            continue
+
         node = nodes[node_index]
 
         if exportSettings['skins']:
@@ -2367,6 +2971,286 @@ def generateNodes(operator, context, exportSettings, glTF):
     # NOTE: possible breakage of the children's animation
     preprocessCamLampNodes(nodes)
 
+    generateLODNodes(exportSettings, glTF)
+
+def generateLODNodes(exportSettings, glTF):
+    """
+    Generate MSFT_lod nodes for objects with LOD levels. LOD nodes are not part
+    of the scene hierarchy, they copy the transform of the source node.
+    Screen coverage hints are stored in the MSFT_screencoverage extras.
+    """
+
+    nodes = glTF.get('nodes')
+    if nodes is None:
+        return
+
+    for bl_obj in exportSettings['filteredObjectsShallow']:
+        ratios = getObjLODRatios(bl_obj)
+        if not ratios or bl_obj.data is None:
+            continue
+
+        nodeIndex = gltf.getNodeIndex(glTF, bl_obj.name)
+        if nodeIndex < 0:
+            continue
+
+        node = nodes[nodeIndex]
+
+        srcPtr = getPtr(bl_obj.data)
+
+        # duplicated meshes (object-linked materials) have no LOD meshes
+        if node.get('mesh') is None or node['mesh'] != gltf.getMeshIndex(glTF, srcPtr):
+            log.warning('LODs are not supported for object "{}", skipping'.format(bl_obj.name))
+            continue
+
+        lodIds = []
+        coverage = [bl_obj.v3d.lod_coverage]
+
+        for level, ratio in enumerate(ratios, 1):
+            lodMesh = gltf.getMeshIndex(glTF, getLODMeshId(srcPtr, ratio))
+            if lodMesh < 0:
+                continue
+
+            lodNode = {
+                'name': bl_obj.name + LOD_NODE_SUFFIX.format(level=level),
+                'mesh': lodMesh
+            }
+
+            for key in ['translation', 'rotation', 'scale', 'skin']:
+                if key in node:
+                    lodNode[key] = copy.deepcopy(node[key])
+
+            lodIds.append(len(nodes))
+            nodes.append(lodNode)
+
+            coverage.append(bl_obj.v3d.lod_coverage * ratio)
+
+        if not lodIds:
+            continue
+
+        gltf.appendExtension(glTF, 'MSFT_lod', node, {'ids': lodIds})
+
+        # the least detailed level is never culled
+        coverage[-1] = 0
+        if 'extras' not in node:
+            node['extras'] = {}
+        node['extras']['MSFT_screencoverage'] = coverage
+
+def objCanBeInstanced(exportSettings, glTF, bl_obj, bl_pinned_objs):
+    """
+    Check if the object's node can be merged into an EXT_mesh_gpu_instancing
+    node, i.e. it's a static object not referenced by anything else.
+    """
+
+    if bl_obj.type == 'FONT':
+        if not exportSettings['bakeText']:
+            return False
+    elif bl_obj.type not in ['MESH', 'CURVE', 'SURFACE', 'META']:
+        return False
+
+    if bl_obj in bl_pinned_objs or bl_obj.data is None:
+        return False
+
+    if (bl_obj.animation_data is not None or len(bl_obj.children) or len(bl_obj.constraints)
+            or objHasFixOrthoZoom(bl_obj) or objHasCanvasFitParams(bl_obj)
+            or bl_obj.v3d.canvas_break_enabled):
+        return False
+
+    if findArmature(bl_obj) is not None or getObjLODRatios(bl_obj):
+        return False
+
+    shape_keys = getattr(bl_obj.data, 'shape_keys', None)
+    if shape_keys is not None:
+        return False
+
+    # parent inverse and bone parenting require proxy nodes
+    if bl_obj.parent is not None and (bl_obj.parent_type != 'OBJECT'
+            or not mat4IsIdentity(bl_obj.matrix_parent_inverse)):
+        return False
+
+    # objects requiring duplicated meshes, see getMeshIndexDupliCheck()
+    for bl_material_slot in bl_obj.material_slots:
+        if bl_material_slot.link == 'OBJECT':
+            return False
+
+    mesh = gltf.getMeshIndex(glTF, getPtr(bl_obj.data))
+    if mesh < 0:
+        return False
+
+    for prim in glTF['meshes'][mesh]['primitives']:
+        if 'JOINTS_0' in prim['attributes']:
+            return False
+
+    return True
+
+def getInstancingPinnedObjects(exportSettings):
+    """
+    Objects referenced by constraints and cameras, their nodes must be kept.
+    """
+
+    bl_pinned_objs = set()
+
+    for bl_obj in exportSettings['filteredObjectsWithIC']:
+        for bl_cons in bl_obj.constraints:
+            for attr in ['target', 'space_object', 'pole_target']:
+                bl_target = getattr(bl_cons, attr, None)
+                if bl_target is not None:
+                    bl_pinned_objs.add(bl_target)
+
+        if bl_obj.type == 'CAMERA' and bl_obj.data.v3d.orbit_target_object is not None:
+            bl_pinned_objs.add(bl_obj.data.v3d.orbit_target_object)
+
+    return bl_pinned_objs
+
+def generateInstancingNodes(operator, context, exportSettings, glTF):
+    """
+    Merge static objects sharing a mesh and node settings under a common parent
+    into EXT_mesh_gpu_instancing nodes. Objects from collection instances are
+    merged as well, using the parent of the instancer object.
+
+    Returns a dict mapping node names to instancing nodes (for the first
+    object of a group, the node takes its name and place in the hierarchy) or
+    None for objects merged into other nodes.
+    """
+
+    filteredObjectsShallow = exportSettings['filteredObjectsShallow']
+    bl_exported_objs = set(filteredObjectsShallow)
+
+    bl_pinned_objs = getInstancingPinnedObjects(exportSettings)
+
+    def parentAllowsInstancing(bl_obj):
+        return bl_obj.parent is None or bl_obj.parent in bl_exported_objs
+
+    # group key -> [(node, matrix in the parent space, frame of the node)]
+    groups = {}
+
+    def appendCandidate(node, matrix, frame, bl_obj, parent, bl_scene_owner):
+        dequant = exportSettings['meshDequantTransforms'].get(node['mesh'])
+        if dequant is not None:
+            matrix = matrix @ calcDequantMatrix(dequant)
+
+        v3dExt = gltf.getAssetExtension(node, 'S8S_v3d_node')
+
+        # COMPAT: useCastShadows is taken from object in Blender 4.2+
+        castShadows = bl_obj.visible_shadow if bpy.app.version >= (4, 2, 0) else None
+
+        # objects are exported for all scenes, merged nodes must belong to the same ones
+        scenes = tuple(sorted(bl_scene.name for bl_scene in bl_scene_owner.users_scene))
+
+        key = (parent.name if parent is not None else None, node['mesh'],
+               json.dumps(v3dExt, sort_keys=True), castShadows, scenes)
+
+        if key not in groups:
+            groups[key] = []
+        groups[key].append((node, matrix, frame))
+
+    def isInstanceableNode(node):
+        return ('mesh' in node and 'extras' not in node
+                and list(node['extensions'].keys()) == ['S8S_v3d_node'])
+
+    for bl_obj in filteredObjectsShallow:
+        if not objCanBeInstanced(exportSettings, glTF, bl_obj, bl_pinned_objs):
+            continue
+        if not parentAllowsInstancing(bl_obj):
+            continue
+
+        node = generateNodeInstance(operator, context, exportSettings, glTF, bl_obj)
+        if not isInstanceableNode(node):
+            continue
+
+        appendCandidate(node, bl_obj.matrix_basis.copy(), mathutils.Matrix.Identity(4),
+                bl_obj, bl_obj.parent, bl_obj)
+
+    for bl_obj in filteredObjectsShallow:
+        if (bl_obj.instance_type != 'COLLECTION'
+                or bl_obj.instance_collection is None
+                or not bl_obj.instance_collection.v3d.enable_export):
+            continue
+
+        if (bl_obj in bl_pinned_objs or bl_obj.animation_data is not None
+                or len(bl_obj.constraints) or not parentAllowsInstancing(bl_obj)):
+            continue
+
+        if bl_obj.parent is not None and (bl_obj.parent_type != 'OBJECT'
+                or not mat4IsIdentity(bl_obj.matrix_parent_inverse)):
+            continue
+
+        # transform of the Instance_Offset_ node in the instancer's parent space
+        frame = (bl_obj.matrix_basis @ mathutils.Matrix.Translation(
+                -bl_obj.instance_collection.instance_offset))
+        if abs(frame.determinant()) < 1e-12:
+            continue
+
+        nodeParent = generateNodeInstance(operator, context, exportSettings, glTF, bl_obj)
+
+        for bl_instance_obj in bl_obj.instance_collection.objects:
+            if bl_instance_obj.parent is not None:
+                continue
+            if not objCanBeInstanced(exportSettings, glTF, bl_instance_obj, bl_pinned_objs):
+                continue
+
+            node = generateNodeInstance(operator, context, exportSettings, glTF, bl_instance_obj)
+            if not isInstanceableNode(node):
+                continue
+
+            node['name'] = 'Instance_' + bl_obj.name + '_' + bl_instance_obj.name
+            inheritParentProps(node, nodeParent)
+
+            appendCandidate(node, frame @ bl_instance_obj.matrix_basis, frame,
+                    bl_instance_obj, bl_obj.parent, bl_obj)
+
+    instancingNodes = {}
+
+    for members in groups.values():
+        if len(members) < INSTANCING_MIN_COUNT:
+            continue
+
+        # instance transforms are relative to the node of the first object
+        leaderNode, _, leaderFrame = members[0]
+        leaderFrameInv = leaderFrame.inverted()
+
+        instNodes = []
+        for node, matrix, _ in members:
+            matrix = leaderFrameInv @ matrix
+            # instance transforms are stored as TRS, the first one always is
+            if node is leaderNode or mat4IsTRSDecomposable(matrix):
+                instTRS = {}
+                generateNodeParameter(matrix, instTRS)
+                instNodes.append((node, instTRS))
+
+        if len(instNodes) < INSTANCING_MIN_COUNT:
+            continue
+
+        count = len(instNodes)
+
+        translations = np.array([instTRS.get('translation', [0, 0, 0]) for _, instTRS in instNodes],
+                dtype=np.float32)
+        rotations = np.array([instTRS.get('rotation', [0, 0, 0, 1]) for _, instTRS in instNodes],
+                dtype=np.float32)
+        scales = np.array([instTRS.get('scale', [1, 1, 1]) for _, instTRS in instNodes],
+                dtype=np.float32)
+
+        binary = exportSettings['binary']
+
+        node = leaderNode
+        for key in ['translation', 'rotation', 'scale']:
+            node.pop(key, None)
+
+        gltf.appendExtension(glTF, 'EXT_mesh_gpu_instancing', node, {
+            'attributes': {
+                'TRANSLATION': gltf.generateAccessor(glTF, binary, translations, 'FLOAT', count, 'VEC3', ''),
+                'ROTATION': gltf.generateAccessor(glTF, binary, rotations, 'FLOAT', count, 'VEC4', ''),
+                'SCALE': gltf.generateAccessor(glTF, binary, scales, 'FLOAT', count, 'VEC3', '')
+            }
+        })
+
+        instancingNodes[node['name']] = node
+        for mergedNode, _ in instNodes[1:]:
+            instancingNodes[mergedNode['name']] = None
+
+        log.info('Merged {} objects into instancing node "{}"'.format(count, node['name']))
+
+    return instancingNodes
+
 
 def nodeAppendChildFromObj(glTF, parent_node, child_obj, child_node_name=None):
 
@@ -2476,9 +3360,9 @@ def generateImages(operator, context, exportSettings, glTF):
     images = []
 
     num = 0
-    for bl_image in filteredImages:
+    for bl_image, ktx2Job in compressImagesKTX2(context, exportSettings, filteredImages):
         try:
-            image = createImage(bl_image, context, exportSettings, glTF)
+            image = createImage(bl_image, context, exportSettings, glTF, ktx2Job)
         except pu.convert.CompressionFailed:
             bl_image['compression_error_status'] = 1
             # try again without compression
@@ -2492,7 +3376,64 @@ def generateImages(operator, context, exportSettings, glTF):
     if len (images) > 0:
         glTF['images'] = images
 
-def createImage(bl_image, context, exportSettings, glTF):
+def compressImagesKTX2(context, exportSettings, bl_images):
+    """
+    Yield the given images in the same order, along with the futures of their
+    KTX2 compression (None for images not compressed to KTX2). The source
+    data is extracted on the main thread, while toktx processes are executed
+    from a pool of worker threads.
+    """
+
+    numThreads = exportSettings['compressThreads']
+
+    # limit the number of extracted images kept in memory
+    maxPending = 2 * numThreads
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=numThreads) as executor:
+        pending = collections.deque()
+
+        for bl_image in bl_images:
+            pending.append((bl_image, submitImageKTX2(executor, bl_image, context, exportSettings)))
+
+            while len(pending) > maxPending or (pending and (pending[0][1] is None
+                    or pending[0][1].done())):
+                yield pending.popleft()
+
+        while pending:
+            yield pending.popleft()
+
+def submitImageKTX2(executor, bl_image, context, exportSettings):
+    """
+    Start KTX2 compression of the image the same way createImage() performs it.
+    Returns the future or None if the image is not compressed to KTX2.
+    """
+
+    if not imgNeedsCompression(bl_image, exportSettings) or bl_image.file_format == 'HDR':
+        return None
+
+    method = bl_image.v3d.compression_method
+
+    if exportSettings['format'] == 'ASCII':
+        old_path = bl_image.filepath_from_user()
+        new_path = norm(exportSettings['filedirectory'] + getImageExportedURI(exportSettings, bl_image))
+
+        if not (bl_image.is_dirty or bl_image.packed_file is not None
+                or not os.path.isfile(old_path)):
+
+            if os.path.normcase(old_path) == os.path.normcase(new_path):
+                # reused external file
+                return None
+            elif bl_image.file_format in ['JPEG', 'PNG', 'WEBP', 'BMP']:
+                # compressed right to the new location
+                return executor.submit(pu.convert.compressKTX2, old_path, dstPath=new_path, method=method)
+
+    data = extractImageKTX2Src(bl_image, context.scene)
+    return executor.submit(pu.convert.compressKTX2, srcData=data, method=method)
+
+def createImage(bl_image, context, exportSettings, glTF, ktx2Job=None):
+    """
+    ktx2Job is an optional future returned by submitImageKTX2().
+    """
 
     image = {}
 
@@ -2509,7 +3450,7 @@ def createImage(bl_image, context, exportSettings, glTF):
             # always extract data for dirty/packed/missing images,
             # because they can differ from an external source's data
 
-            img_data = extractImageBindata(bl_image, context.scene, exportSettings)
+            img_data = extractImageBindata(bl_image, context.scene, exportSettings, ktx2Job)
 
             with open(new_path, 'wb') as f:
                 f.write(img_data)
@@ -2522,7 +3463,7 @@ def createImage(bl_image, context, exportSettings, glTF):
                     bl_image.file_format != 'HDR'):
                 # need conversion to PNG
 
-                img_data = extractImageBindata(bl_image, context.scene, exportSettings)
+                img_data = extractImageBindata(bl_image, context.scene, exportSettings, ktx2Job)
 
                 with open(new_path, 'wb') as f:
                     f.write(img_data)
@@ -2530,6 +3471,8 @@ def createImage(bl_image, context, exportSettings, glTF):
             elif imgNeedsCompression(bl_image, exportSettings):
                 if bl_image.file_format == 'HDR':
                     pu.convert.compressLZMA(old_path, dstPath=new_path)
+                elif ktx2Job is not None:
+                    ktx2Job.result()
                 else:
                     pu.convert.compressKTX2(old_path, dstPath=new_path, method=bl_image.v3d.compression_method)
             else:
@@ -2540,7 +3483,7 @@ def createImage(bl_image, context, exportSettings, glTF):
     else:
         # store image in glb
 
-        img_data = extractImageBindata(bl_image, context.scene, exportSettings)
+        img_data = extractImageBindata(bl_image, context.scene, exportSettings, ktx2Job)
 
         bufferView = gltf.generateBufferView(glTF, exportSettings['binary'], img_data, '', 0)
 
@@ -3272,3 +4215,6 @@ def generateGLTF(operator,
             buffer['uri'] = uri
 
         glTF['buffers'].append(buffer)
+
+        # virtual buffer containing decoded EXT_meshopt_compression data
+        gltf.generateMeshoptFallbackBuffer(glTF)
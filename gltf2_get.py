@@ -236,17 +236,7 @@ def getCameraIndex(glTF, name):
     Return the camera index in the glTF array.
     """
 
-    if glTF.get('cameras') is None:
-        return -1
-
-    index = 0
-    for camera in glTF['cameras']:
-        if camera['name'] == name:
-            return index
-
-        index += 1
-
-    return -1
+    return gltf.getEntityIndex(glTF, 'cameras', glTF.get('cameras'), name)
 
 def getCurveIndex(glTF, name):
     """
@@ -258,19 +248,7 @@ def getCurveIndex(glTF, name):
     if v3dExt == None:
         return -1
 
-    if v3dExt.get('curves') == None:
-        return -1
-
-    curves = v3dExt['curves']
-
-    index = 0
-    for curve in curves:
-        if curve['name'] == name:
-            return index
-
-        index += 1
-
-    return -1
+    return gltf.getEntityIndex(glTF, 'S8S_v3d_curves/curves', v3dExt.get('curves'), name)
 
 def getNodeGraphIndex(glTF, name):
     """
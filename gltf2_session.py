@@ -0,0 +1,169 @@
+# Copyright (c) 2017-2025 Soft8Soft
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import bpy
+from bpy.app.handlers import persistent
+
+import pluginUtils
+log = pluginUtils.log.getLogger('V3D-BL')
+
+from .gltf2_extract import checkUseNodeAttrs, getPtr
+from .utils import meshNeedTangentsForExport
+
+# export settings affecting the extracted mesh primitives and metadata
+SESSION_SETTINGS = ['bakeModifiers', 'optimizeAttrs', 'optimizeMeshes',
+                    'indices', 'weldMethod', 'morph', 'skins', 'exportCustomProps']
+
+
+class ExportSession():
+    """
+    Mesh primitives (plus mesh metadata, see getMeshMetadata()) of the last
+    export, kept in memory to be reused by the next export. Blender
+    datablocks changed in between are tracked by the depsgraph update
+    handler, meshes related to them are extracted again.
+    """
+
+    def __init__(self):
+        # mesh pointer -> (object pointer, dependency key, internal primitives,
+        #                  metadata, mesh cache key or None)
+        self.meshes = {}
+        self.nextMeshes = {}
+
+        self.dirtyPtrs = set()
+        self.settingsKey = None
+        self.exporting = False
+
+    def clear(self):
+        self.meshes.clear()
+        self.nextMeshes.clear()
+        self.dirtyPtrs.clear()
+        self.settingsKey = None
+
+    def begin(self, exportSettings):
+        # previous export failed, changes made during it were not tracked
+        if self.exporting:
+            self.clear()
+
+        self.exporting = True
+
+        settingsKey = tuple(exportSettings[key] for key in SESSION_SETTINGS)
+        if not exportSettings['incrementalExport'] or settingsKey != self.settingsKey:
+            self.clear()
+            self.settingsKey = settingsKey
+
+        self.nextMeshes = {}
+
+    def end(self):
+        # flush updates tagged by the export itself (e.g. temporary data and
+        # restored frame) while they are still ignored
+        bpy.context.view_layer.update()
+
+        # meshes not exported this time are dropped as their pointers may be reused
+        self.meshes = self.nextMeshes
+        self.nextMeshes = {}
+
+        self.dirtyPtrs.clear()
+        self.exporting = False
+
+    def getMeshPrimitives(self, meshPtr, objPtr, depKey):
+        """
+        Get (internal primitives, metadata, mesh cache key) of an unchanged
+        mesh or None.
+        """
+
+        if meshPtr in self.dirtyPtrs or objPtr in self.dirtyPtrs:
+            return None
+
+        entry = self.meshes.get(meshPtr)
+        if entry is None or entry[0] != objPtr or entry[1] != depKey:
+            return None
+
+        self.nextMeshes[meshPtr] = entry
+        return entry[2:]
+
+    def setMeshPrimitives(self, meshPtr, objPtr, depKey, internal_primitives, meshMeta,
+                          cacheKey):
+        self.nextMeshes[meshPtr] = (objPtr, depKey, internal_primitives, meshMeta, cacheKey)
+
+    def markDirty(self, bl_id):
+        self.dirtyPtrs.add(getPtr(bl_id))
+
+exportSession = ExportSession()
+
+
+def getMeshSessionKey(exportSettings, bl_mesh, bl_obj):
+    """
+    Key of the mesh properties not tracked by the depsgraph, which still affect
+    the extracted primitives: material types, tangents, skinning.
+    """
+
+    materials = tuple((bl_mat.name, checkUseNodeAttrs(bl_mat)) if bl_mat is not None else None
+                      for bl_mat in bl_mesh.materials)
+
+    jointIndices = exportSettings['jointIndices'].get(bl_mesh.name, {})
+
+    return (materials,
+            meshNeedTangentsForExport(bl_mesh, exportSettings['optimizeAttrs']),
+            tuple(jointIndices.items()),
+            tuple(group.name for group in bl_obj.vertex_groups))
+
+
+@persistent
+def depsgraphUpdateHandler(scene, depsgraph):
+
+    if exportSession.exporting or not exportSession.meshes:
+        return
+
+    for update in depsgraph.updates:
+        bl_id = update.id.original
+
+        if isinstance(bl_id, bpy.types.Object):
+            # moving objects doesn't affect mesh data, unless the object's
+            # geometry is evaluated again (e.g. modifiers depending on it)
+            if update.is_updated_transform and not update.is_updated_geometry:
+                continue
+
+            exportSession.markDirty(bl_id)
+            if bl_id.data is not None:
+                exportSession.markDirty(bl_id.data)
+
+        elif isinstance(bl_id, bpy.types.Key):
+            exportSession.markDirty(bl_id)
+            if bl_id.user is not None:
+                exportSession.markDirty(bl_id.user)
+
+        else:
+            exportSession.markDirty(bl_id)
+
+@persistent
+def sessionResetHandler(dummy):
+    exportSession.clear()
+
+def register():
+    bpy.app.handlers.depsgraph_update_post.append(depsgraphUpdateHandler)
+
+    # datablock pointers are not preserved when loading files and undoing
+    for handlers in [bpy.app.handlers.load_post, bpy.app.handlers.undo_post,
+                     bpy.app.handlers.redo_post]:
+        handlers.append(sessionResetHandler)
+
+def unregister():
+    bpy.app.handlers.depsgraph_update_post.remove(depsgraphUpdateHandler)
+
+    for handlers in [bpy.app.handlers.load_post, bpy.app.handlers.undo_post,
+                     bpy.app.handlers.redo_post]:
+        handlers.remove(sessionResetHandler)
+
+    exportSession.clear()
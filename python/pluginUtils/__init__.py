@@ -1,6 +1,6 @@
 #__all__ = ['']
 
-from . import convert, gltf, log, manager, path, rawdata
+from . import buffer, convert, gltf, log, manager, path, rawdata
 
 debug = True
 
@@ -0,0 +1,82 @@
+import shutil, tempfile
+
+from .log import getLogger
+
+log = getLogger('V3D-PU')
+
+# keep smaller buffers in memory, larger ones are moved to a temporary file
+SPILL_SIZE_DEFAULT = 256 * 1024 * 1024
+
+COPY_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+class BinaryBuffer():
+    """
+    Append-only glTF binary buffer, compatible with the bytearray interface
+    used by generateBufferView() (len() and extend()). Once the buffer grows
+    past spillSize the data is moved to a temporary file, so only the total
+    length is kept in memory.
+
+    With dedup enabled the buffer also holds the content hash index used by
+    generateAccessor()/generateBufferView() to reuse identical data.
+    """
+
+    def __init__(self, spillSize=SPILL_SIZE_DEFAULT, dedup=False):
+        self.spillSize = spillSize
+        self.dedupIndex = {} if dedup else None
+
+        self.mem = bytearray()
+        self.file = None
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def extend(self, data):
+        size = len(data)
+        if size == 0:
+            return
+
+        if self.file is None and self.length + size > self.spillSize:
+            self.spill()
+
+        if self.file is None:
+            self.mem.extend(data)
+        else:
+            self.file.write(data)
+
+        self.length += size
+
+    def spill(self):
+        log.debug('Moving binary buffer to a temporary file')
+
+        self.file = tempfile.TemporaryFile(prefix='v3d_', suffix='.bin')
+        self.file.write(self.mem)
+        self.mem = bytearray()
+
+    def isSpilled(self):
+        return self.file is not None
+
+    def writeTo(self, dstFile):
+        """
+        Stream buffer contents to the given binary file object.
+        """
+
+        if self.file is None:
+            dstFile.write(self.mem)
+        else:
+            self.file.flush()
+            self.file.seek(0)
+            shutil.copyfileobj(self.file, dstFile, COPY_CHUNK_SIZE)
+            self.file.seek(0, 2)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+        self.mem = bytearray()
+        self.length = 0
+
+        if self.dedupIndex is not None:
+            self.dedupIndex.clear()
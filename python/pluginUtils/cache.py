@@ -0,0 +1,192 @@
+import json, os, tempfile, threading
+
+import numpy as np
+
+from .log import getLogger
+
+log = getLogger('V3D-PU')
+
+# bump to invalidate entries written by older versions
+CACHE_FORMAT_VERSION = 2
+
+CACHE_ENTRY_EXT = '.npz'
+# pickle based entries of version 1, never loaded
+CACHE_LEGACY_EXTS = ['.pkl']
+
+# npz member storing the JSON header
+CACHE_HEADER_NAME = '__header__'
+
+
+class FileCache():
+    """
+    Persistent key-value storage kept in a directory, one file per entry.
+    Keys are hex digests computed by the caller, values are JSON-compatible
+    structures (dicts with string keys, lists, strings, numbers, booleans,
+    None) which can also contain NumPy arrays. Entries not accessed since the
+    cache was opened are removed by prune(), so the directory only holds data
+    of the last export.
+
+    Entries are stored as .npz files: the arrays plus the value structure
+    serialized to JSON. Nothing is unpickled on load, so it's safe to open
+    a cache directory received from elsewhere.
+
+    get() and put() can be called from worker threads.
+    """
+
+    def __init__(self, dirPath):
+        self.dirPath = dirPath
+        self.usedKeys = set()
+        self.pruneUnused = True
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def entryPath(self, key):
+        return os.path.join(self.dirPath, key + CACHE_ENTRY_EXT)
+
+    def get(self, key):
+        """
+        Get the cached value or None if there is no valid entry for the key.
+        """
+
+        path = self.entryPath(key)
+
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                header = json.loads(entry[CACHE_HEADER_NAME].tobytes().decode('utf-8'))
+
+                if header['version'] != CACHE_FORMAT_VERSION:
+                    value = None
+                else:
+                    value = decodeValue(header['value'], entry)
+        except FileNotFoundError:
+            value = None
+        except Exception as e:
+            log.warning('Ignoring broken cache entry {}: {}'.format(path, e))
+            value = None
+
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.usedKeys.add(key)
+
+        return value
+
+    def put(self, key, value):
+        arrays = {}
+
+        try:
+            header = {
+                'version': CACHE_FORMAT_VERSION,
+                'value': encodeValue(value, arrays)
+            }
+        except TypeError as e:
+            log.warning('Failed to write cache entry {}: {}'.format(key, e))
+            return
+
+        arrays[CACHE_HEADER_NAME] = np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8)
+
+        try:
+            os.makedirs(self.dirPath, exist_ok=True)
+
+            # write to a temporary file first to never leave partial entries
+            fd, tmpPath = tempfile.mkstemp(suffix='.tmp', dir=self.dirPath)
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmpPath, self.entryPath(key))
+        except OSError as e:
+            log.warning('Failed to write cache entry {}: {}'.format(key, e))
+            return
+
+        with self.lock:
+            self.usedKeys.add(key)
+
+    def markUsed(self, key):
+        """
+        Keep the entry from being pruned without loading it. Returns False if
+        there is no entry for the key.
+        """
+
+        if not os.path.isfile(self.entryPath(key)):
+            return False
+
+        with self.lock:
+            self.usedKeys.add(key)
+
+        return True
+
+    def keepUnused(self):
+        """
+        Make prune() keep unused entries, e.g. if some values were obtained
+        bypassing the cache and their keys are unknown.
+        """
+
+        self.pruneUnused = False
+
+    def prune(self):
+        """
+        Remove entries (and stale temporary files) not used since the cache was opened.
+        """
+
+        if not os.path.isdir(self.dirPath):
+            return
+
+        if self.pruneUnused:
+            for name in os.listdir(self.dirPath):
+                key, ext = os.path.splitext(name)
+                if ext in [CACHE_ENTRY_EXT, '.tmp'] + CACHE_LEGACY_EXTS and key not in self.usedKeys:
+                    try:
+                        os.remove(os.path.join(self.dirPath, name))
+                    except OSError:
+                        pass
+
+        log.info('Cache {}: {} hits, {} misses'.format(self.dirPath, self.hits, self.misses))
+
+
+def encodeValue(value, arrays):
+    """
+    Convert the value to a JSON-compatible structure, NumPy arrays are moved
+    to the arrays dict and replaced with references to them.
+    """
+
+    if isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            raise TypeError('Object arrays are not supported')
+
+        name = 'a{}'.format(len(arrays))
+        arrays[name] = value
+        return {'array': name}
+
+    elif isinstance(value, np.generic):
+        return {'scalar': value.item()}
+
+    elif isinstance(value, dict):
+        if not all(isinstance(k, str) for k in value):
+            raise TypeError('Only string dict keys are supported')
+        return {'dict': {k: encodeValue(v, arrays) for k, v in value.items()}}
+
+    elif isinstance(value, (list, tuple)):
+        return {'list': [encodeValue(v, arrays) for v in value]}
+
+    elif value is None or isinstance(value, (str, bool, int, float)):
+        return {'scalar': value}
+
+    else:
+        raise TypeError('Unsupported value type: {}'.format(type(value).__name__))
+
+def decodeValue(encoded, arrays):
+    """
+    Inverse of encodeValue(), tuples are decoded as lists.
+    """
+
+    if 'array' in encoded:
+        return arrays[encoded['array']]
+    elif 'dict' in encoded:
+        return {k: decodeValue(v, arrays) for k, v in encoded['dict'].items()}
+    elif 'list' in encoded:
+        return [decodeValue(v, arrays) for v in encoded['list']]
+    else:
+        return encoded['scalar']
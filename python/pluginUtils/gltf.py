@@ -1,4 +1,4 @@
-import math, mimetypes, struct, sys
+import hashlib, json, math, mimetypes, struct, sys
 
 from .log import getLogger
 log = getLogger('V3D-PU')
@@ -17,6 +17,8 @@ if useNumpy:
         "FLOAT"         : np.float32
     }
 
+    from . import meshopt
+
 WEBGL_FILTERS = {
     'NEAREST'                : 9728,
     'LINEAR'                 : 9729,
@@ -58,6 +60,13 @@ WEBGL_BLEND_FUNCS = {
     # 'ONE_MINUS_CONSTANT_ALPHA' : 32772
 }
 
+# glTF key used to store entity lookup tables during export, see getEntityIndices()
+ENTITY_INDEX_KEY = '__v3dEntityIndex'
+
+# glTF key used to store the EXT_meshopt_compression fallback buffer length,
+# see generateCompressedBufferView()
+MESHOPT_FALLBACK_KEY = '__v3dMeshoptFallbackLength'
+
 # NOTE: some Windows systems use 'image/hdr' instead of 'image/vnd.radiance'
 COMPAT_IMAGE_MIME = ['image/jpeg', 'image/bmp', 'image/png', 'image/x-png', 'image/vnd.radiance', 'image/hdr']
 
@@ -171,56 +180,77 @@ def createSampler(gltf, magFilter, wrapS, wrapT):
 
     return len(samplers) - 1
 
-def getSceneIndex(gltf, idname):
+def getEntityIndices(gltf, listName, entities, idname):
+    """
+    Return indices of all entities having the given 'id' (or 'name' if the
+    entity has no 'id'), in the order they are stored in the entity list.
 
-    if gltf.get('scenes') is None:
-        return -1
+    The lookup table is kept in the glTF structure and updated lazily: entities
+    appended to the list since the last call are indexed on demand and a list
+    replaced by another one (or shrunk) is indexed from scratch. Entity lists are
+    expected to be append-only otherwise.
+    """
 
-    index = 0
-    for scene in gltf['scenes']:
-        key = 'id' if scene.get('id') != None else 'name'
-        if scene.get(key) == idname:
-            return index
+    if entities is None:
+        return []
 
-        index += 1
+    registry = gltf.get(ENTITY_INDEX_KEY)
+    if registry is None:
+        registry = gltf[ENTITY_INDEX_KEY] = {}
+
+    # [entity list, number of indexed entities, lookup table]
+    entry = registry.get(listName)
+    if entry is None or entry[0] is not entities or entry[1] > len(entities):
+        entry = registry[listName] = [entities, 0, {}]
+
+    lookup = entry[2]
+
+    for index in range(entry[1], len(entities)):
+        entity = entities[index]
+        key = 'id' if entity.get('id') != None else 'name'
+        lookup.setdefault(entity.get(key), []).append(index)
+
+    entry[1] = len(entities)
+
+    return lookup.get(idname, [])
+
+def getEntityIndex(gltf, listName, entities, idname):
+    """
+    Return the index of the first entity with the given 'id'/'name' or -1.
+    """
+
+    indices = getEntityIndices(gltf, listName, entities, idname)
+    if len(indices):
+        return indices[0]
 
     return -1
 
-def getNodeIndex(gltf, idname):
+def clearEntityIndex(gltf):
     """
-    Return the node index in the gltf array.
+    Remove entity lookup tables from the glTF structure, should be called
+    before serialization.
     """
 
-    if gltf.get('nodes') is None:
-        return -1
+    if ENTITY_INDEX_KEY in gltf:
+        del gltf[ENTITY_INDEX_KEY]
 
-    index = 0
-    for node in gltf['nodes']:
-        key = 'id' if node.get('id') != None else 'name'
-        if node.get(key) == idname:
-            return index
+def getSceneIndex(gltf, idname):
 
-        index += 1
+    return getEntityIndex(gltf, 'scenes', gltf.get('scenes'), idname)
 
-    return -1
+def getNodeIndex(gltf, idname):
+    """
+    Return the node index in the gltf array.
+    """
+
+    return getEntityIndex(gltf, 'nodes', gltf.get('nodes'), idname)
 
 def getMeshIndex(gltf, idname):
     """
     Return the mesh index in the gltf array.
     """
 
-    if gltf.get('meshes') is None:
-        return -1
-
-    index = 0
-    for mesh in gltf['meshes']:
-        key = 'id' if mesh.get('id') != None else 'name'
-        if mesh.get(key) == idname:
-            return index
-
-        index += 1
-
-    return -1
+    return getEntityIndex(gltf, 'meshes', gltf.get('meshes'), idname)
 
 
 def getMaterialIndex(gltf, idname):
@@ -230,36 +260,14 @@ def getMaterialIndex(gltf, idname):
     if idname is None:
         return -1
 
-    if gltf.get('materials') is None:
-        return -1
-
-    index = 0
-    for material in gltf['materials']:
-        key = 'id' if material.get('id') != None else 'name'
-        if material.get(key) == idname:
-            return index
-
-        index += 1
-
-    return -1
+    return getEntityIndex(gltf, 'materials', gltf.get('materials'), idname)
 
 def getCameraIndex(gltf, idname):
     """
     Return the camera index in the gltf array.
     """
 
-    if gltf.get('cameras') is None:
-        return -1
-
-    index = 0
-    for camera in gltf['cameras']:
-        key = 'id' if camera.get('id') != None else 'name'
-        if camera.get(key) == idname:
-            return index
-
-        index += 1
-
-    return -1
+    return getEntityIndex(gltf, 'cameras', gltf.get('cameras'), idname)
 
 def getLightIndex(gltf, idname):
     """
@@ -268,20 +276,7 @@ def getLightIndex(gltf, idname):
 
     v3dExt = appendExtension(gltf, 'S8S_v3d_lights', gltf)
 
-    if v3dExt.get('lights') == None:
-        return -1
-
-    lights = v3dExt['lights']
-
-    index = 0
-    for light in lights:
-        key = 'id' if light.get('id') != None else 'name'
-        if light.get(key) == idname:
-            return index
-
-        index += 1
-
-    return -1
+    return getEntityIndex(gltf, 'S8S_v3d_lights/lights', v3dExt.get('lights'), idname)
 
 def getLightProbeIndex(gltf, idname):
     """
@@ -290,20 +285,7 @@ def getLightProbeIndex(gltf, idname):
 
     v3dExt = appendExtension(gltf, 'S8S_v3d_light_probes', gltf)
 
-    if v3dExt.get('lightProbes') == None:
-        return -1
-
-    lightProbes = v3dExt['lightProbes']
-
-    index = 0
-    for probe in lightProbes:
-        key = 'id' if probe.get('id') != None else 'name'
-        if probe.get(key) == idname:
-            return index
-
-        index += 1
-
-    return -1
+    return getEntityIndex(gltf, 'S8S_v3d_light_probes/lightProbes', v3dExt.get('lightProbes'), idname)
 
 def getCurveIndex(gltf, idname):
     """
@@ -312,90 +294,42 @@ def getCurveIndex(gltf, idname):
 
     v3dExt = appendExtension(gltf, 'S8S_v3d_curves', gltf)
 
-    if v3dExt.get('curves') == None:
-        return -1
-
-    curves = v3dExt['curves']
-
-    index = 0
-    for curve in curves:
-        key = 'id' if curve.get('id') != None else 'name'
-        if curve.get(key) == idname:
-            return index
-
-        index += 1
-
-    return -1
+    return getEntityIndex(gltf, 'S8S_v3d_curves/curves', v3dExt.get('curves'), idname)
 
 def getTextureIndex(gltf, idname):
 
-    if gltf.get('textures') is None:
-        return -1
-
-    index = 0
-    for tex in gltf['textures']:
-        key = 'id' if tex.get('id') != None else 'name'
-        if tex.get(key) == idname:
-            return index
-
-        index += 1
-
-    return -1
+    return getEntityIndex(gltf, 'textures', gltf.get('textures'), idname)
 
 def getImageIndex(gltf, idname):
 
-    if gltf.get('images') is None:
-        return -1
-
-    index = 0
-    for image in gltf['images']:
-        key = 'id' if image.get('id') != None else 'name'
-        if image.get(key) == idname:
-            return index
-
-        index += 1
-
-    return -1
+    return getEntityIndex(gltf, 'images', gltf.get('images'), idname)
 
 def getFontIndex(gltf, idname):
 
     v3dExt = appendExtension(gltf, 'S8S_v3d_curves', gltf)
 
-    if v3dExt.get('fonts') == None:
-        return -1
-
-    fonts = v3dExt['fonts']
-
-    index = 0
-    for font in fonts:
-        key = 'id' if font.get('id') != None else 'name'
-        if font.get(key) == idname:
-            return index
-
-        index += 1
-
-    return -1
+    return getEntityIndex(gltf, 'S8S_v3d_curves/fonts', v3dExt.get('fonts'), idname)
 
 def getClippingPlaneIndex(gltf, idname):
 
     v3dExt = appendExtension(gltf, 'S8S_v3d_clipping_planes', gltf)
 
-    if v3dExt.get('clippingPlanes') == None:
-        return -1
-
-    clippingPlanes = v3dExt['clippingPlanes']
-
-    index = 0
-    for plane in clippingPlanes:
-        key = 'id' if plane.get('id') != None else 'name'
-        if plane.get(key) == idname:
-            return index
+    return getEntityIndex(gltf, 'S8S_v3d_clipping_planes/clippingPlanes', v3dExt.get('clippingPlanes'), idname)
 
-        index += 1
+def calcDataDigest(data):
+    """
+    Content hash used to find identical data blocks in the binary buffer.
+    """
+    return hashlib.blake2b(data, digest_size=16).digest()
 
-    return -1
+def getDedupIndex(binary):
+    """
+    Return the deduplication index assigned to the binary buffer or None if
+    deduplication is disabled (always the case for plain bytearrays).
+    """
+    return getattr(binary, 'dedupIndex', None)
 
-def generateBufferView(gltf, binary, data_buffer, target, alignment):
+def generateBufferView(gltf, binary, data_buffer, target, alignment, digest=None, byteStride=0):
 
     if data_buffer is None:
         return -1
@@ -407,6 +341,16 @@ def generateBufferView(gltf, binary, data_buffer, target, alignment):
     if target in gltf_target_enums:
         target_number = gltf_target_number[gltf_target_enums.index(target)]
 
+    dedupIndex = getDedupIndex(binary)
+    if dedupIndex is not None:
+        if digest is None:
+            digest = calcDataDigest(data_buffer)
+
+        dedupKey = ('bufferView', target_number, alignment, byteStride, len(data_buffer), digest)
+
+        if dedupKey in dedupIndex:
+            return dedupIndex[dedupKey]
+
     if gltf.get('bufferViews') is None:
         gltf['bufferViews'] = []
 
@@ -419,6 +363,9 @@ def generateBufferView(gltf, binary, data_buffer, target, alignment):
 
     bufferView['byteLength'] = len(data_buffer)
 
+    if byteStride > 0:
+        bufferView['byteStride'] = byteStride
+
     binary_length = len(binary)
 
     remainder = 0
@@ -427,9 +374,7 @@ def generateBufferView(gltf, binary, data_buffer, target, alignment):
         remainder = binary_length % alignment
 
     if remainder > 0:
-        padding_byte = struct.pack(bytes(str('<1b').encode()), 0)
-        for i in range(0, alignment - remainder):
-            binary.extend(padding_byte)
+        binary.extend(bytes(alignment - remainder))
 
 
     bufferView['byteOffset'] = len(binary)
@@ -440,10 +385,14 @@ def generateBufferView(gltf, binary, data_buffer, target, alignment):
 
     bufferViews.append(bufferView)
 
+    if dedupIndex is not None:
+        dedupIndex[dedupKey] = len(bufferViews) - 1
+
     return len(bufferViews) - 1
 
 
-def generateAccessor(gltf, binary, data, componentType, count, _type, target):
+def generateAccessor(gltf, binary, data, componentType, count, _type, target, normalized=False,
+        compression=None):
 
     if data is None:
         log.error('No data')
@@ -488,18 +437,34 @@ def generateAccessor(gltf, binary, data, componentType, count, _type, target):
         'type' : _type
     }
 
+    if normalized:
+        accessor['normalized'] = True
+
 
     if useNumpy:
-        if isinstance(data, list):
-            npData = np.array(data, dtype=GLTF_TO_NP_DTYPE[componentType])
-        else:
-            npData = data
-            data = npData.tolist()
+        dtype = np.dtype(GLTF_TO_NP_DTYPE[componentType]).newbyteorder('<')
+
+        # lists are converted once, arrays are used as is if the dtype matches
+        npData = np.asarray(data).reshape(-1)
+
+        if npData.dtype != dtype:
+            if (npData.dtype.kind in 'iu' and dtype.kind in 'iu' and npData.size and
+                    (npData.min() < np.iinfo(dtype).min or npData.max() > np.iinfo(dtype).max)):
+                log.error('Data does not fit into componentType ' + componentType)
+                return -1
+            npData = npData.astype(dtype)
 
-        npData = npData.reshape(-1, type_count)
+        if npData.size != count * type_count:
+            log.error('Invalid data length ' + str(npData.size))
+            return -1
+
+        npData = np.ascontiguousarray(npData.reshape(-1, type_count))
         accessor['min'] = npData.min(axis=0).tolist()
         accessor['max'] = npData.max(axis=0).tolist()
 
+        # NOTE: flat byte view of the array, copied only once into the binary buffer
+        data_buffer = memoryview(npData).cast('B')
+
     else:
         minimum = []
         maximum = []
@@ -518,16 +483,30 @@ def generateAccessor(gltf, binary, data, componentType, count, _type, target):
         accessor['min'] = minimum
         accessor['max'] = maximum
 
-    convert_type = '<' + str(count * type_count) + convert_type
+        convert_type = '<' + str(count * type_count) + convert_type
+
+        # NOTE: There is a bug in the struct package happened on old
+        # python versions, reproduced in 3ds max 2017. Need to
+        # use byte strings in the pack method as a workaround.
+        # see: https://bugs.python.org/issue19099
+
+        data_buffer = struct.pack(bytes(convert_type.encode()), *data)
+
+    dedupIndex = getDedupIndex(binary)
+    digest = None
 
-    # NOTE: There is a bug in the struct package happened on old
-    # python versions, reproduced in 3ds max 2017. Need to
-    # use byte strings in the pack method as a workaround.
-    # see: https://bugs.python.org/issue19099
+    if dedupIndex is not None:
+        digest = calcDataDigest(data_buffer)
+        dedupKey = ('accessor', componentTypeInteger, _type, count, target, normalized, digest)
 
-    data_buffer = struct.pack(bytes(convert_type.encode()), *data)
+        if dedupKey in dedupIndex:
+            return dedupIndex[dedupKey]
 
-    bufferView = generateBufferView(gltf, binary, data_buffer, target, convert_type_size)
+    if compression is not None and canCompressBufferView(compression, convert_type_size * type_count):
+        bufferView = generateCompressedBufferView(gltf, binary, data_buffer,
+                convert_type_size * type_count, count, compression, target=target, digest=digest)
+    else:
+        bufferView = generateBufferView(gltf, binary, data_buffer, target, convert_type_size, digest)
 
     if bufferView < 0:
         log.error('Invalid buffer view')
@@ -537,8 +516,477 @@ def generateAccessor(gltf, binary, data, componentType, count, _type, target):
 
     accessors.append(accessor)
 
+    if dedupIndex is not None:
+        dedupIndex[dedupKey] = len(accessors) - 1
+
+    return len(accessors) - 1
+
+def generateInterleavedAccessors(gltf, binary, attrs, target, compression=None):
+    """
+    Pack several vertex attributes into a single strided buffer view.
+
+    attrs is a list of (data, componentType, count, _type[, normalized])
+    tuples, all attributes should have the same count. Every attribute element is padded
+    to a 4-byte boundary as required by the glTF spec. Returns a list of
+    accessor indices in the attrs order or None if the attributes can't be
+    interleaved, in which case separate accessors should be used.
+
+    Use compression='ATTRIBUTES' to store the buffer view with meshopt
+    compression.
+    """
+
+    if not useNumpy or not len(attrs):
+        return None
+
+    gltf_enumNames = [ "BYTE", "UNSIGNED_BYTE", "SHORT", "UNSIGNED_SHORT", "UNSIGNED_INT", "FLOAT" ]
+    gltf_type_count = { "SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4 }
+
+    count = attrs[0][2]
+    if count < 1:
+        return None
+
+    fields = []
+    offset = 0
+
+    for attr in attrs:
+        data, componentType, attrCount, _type = attr[:4]
+        if data is None or attrCount != count:
+            return None
+
+        if componentType not in gltf_enumNames or _type not in gltf_type_count:
+            return None
+
+        dtype = np.dtype(GLTF_TO_NP_DTYPE[componentType]).newbyteorder('<')
+        type_count = gltf_type_count[_type]
+
+        npData = np.asarray(data).reshape(-1)
+        if npData.size != count * type_count:
+            log.error('Invalid data length ' + str(npData.size))
+            return None
+
+        if npData.dtype != dtype:
+            if (npData.dtype.kind in 'iu' and dtype.kind in 'iu' and
+                    (npData.min() < np.iinfo(dtype).min or npData.max() > np.iinfo(dtype).max)):
+                return None
+            npData = npData.astype(dtype)
+
+        fields.append((npData.reshape(-1, type_count), dtype, type_count, offset))
+
+        size = dtype.itemsize * type_count
+        offset += size + (-size % 4)
+
+    byteStride = offset
+
+    # glTF limits byteStride to 252
+    if byteStride > 252:
+        return None
+
+    npBuffer = np.zeros((count, byteStride), dtype=np.uint8)
+
+    for npData, dtype, type_count, fieldOffset in fields:
+        size = dtype.itemsize * type_count
+        npBuffer[:, fieldOffset:fieldOffset+size] = np.ascontiguousarray(npData).view(np.uint8).reshape(count, size)
+
+    data_buffer = memoryview(npBuffer).cast('B')
+
+    if compression is not None:
+        bufferView = generateCompressedBufferView(gltf, binary, data_buffer,
+                byteStride, count, compression, target=target)
+    else:
+        bufferView = generateBufferView(gltf, binary, data_buffer, target, 4, byteStride=byteStride)
+
+    if bufferView < 0:
+        log.error('Invalid buffer view')
+        return None
+
+    if gltf.get('accessors') is None:
+        gltf['accessors'] = []
+
+    accessors = gltf['accessors']
+
+    dedupIndex = getDedupIndex(binary)
+
+    accessorIndices = []
+
+    for (npData, dtype, type_count, fieldOffset), attr in zip(fields, attrs):
+        componentTypeInteger = [ 5120, 5121, 5122, 5123, 5125, 5126 ][gltf_enumNames.index(attr[1])]
+        normalized = len(attr) > 4 and attr[4]
+
+        # identical buffer views share the same accessors as well
+        if dedupIndex is not None:
+            dedupKey = ('interleavedAccessor', bufferView, fieldOffset,
+                    componentTypeInteger, attr[3], count, normalized)
+
+            if dedupKey in dedupIndex:
+                accessorIndices.append(dedupIndex[dedupKey])
+                continue
+
+        accessor = {
+            'bufferView' : bufferView,
+            'byteOffset' : fieldOffset,
+            'componentType' : componentTypeInteger,
+            'count' : count,
+            'type' : attr[3],
+            'min' : npData.min(axis=0).tolist(),
+            'max' : npData.max(axis=0).tolist()
+        }
+
+        if normalized:
+            accessor['normalized'] = True
+
+        accessors.append(accessor)
+        accessorIndices.append(len(accessors) - 1)
+
+        if dedupIndex is not None:
+            dedupIndex[dedupKey] = len(accessors) - 1
+
+    return accessorIndices
+
+def generateSparseAccessor(gltf, binary, data, componentType, count, _type, tolerance=0.0,
+        compression=None):
+    """
+    Generate a sparse accessor with zero base values, elements having all
+    components within the tolerance are treated as zeros. Intended for data
+    like morph target deltas where most elements are zero. Use
+    compression='ATTRIBUTES' to store the values with meshopt compression.
+    """
+
+    if not useNumpy:
+        return -1
+
+    gltf_enumNames = [ "BYTE", "UNSIGNED_BYTE", "SHORT", "UNSIGNED_SHORT", "UNSIGNED_INT", "FLOAT" ]
+    gltf_type_count = { "SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4 }
+
+    if componentType not in gltf_enumNames:
+        log.error('Invalid componentType ' + componentType)
+        return -1
+
+    if _type not in gltf_type_count:
+        log.error('Invalid type ' + _type)
+        return -1
+
+    componentTypeInteger = [ 5120, 5121, 5122, 5123, 5125, 5126 ][gltf_enumNames.index(componentType)]
+    type_count = gltf_type_count[_type]
+
+    dtype = np.dtype(GLTF_TO_NP_DTYPE[componentType]).newbyteorder('<')
+
+    npData = np.asarray(data).reshape(-1)
+    if npData.size != count * type_count:
+        log.error('Invalid data length ' + str(npData.size))
+        return -1
+
+    npData = npData.astype(dtype).reshape(-1, type_count)
+
+    sparseIndices = np.flatnonzero(np.any(np.abs(npData) > tolerance, axis=1))
+    sparseValues = np.ascontiguousarray(npData[sparseIndices])
+
+    accessor = {
+        'componentType' : componentTypeInteger,
+        'count' : count,
+        'type' : _type
+    }
+
+    # min/max are calculated on the substituted data, which includes zeros
+    if len(sparseIndices) < count:
+        accessor['min'] = sparseValues.min(axis=0, initial=0).tolist()
+        accessor['max'] = sparseValues.max(axis=0, initial=0).tolist()
+    else:
+        accessor['min'] = sparseValues.min(axis=0).tolist()
+        accessor['max'] = sparseValues.max(axis=0).tolist()
+
+    # accessor without buffer view and sparse data is initialized with zeros
+    if len(sparseIndices):
+        if count <= 256:
+            indicesType = 5121
+            sparseIndices = sparseIndices.astype(np.uint8)
+        elif count <= 65536:
+            indicesType = 5123
+            sparseIndices = sparseIndices.astype('<u2')
+        else:
+            indicesType = 5125
+            sparseIndices = sparseIndices.astype('<u4')
+
+        indicesView = generateBufferView(gltf, binary, memoryview(sparseIndices).cast('B'),
+                '', sparseIndices.itemsize)
+
+        valueSize = dtype.itemsize * type_count
+
+        if compression is not None and canCompressBufferView(compression, valueSize):
+            valuesView = generateCompressedBufferView(gltf, binary, memoryview(sparseValues).cast('B'),
+                    valueSize, len(sparseValues), compression)
+        else:
+            valuesView = generateBufferView(gltf, binary, memoryview(sparseValues).cast('B'),
+                    '', dtype.itemsize)
+
+        if indicesView < 0 or valuesView < 0:
+            log.error('Invalid buffer view')
+            return -1
+
+        accessor['sparse'] = {
+            'count' : len(sparseIndices),
+            'indices' : {
+                'bufferView' : indicesView,
+                'componentType' : indicesType
+            },
+            'values' : {
+                'bufferView' : valuesView
+            }
+        }
+
+    if gltf.get('accessors') is None:
+        gltf['accessors'] = []
+
+    accessors = gltf['accessors']
+
+    dedupIndex = getDedupIndex(binary)
+    if dedupIndex is not None:
+        sparse = accessor.get('sparse')
+        dedupKey = ('sparseAccessor', componentTypeInteger, _type, count,
+                sparse['indices']['bufferView'] if sparse else -1,
+                sparse['values']['bufferView'] if sparse else -1)
+
+        if dedupKey in dedupIndex:
+            return dedupIndex[dedupKey]
+
+    accessors.append(accessor)
+
+    if dedupIndex is not None:
+        dedupIndex[dedupKey] = len(accessors) - 1
+
     return len(accessors) - 1
 
+def canCompressBufferView(mode, byteStride):
+    """
+    Check the EXT_meshopt_compression restrictions on the buffer view layout.
+    """
+
+    if not useNumpy:
+        return False
+
+    if mode == 'ATTRIBUTES':
+        return byteStride % 4 == 0 and byteStride <= 256
+    elif mode in ['TRIANGLES', 'INDICES']:
+        return byteStride in [2, 4]
+    else:
+        return False
+
+def generateCompressedBufferView(gltf, binary, data_buffer, byteStride, count, mode,
+        filter='NONE', target='', digest=None):
+    """
+    Generate a buffer view compressed with EXT_meshopt_compression. The
+    compressed data is stored in the binary buffer, while the uncompressed
+    data layout is described with the fallback buffer, see
+    generateMeshoptFallbackBuffer().
+
+    mode is one of 'ATTRIBUTES', 'TRIANGLES' or 'INDICES', the data should be
+    already processed with the given filter.
+    """
+
+    if data_buffer is None:
+        return -1
+
+    gltf_target_number = [ 34962, 34963 ]
+    gltf_target_enums = [ "ARRAY_BUFFER", "ELEMENT_ARRAY_BUFFER" ]
+
+    target_number = 0
+    if target in gltf_target_enums:
+        target_number = gltf_target_number[gltf_target_enums.index(target)]
+
+    dedupIndex = getDedupIndex(binary)
+    if dedupIndex is not None:
+        if digest is None:
+            digest = calcDataDigest(data_buffer)
+
+        dedupKey = ('compressedBufferView', mode, filter, target_number, byteStride,
+                count, len(data_buffer), digest)
+
+        if dedupKey in dedupIndex:
+            return dedupIndex[dedupKey]
+
+    if mode == 'ATTRIBUTES':
+        compressed = meshopt.encodeVertexBuffer(data_buffer, count, byteStride)
+    else:
+        indices = np.frombuffer(data_buffer, dtype='<u2' if byteStride == 2 else '<u4')
+        if mode == 'TRIANGLES':
+            compressed = meshopt.encodeIndexBuffer(indices)
+        else:
+            compressed = meshopt.encodeIndexSequence(indices)
+
+    if gltf.get('bufferViews') is None:
+        gltf['bufferViews'] = []
+
+    bufferViews = gltf['bufferViews']
+
+    remainder = len(binary) % 4
+    if remainder > 0:
+        binary.extend(bytes(4 - remainder))
+
+    byteOffset = len(binary)
+    binary.extend(compressed)
+
+    # decoded data is placed into the fallback buffer
+    fallbackOffset = gltf.get(MESHOPT_FALLBACK_KEY, 0)
+    fallbackOffset += -fallbackOffset % 4
+    gltf[MESHOPT_FALLBACK_KEY] = fallbackOffset + len(data_buffer)
+
+    bufferView = {
+        'buffer' : 1,
+        'byteOffset' : fallbackOffset,
+        'byteLength' : len(data_buffer)
+    }
+
+    if target_number != 0:
+        bufferView['target'] = target_number
+
+    # core byteStride is allowed for vertex data only
+    if target_number == 34962:
+        bufferView['byteStride'] = byteStride
+
+    extData = {
+        'buffer' : 0,
+        'byteOffset' : byteOffset,
+        'byteLength' : len(compressed),
+        'byteStride' : byteStride,
+        'count' : count,
+        'mode' : mode
+    }
+
+    if filter != 'NONE':
+        extData['filter'] = filter
+
+    appendExtension(gltf, 'EXT_meshopt_compression', bufferView, extData, isRequired=True)
+
+    bufferViews.append(bufferView)
+
+    if dedupIndex is not None:
+        dedupIndex[dedupKey] = len(bufferViews) - 1
+
+    return len(bufferViews) - 1
+
+def generateFilteredAccessor(gltf, binary, data, count, _type, filter, bits, target=''):
+    """
+    Generate an accessor stored with meshopt compression and one of the lossy
+    filters:
+        'OCTAHEDRAL' - unit vectors (VEC3 normals or VEC4 tangents), stored as
+            normalized BYTE (bits <= 8) or SHORT values
+        'QUATERNION' - unit quaternions (VEC4), stored as normalized SHORT values
+        'EXPONENTIAL' - arbitrary FLOAT data
+    """
+
+    if not useNumpy:
+        return -1
+
+    gltf_type_count = { "SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4 }
+
+    if _type not in gltf_type_count:
+        log.error('Invalid type ' + _type)
+        return -1
+
+    type_count = gltf_type_count[_type]
+
+    npData = np.asarray(data, dtype=np.float32).reshape(-1)
+    if npData.size != count * type_count:
+        log.error('Invalid data length ' + str(npData.size))
+        return -1
+
+    npData = npData.reshape(-1, type_count)
+
+    normalized = False
+
+    if filter == 'OCTAHEDRAL':
+        if type_count == 3:
+            npData = np.hstack((npData, np.zeros((count, 1), dtype=np.float32)))
+        elif type_count != 4:
+            log.error('Invalid type for octahedral filter ' + _type)
+            return -1
+
+        encoded = meshopt.encodeFilterOct(npData, bits)
+        componentType = 5120 if encoded.itemsize == 1 else 5122
+        normalized = True
+
+        # normalized normals and tangents are not allowed by the core spec
+        appendExtension(gltf, 'KHR_mesh_quantization', isRequired=True)
+
+    elif filter == 'QUATERNION':
+        if type_count != 4:
+            log.error('Invalid type for quaternion filter ' + _type)
+            return -1
+
+        encoded = meshopt.encodeFilterQuat(npData, bits)
+        componentType = 5122
+        normalized = True
+
+    elif filter == 'EXPONENTIAL':
+        encoded = meshopt.encodeFilterExp(npData, bits, type_count)
+        componentType = 5126
+
+    else:
+        log.error('Invalid filter ' + filter)
+        return -1
+
+    encoded = np.ascontiguousarray(encoded)
+    byteStride = encoded.itemsize * encoded.shape[1]
+
+    bufferView = generateCompressedBufferView(gltf, binary, memoryview(encoded).cast('B'),
+            byteStride, count, 'ATTRIBUTES', filter, target)
+
+    if bufferView < 0:
+        log.error('Invalid buffer view')
+        return -1
+
+    if gltf.get('accessors') is None:
+        gltf['accessors'] = []
+
+    accessors = gltf['accessors']
+
+    dedupIndex = getDedupIndex(binary)
+    if dedupIndex is not None:
+        dedupKey = ('filteredAccessor', bufferView, _type)
+
+        if dedupKey in dedupIndex:
+            return dedupIndex[dedupKey]
+
+    accessor = {
+        'bufferView' : bufferView,
+        'componentType' : componentType,
+        'count' : count,
+        'type' : _type
+    }
+
+    if normalized:
+        accessor['normalized'] = True
+
+    accessors.append(accessor)
+
+    if dedupIndex is not None:
+        dedupIndex[dedupKey] = len(accessors) - 1
+
+    return len(accessors) - 1
+
+def generateMeshoptFallbackBuffer(gltf):
+    """
+    Append the EXT_meshopt_compression fallback buffer, should be called after
+    the main buffer is generated. The fallback buffer has no data since the
+    extension is marked as required.
+    """
+
+    if MESHOPT_FALLBACK_KEY not in gltf:
+        return
+
+    fallbackLength = gltf[MESHOPT_FALLBACK_KEY]
+    del gltf[MESHOPT_FALLBACK_KEY]
+
+    buffer = {
+        'byteLength' : fallbackLength
+    }
+
+    appendExtension(gltf, 'EXT_meshopt_compression', buffer, {'fallback' : True}, isRequired=True)
+
+    if gltf.get('buffers') is None:
+        gltf['buffers'] = []
+
+    gltf['buffers'].append(buffer)
+
 def createAnimChannel(sampler, nodeIndex, path):
     channel = {
         'sampler' : sampler,
@@ -676,3 +1124,52 @@ def processInfinity(value):
             return '-Infinity'
     else:
         return value
+
+def iterEncodeJSON(gltf, indent=None, separators=None):
+    """
+    Encode the glTF dictionary as a sequence of JSON strings, joined they are
+    equal to json.dumps(gltf, sort_keys=True, ensure_ascii=False, ...).
+    Entities of top-level arrays (nodes, accessors, etc) are encoded one by
+    one, so the full JSON document is never held in memory.
+    """
+
+    if separators is None:
+        separators = (', ', ': ') if indent is None else (',', ': ')
+    itemSep, keySep = separators
+
+    def dumps(value, newline):
+        encoded = json.dumps(value, indent=indent, separators=separators,
+                sort_keys=True, ensure_ascii=False)
+        # JSON strings can't contain raw newlines, so this only shifts lines
+        return encoded.replace('\n', newline) if indent is not None else encoded
+
+    if indent is None:
+        newline0 = newline1 = newline2 = ''
+    else:
+        newline0 = '\n'
+        newline1 = newline0 + ' ' * indent
+        newline2 = newline1 + ' ' * indent
+
+    if not gltf:
+        yield '{}'
+        return
+
+    yield '{'
+
+    first = True
+    for key in sorted(gltf):
+        value = gltf[key]
+
+        yield (newline1 if first else itemSep + newline1)
+        yield json.dumps(key, ensure_ascii=False) + keySep
+        first = False
+
+        if isinstance(value, list) and value:
+            yield '[' + newline2 + dumps(value[0], newline2)
+            for entity in value[1:]:
+                yield itemSep + newline2 + dumps(entity, newline2)
+            yield newline1 + ']'
+        else:
+            yield dumps(value, newline1)
+
+    yield newline0 + '}'
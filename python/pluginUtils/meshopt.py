@@ -0,0 +1,430 @@
+"""
+Encoders for the EXT_meshopt_compression glTF extension: vertex codec
+(version 0), index codec (version 1), index sequence codec (version 1) and
+vertex filters. The produced streams follow the extension spec, see:
+https://github.com/KhronosGroup/glTF/tree/main/extensions/2.0/Vendor/EXT_meshopt_compression
+"""
+
+import math
+
+import numpy as np
+
+from .log import getLogger
+
+log = getLogger('V3D-PU')
+
+VERTEX_HEADER = 0xa0
+INDEX_HEADER = 0xe0
+SEQUENCE_HEADER = 0xd0
+
+INDEX_CODEC_VERSION = 1
+
+BYTE_GROUP_SIZE = 16
+VERTEX_BLOCK_SIZE_BYTES = 8192
+VERTEX_BLOCK_MAX_SIZE = 256
+TAIL_MAX_SIZE = 32
+
+# header bits -> group encoding bit width
+GROUP_BITS = [0, 2, 4, 8]
+
+# static table used for triangle codes, generated by meshoptimizer on a
+# training mesh set, the last two entries are never used for encoding
+CODEAUX_TABLE = [
+    0x00, 0x76, 0x87, 0x56, 0x67, 0x78, 0xa9, 0x86,
+    0x65, 0x89, 0x68, 0x98, 0x01, 0x69, 0x00, 0x00
+]
+
+TRIANGLE_INDEX_ORDER = [
+    (0, 1, 2),
+    (1, 2, 0),
+    (2, 0, 1)
+]
+
+
+def getVertexBlockSize(byteStride):
+    size = (VERTEX_BLOCK_SIZE_BYTES // byteStride) & ~(BYTE_GROUP_SIZE - 1)
+    return min(size, VERTEX_BLOCK_MAX_SIZE)
+
+def encodeByteGroups(deltas):
+    """
+    Encode zigzagged byte deltas, deltas is a (groups, 16) uint8 array.
+    Returns the header and the encoded groups.
+    """
+
+    numGroups = deltas.shape[0]
+
+    # size of each group for all possible bit widths, sentinel values are
+    # stored as separate bytes after the packed bits
+    sizes = np.empty((numGroups, 4), dtype=np.int64)
+    sizes[:, 0] = np.where(np.any(deltas, axis=1), 1 << 30, 0)
+    sizes[:, 1] = 4 + np.count_nonzero(deltas >= 3, axis=1)
+    sizes[:, 2] = 8 + np.count_nonzero(deltas >= 15, axis=1)
+    sizes[:, 3] = BYTE_GROUP_SIZE
+
+    # same selection as the reference encoder: 8 bits by default, smaller
+    # bit widths if they save space, consistent bit widths on ties
+    modes = []
+    lastMode = -1
+    for groupSizes in sizes.tolist():
+        bestMode = 3
+        for mode in range(3):
+            if (groupSizes[mode] < groupSizes[bestMode] or (groupSizes[mode] == groupSizes[bestMode]
+                    and mode == lastMode and bestMode != 3)):
+                bestMode = mode
+        modes.append(bestMode)
+        lastMode = bestMode
+
+    modes = np.array(modes, dtype=np.int64)
+
+    header = np.zeros((numGroups + 3) // 4, dtype=np.uint8)
+    np.add.at(header, np.arange(numGroups) // 4,
+            (modes << ((np.arange(numGroups) % 4) * 2)).astype(np.uint8))
+
+    out = bytearray(header.tobytes())
+
+    for group, mode in zip(deltas, modes):
+        if mode == 0:
+            continue
+        elif mode == 3:
+            out += group.tobytes()
+            continue
+
+        bits = GROUP_BITS[mode]
+        sentinel = (1 << bits) - 1
+
+        packed = np.minimum(group, sentinel).reshape(-1, 8 // bits).astype(np.uint32)
+        shifts = np.arange(8 // bits - 1, -1, -1, dtype=np.uint32) * bits
+
+        out += np.bitwise_or.reduce(packed << shifts, axis=1).astype(np.uint8).tobytes()
+        out += group[group >= sentinel].tobytes()
+
+    return out
+
+def encodeVertexBuffer(data, count, byteStride):
+    """
+    Encode vertex data (bytes-like object with count elements of byteStride
+    size) using the meshopt vertex codec.
+    """
+
+    if byteStride <= 0 or byteStride > 256 or byteStride % 4:
+        raise ValueError('Invalid byteStride ' + str(byteStride))
+
+    vertices = np.frombuffer(data, dtype=np.uint8).reshape(count, byteStride)
+
+    out = bytearray([VERTEX_HEADER])
+
+    blockSize = getVertexBlockSize(byteStride)
+
+    # deltas of the first vertex are calculated relative to itself
+    lastVertex = vertices[0] if count else np.zeros(byteStride, dtype=np.uint8)
+
+    for blockStart in range(0, count, blockSize):
+        block = vertices[blockStart:blockStart+blockSize]
+        blockCount = block.shape[0]
+        alignedCount = (blockCount + BYTE_GROUP_SIZE - 1) & ~(BYTE_GROUP_SIZE - 1)
+
+        prev = np.vstack((lastVertex, block[:-1]))
+        deltas = (block - prev).astype(np.uint8)
+        # zigzag encoding
+        deltas = ((deltas << 1) ^ ((deltas >> 7) * 0xff)).astype(np.uint8)
+
+        # one byte stream per vertex byte, padded to a multiple of the group size
+        streams = np.zeros((byteStride, alignedCount), dtype=np.uint8)
+        streams[:, :blockCount] = deltas.T
+
+        for stream in streams:
+            out += encodeByteGroups(stream.reshape(-1, BYTE_GROUP_SIZE))
+
+        lastVertex = block[-1]
+
+    # the first vertex padded to 32 bytes finalizes the stream
+    if byteStride < TAIL_MAX_SIZE:
+        out += bytes(TAIL_MAX_SIZE - byteStride)
+
+    out += vertices[0].tobytes() if count else bytes(byteStride)
+
+    return bytes(out)
+
+def encodeVByte(out, value):
+    while True:
+        if value > 127:
+            out.append((value & 127) | 128)
+            value >>= 7
+        else:
+            out.append(value)
+            return
+
+def encodeIndexDelta(out, index, last):
+    d = (index - last) & 0xffffffff
+    encodeVByte(out, ((d << 1) ^ (0xffffffff if d & 0x80000000 else 0)) & 0xffffffff)
+
+def getEdgeFifo(edgeFifo, a, b, c, offset):
+    for i in range(16):
+        e0, e1 = edgeFifo[(offset - 1 - i) & 15]
+
+        if e0 == a and e1 == b:
+            return (i << 2) | 0
+        if e0 == b and e1 == c:
+            return (i << 2) | 1
+        if e0 == c and e1 == a:
+            return (i << 2) | 2
+
+    return -1
+
+def getVertexFifo(vertexFifo, v, offset):
+    for i in range(16):
+        if vertexFifo[(offset - 1 - i) & 15] == v:
+            return i
+
+    return -1
+
+def encodeIndexBuffer(indices):
+    """
+    Encode a triangle list using the meshopt index codec.
+    """
+
+    indices = np.asarray(indices, dtype=np.uint32).reshape(-1)
+
+    if len(indices) % 3:
+        raise ValueError('Index count should be a multiple of 3')
+
+    edgeFifo = [(-1, -1)] * 16
+    vertexFifo = [-1] * 16
+
+    edgeFifoOffset = 0
+    vertexFifoOffset = 0
+
+    nextIndex = 0
+    last = 0
+
+    fecMax = 13
+
+    codes = bytearray()
+    data = bytearray()
+
+    for i0, i1, i2 in indices.reshape(-1, 3).tolist():
+        fer = getEdgeFifo(edgeFifo, i0, i1, i2, edgeFifoOffset)
+
+        if fer >= 0 and (fer >> 2) < 15:
+            # the triangle is rotated to match the edge found in the fifo
+            tri = (i0, i1, i2)
+            order = TRIANGLE_INDEX_ORDER[fer & 3]
+            a, b, c = tri[order[0]], tri[order[1]], tri[order[2]]
+
+            fe = fer >> 2
+            fc = getVertexFifo(vertexFifo, c, vertexFifoOffset)
+
+            if fc >= 1 and fc < fecMax:
+                fec = fc
+            elif c == nextIndex:
+                fec = 0
+                nextIndex += 1
+            else:
+                fec = 15
+
+            # strip-like sequences
+            if fec == 15:
+                if c + 1 == last:
+                    fec = 13
+                    last = c
+                elif c == last + 1:
+                    fec = 14
+                    last = c
+
+            codes.append((fe << 4) | fec)
+
+            if fec == 15:
+                encodeIndexDelta(data, c, last)
+                last = c
+
+            if fec == 0 or fec >= fecMax:
+                vertexFifo[vertexFifoOffset] = c
+                vertexFifoOffset = (vertexFifoOffset + 1) & 15
+
+            edgeFifo[edgeFifoOffset] = (c, b)
+            edgeFifoOffset = (edgeFifoOffset + 1) & 15
+            edgeFifo[edgeFifoOffset] = (a, c)
+            edgeFifoOffset = (edgeFifoOffset + 1) & 15
+
+        else:
+            rotation = 1 if i1 == nextIndex else 2 if i2 == nextIndex else 0
+            tri = (i0, i1, i2)
+            order = TRIANGLE_INDEX_ORDER[rotation]
+            a, b, c = tri[order[0]], tri[order[1]], tri[order[2]]
+
+            # 0/1/2 triangle restarts the sequence
+            reset = False
+            if a == 0 and b == 1 and c == 2 and nextIndex > 0:
+                reset = True
+                nextIndex = 0
+                vertexFifo = [-1] * 16
+
+            fb = getVertexFifo(vertexFifo, b, vertexFifoOffset)
+            fc = getVertexFifo(vertexFifo, c, vertexFifoOffset)
+
+            if a == nextIndex:
+                fea = 0
+                nextIndex += 1
+            else:
+                fea = 15
+
+            if fb >= 0 and fb < 14:
+                feb = fb + 1
+            elif b == nextIndex:
+                feb = 0
+                nextIndex += 1
+            else:
+                feb = 15
+
+            if fc >= 0 and fc < 14:
+                fec = fc + 1
+            elif c == nextIndex:
+                fec = 0
+                nextIndex += 1
+            else:
+                fec = 15
+
+            codeAux = (feb << 4) | fec
+            codeAuxIndex = CODEAUX_TABLE.index(codeAux) if codeAux in CODEAUX_TABLE[:14] else -1
+
+            if fea == 0 and codeAuxIndex >= 0 and not reset:
+                codes.append(0xf0 | codeAuxIndex)
+            else:
+                codes.append(0xf0 | 14 | (fea & 1))
+                data.append(codeAux)
+
+            if fea == 15:
+                encodeIndexDelta(data, a, last)
+                last = a
+
+            if feb == 15:
+                encodeIndexDelta(data, b, last)
+                last = b
+
+            if fec == 15:
+                encodeIndexDelta(data, c, last)
+                last = c
+
+            for v, fe in ((a, fea), (b, feb), (c, fec)):
+                if fe == 0 or fe == 15:
+                    vertexFifo[vertexFifoOffset] = v
+                    vertexFifoOffset = (vertexFifoOffset + 1) & 15
+
+            edgeFifo[edgeFifoOffset] = (b, a)
+            edgeFifoOffset = (edgeFifoOffset + 1) & 15
+            edgeFifo[edgeFifoOffset] = (c, b)
+            edgeFifoOffset = (edgeFifoOffset + 1) & 15
+            edgeFifo[edgeFifoOffset] = (a, c)
+            edgeFifoOffset = (edgeFifoOffset + 1) & 15
+
+    # the codeaux table is used for decoding and as a padding as well
+    return bytes([INDEX_HEADER | INDEX_CODEC_VERSION]) + bytes(codes) + bytes(data) + bytes(CODEAUX_TABLE)
+
+def encodeIndexSequence(indices):
+    """
+    Encode an arbitrary index sequence (e.g. line lists) using the meshopt
+    index sequence codec.
+    """
+
+    indices = np.asarray(indices, dtype=np.uint32).reshape(-1)
+
+    out = bytearray([SEQUENCE_HEADER | INDEX_CODEC_VERSION])
+
+    last = [0, 0]
+    current = 0
+
+    for index in indices.tolist():
+        # switch the baseline when the delta grows too large
+        cd = (index - last[current]) & 0xffffffff
+        if cd & 0x80000000:
+            cd = 0x100000000 - cd
+        if cd >= 30:
+            current ^= 1
+
+        d = (index - last[current]) & 0xffffffff
+        v = ((d << 1) ^ (0xffffffff if d & 0x80000000 else 0)) & 0xffffffff
+
+        # the low bit stores the baseline used for reconstruction
+        encodeVByte(out, (v << 1) | current)
+
+        last[current] = index
+
+    out += bytes(4)
+
+    return bytes(out)
+
+def quantizeSnorm(data, bits):
+    scale = (1 << (bits - 1)) - 1
+    data = np.clip(data, -1.0, 1.0) * scale
+    # round half away from zero
+    return np.trunc(data + np.where(data >= 0, 0.5, -0.5)).astype(np.int32)
+
+def encodeFilterOct(data, bits):
+    """
+    Octahedral filter for unit vectors, data is a (count, 4) array of xyzw
+    values, w is stored as is. Returns int8 (bits <= 8) or int16 elements.
+    """
+
+    data = np.asarray(data, dtype=np.float32).reshape(-1, 4)
+    byteStride = 4 if bits <= 8 else 8
+
+    nx, ny, nz, nw = data[:, 0], data[:, 1], data[:, 2], data[:, 3]
+
+    nl = np.abs(nx) + np.abs(ny) + np.abs(nz)
+    ns = np.divide(1.0, nl, out=np.zeros_like(nl), where=(nl != 0))
+
+    nx = nx * ns
+    ny = ny * ns
+
+    u = np.where(nz >= 0, nx, (1 - np.abs(ny)) * np.where(nx >= 0, 1.0, -1.0))
+    v = np.where(nz >= 0, ny, (1 - np.abs(nx)) * np.where(ny >= 0, 1.0, -1.0))
+
+    out = np.empty((len(data), 4), dtype=np.int8 if byteStride == 4 else np.int16)
+    out[:, 0] = quantizeSnorm(u, bits)
+    out[:, 1] = quantizeSnorm(v, bits)
+    out[:, 2] = quantizeSnorm(1.0, bits)
+    out[:, 3] = quantizeSnorm(nw, byteStride * 2)
+
+    return out.astype(out.dtype.newbyteorder('<'))
+
+def encodeFilterQuat(data, bits):
+    """
+    Quaternion filter for unit quaternions, data is a (count, 4) array of
+    xyzw values. Returns int16 elements.
+    """
+
+    data = np.asarray(data, dtype=np.float32).reshape(-1, 4)
+    rows = np.arange(len(data))
+
+    # the largest component is dropped and restored by the decoder
+    qc = np.argmax(np.abs(data), axis=1)
+
+    sign = np.where(data[rows, qc] < 0, -1.0, 1.0)
+    scaler = math.sqrt(2.0)
+
+    out = np.empty((len(data), 4), dtype=np.int16)
+    for i in range(3):
+        out[:, i] = quantizeSnorm(data[rows, (qc + i + 1) & 3] * scaler * sign, bits)
+
+    out[:, 3] = (quantizeSnorm(1.0, bits) & ~3) | qc
+
+    return out.astype(np.dtype(np.int16).newbyteorder('<'))
+
+def encodeFilterExp(data, bits, components):
+    """
+    Exponential filter for arbitrary float data, each component is stored
+    with its own exponent and a bits-wide mantissa. Returns uint32 elements.
+    """
+
+    data = np.asarray(data, dtype=np.float32).reshape(-1, components)
+
+    _, exp = np.frexp(data)
+    # exponent that guarantees that the mantissa fits into bits
+    exp = np.clip(exp.astype(np.int32) - (bits - 1), -100, 100)
+
+    mantissa = np.ldexp(data.astype(np.float64), -exp)
+    mantissa = np.trunc(mantissa + np.where(mantissa >= 0, 0.5, -0.5)).astype(np.int64)
+
+    out = (mantissa & 0xffffff) | ((exp.astype(np.int64) & 0xff) << 24)
+
+    return out.astype(np.dtype(np.uint32).newbyteorder('<'))
@@ -0,0 +1,552 @@
+"""
+Mesh processing routines operating on triangle lists: post-transform vertex
+cache optimization (Tipsify, Sander et al. 2007), overdraw-aware cluster
+sorting, vertex fetch reordering and simplification. Also contains batched
+vector rotation routines used for morph target tangents.
+"""
+
+import numpy as np
+
+from .log import getLogger
+
+log = getLogger('V3D-PU')
+
+# FIFO cache size assumed by the optimizations, matches most mobile GPUs
+VERTEX_CACHE_SIZE = 16
+
+# clusters are allowed to have this much worse ACMR than the optimized mesh
+OVERDRAW_THRESHOLD = 1.05
+
+# max simplification error relative to the mesh extent
+SIMPLIFY_TARGET_ERROR = 0.02
+# number of collapses checked for triangle flips at once, limits memory usage
+SIMPLIFY_CHUNK_SIZE = 1 << 18
+
+
+def optimizeVertexCache(indices, vertexCount, cacheSize=VERTEX_CACHE_SIZE):
+    """
+    Reorder triangles to improve post-transform vertex cache hit rate, the
+    vertex order inside triangles is preserved. Returns new indices.
+    """
+
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+    numTris = len(indices) // 3
+
+    if numTris == 0:
+        return indices.copy()
+
+    # vertex -> triangles adjacency in CSR layout
+    counts = np.bincount(indices, minlength=vertexCount)
+    offsets = np.zeros(vertexCount + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    adjTris = (np.argsort(indices, kind='stable') // 3).tolist()
+    offsets = offsets.tolist()
+
+    tris = indices.tolist()
+    live = counts.tolist()
+    cacheTime = [0] * vertexCount
+    emitted = [False] * numTris
+    deadEnd = []
+
+    triOrder = []
+
+    time = cacheSize + 1
+    cursor = 0
+
+    fanning = -1
+    while cursor < vertexCount:
+        if live[cursor] > 0:
+            fanning = cursor
+            break
+        cursor += 1
+
+    while fanning >= 0:
+        candidates = []
+
+        # emit all remaining triangles around the fanning vertex
+        for k in range(offsets[fanning], offsets[fanning + 1]):
+            t = adjTris[k]
+            if emitted[t]:
+                continue
+
+            emitted[t] = True
+            triOrder.append(t)
+
+            for v in tris[t*3 : t*3 + 3]:
+                deadEnd.append(v)
+                candidates.append(v)
+                live[v] -= 1
+
+                if time - cacheTime[v] > cacheSize:
+                    cacheTime[v] = time
+                    time += 1
+
+        # prefer vertices which will still be in the cache after fanning
+        fanning = -1
+        bestPriority = -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = 0
+                if time - cacheTime[v] + 2 * live[v] <= cacheSize:
+                    priority = time - cacheTime[v]
+
+                if priority > bestPriority:
+                    bestPriority = priority
+                    fanning = v
+
+        if fanning >= 0:
+            continue
+
+        # dead end, try recently used vertices first, then the next unprocessed one
+        while deadEnd:
+            v = deadEnd.pop()
+            if live[v] > 0:
+                fanning = v
+                break
+
+        if fanning < 0:
+            while cursor < vertexCount:
+                if live[cursor] > 0:
+                    fanning = cursor
+                    break
+                cursor += 1
+
+    return indices.reshape(-1, 3)[triOrder].reshape(-1)
+
+def simulateCacheMisses(indices, cacheSize=VERTEX_CACHE_SIZE):
+    """
+    Simulate a FIFO vertex cache, returns the number of misses per triangle.
+    """
+
+    tris = np.asarray(indices, dtype=np.int64).reshape(-1).tolist()
+
+    cacheTime = {}
+    time = cacheSize + 1
+
+    misses = []
+    for i in range(0, len(tris), 3):
+        triMisses = 0
+        for v in tris[i : i + 3]:
+            if time - cacheTime.get(v, 0) > cacheSize:
+                cacheTime[v] = time
+                time += 1
+                triMisses += 1
+        misses.append(triMisses)
+
+    return misses
+
+def optimizeOverdraw(indices, positions, vertexCount, threshold=OVERDRAW_THRESHOLD,
+        cacheSize=VERTEX_CACHE_SIZE):
+    """
+    Reorder clusters of cache-optimized triangles so that outer front-facing
+    clusters are drawn first. Clusters are split where the cache efficiency
+    allows, so the vertex cache hit rate degrades by the threshold at most.
+    """
+
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+    numTris = len(indices) // 3
+
+    if numTris < 2:
+        return indices.copy()
+
+    misses = simulateCacheMisses(indices, cacheSize)
+
+    # hard boundaries: triangles missing all of their vertices
+    hardStarts = [i for i in range(numTris) if misses[i] == 3]
+    if not hardStarts or hardStarts[0] != 0:
+        hardStarts.insert(0, 0)
+    hardStarts.append(numTris)
+
+    # soft boundaries: split hard clusters once their running ACMR is good
+    # enough, every cluster is simulated with an empty cache as it can be
+    # drawn after any other cluster
+    tris = indices.reshape(-1, 3)
+    triList = indices.tolist()
+
+    starts = []
+    for start, end in zip(hardStarts[:-1], hardStarts[1:]):
+        clusterMisses = simulateCacheMisses(tris[start:end], cacheSize)
+        clusterThreshold = threshold * sum(clusterMisses) / (end - start)
+
+        starts.append(start)
+
+        cacheTime = {}
+        time = cacheSize + 1
+        runningMisses = 0
+        runningTris = 0
+
+        for i in range(start, end - 1):
+            for v in triList[i*3 : i*3 + 3]:
+                if time - cacheTime.get(v, 0) > cacheSize:
+                    cacheTime[v] = time
+                    time += 1
+                    runningMisses += 1
+            runningTris += 1
+
+            if runningMisses <= clusterThreshold * runningTris:
+                starts.append(i + 1)
+
+                cacheTime = {}
+                runningMisses = 0
+                runningTris = 0
+
+    starts = np.array(starts, dtype=np.int64)
+
+    pos = np.asarray(positions, dtype=np.float64).reshape(vertexCount, 3)
+    v0 = pos[tris[:, 0]]
+    v1 = pos[tris[:, 1]]
+    v2 = pos[tris[:, 2]]
+
+    # area weighted normals and centroids
+    normals = np.cross(v1 - v0, v2 - v0)
+    areas = np.linalg.norm(normals, axis=1)
+    centroids = (v0 + v1 + v2) / 3
+
+    totalArea = areas.sum()
+    if totalArea > 0:
+        meshCentroid = (centroids * areas[:, np.newaxis]).sum(axis=0) / totalArea
+    else:
+        meshCentroid = centroids.mean(axis=0)
+
+    clusterNormals = np.add.reduceat(normals, starts)
+    clusterAreas = np.add.reduceat(areas, starts)
+    clusterCentroids = np.add.reduceat(centroids * areas[:, np.newaxis], starts)
+
+    np.divide(clusterCentroids, clusterAreas[:, np.newaxis], out=clusterCentroids,
+            where=clusterAreas[:, np.newaxis] > 0)
+    clusterNormLen = np.linalg.norm(clusterNormals, axis=1, keepdims=True)
+    np.divide(clusterNormals, clusterNormLen, out=clusterNormals, where=clusterNormLen > 0)
+
+    sortKeys = np.einsum('ij,ij->i', clusterCentroids - meshCentroid, clusterNormals)
+
+    clusterOrder = np.argsort(-sortKeys, kind='stable')
+
+    ends = np.append(starts[1:], numTris)
+    triOrder = np.concatenate([np.arange(starts[c], ends[c]) for c in clusterOrder])
+
+    return tris[triOrder].reshape(-1)
+
+def optimizeVertexFetchRemap(indices, vertexCount):
+    """
+    Calculate the vertex order in which vertices are first referenced by the
+    indices. Returns new -> old vertex table, unused vertices are dropped.
+    """
+
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+
+    used, firstPos = np.unique(indices, return_index=True)
+
+    return used[np.argsort(firstPos)]
+
+def calcQuadrics(positions, tris, vertexCount):
+    """
+    Accumulate area weighted plane quadrics of the triangles for each vertex.
+    Returns (vertexCount, 11) array: symmetric 3x3 matrix (6 values), vector
+    (3 values), constant and total area.
+    """
+
+    v0 = positions[tris[:, 0]]
+    v1 = positions[tris[:, 1]]
+    v2 = positions[tris[:, 2]]
+
+    normals = np.cross(v1 - v0, v2 - v0)
+    areas = np.linalg.norm(normals, axis=1)
+    np.divide(normals, areas[:, np.newaxis], out=normals, where=areas[:, np.newaxis] > 0)
+    areas *= 0.5
+
+    nx, ny, nz = normals.T
+    d = -np.einsum('ij,ij->i', normals, v0)
+
+    planeQuadrics = np.stack((nx*nx, nx*ny, nx*nz, ny*ny, ny*nz, nz*nz,
+            nx*d, ny*d, nz*d, d*d, np.ones(len(tris))), axis=1) * areas[:, np.newaxis]
+
+    quadrics = np.zeros((vertexCount, 11), dtype=np.float64)
+    for corner in range(3):
+        for i in range(11):
+            quadrics[:, i] += np.bincount(tris[:, corner], weights=planeQuadrics[:, i],
+                    minlength=vertexCount)
+
+    return quadrics
+
+def evalQuadrics(quadrics, positions):
+    """
+    Mean squared distance from the positions to the planes of the quadrics.
+    """
+
+    x, y, z = positions.T
+    q = quadrics.T
+
+    error = (q[0]*x*x + 2*q[1]*x*y + 2*q[2]*x*z + q[3]*y*y + 2*q[4]*y*z + q[5]*z*z
+            + 2*(q[6]*x + q[7]*y + q[8]*z) + q[9])
+
+    return np.abs(error) / np.maximum(q[10], 1e-30)
+
+def findFlippingCollapses(positions, tris, collapseSrc, collapseDst,
+        chunkSize=SIMPLIFY_CHUNK_SIZE):
+    """
+    Check whether moving collapseSrc vertices to collapseDst flips (or
+    significantly rotates) any of the remaining triangles around them.
+    """
+
+    numVerts = len(positions)
+
+    # vertex -> triangle corners adjacency in CSR layout
+    corners = tris.reshape(-1)
+    cornerOrder = np.argsort(corners, kind='stable')
+    counts = np.bincount(corners, minlength=numVerts)
+    offsets = np.zeros(numVerts + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    flipping = np.zeros(len(collapseSrc), dtype=bool)
+
+    for chunkStart in range(0, len(collapseSrc), chunkSize):
+        src = collapseSrc[chunkStart : chunkStart + chunkSize]
+        dst = collapseDst[chunkStart : chunkStart + chunkSize]
+
+        # expand collapses to (collapse, triangle corner) pairs
+        srcCounts = counts[src]
+        rows = np.repeat(np.arange(len(src)), srcCounts)
+        rowStarts = np.repeat(np.cumsum(srcCounts) - srcCounts, srcCounts)
+        cornerIdx = cornerOrder[offsets[src][rows] + np.arange(len(rows)) - rowStarts]
+
+        tri = tris[cornerIdx // 3]
+        newTri = tri.copy()
+        newTri[np.arange(len(rows)), cornerIdx % 3] = dst[rows]
+
+        # triangles having both vertices are collapsed
+        remaining = ~(tri == dst[rows][:, np.newaxis]).any(axis=1)
+
+        def triNormals(t):
+            p0 = positions[t[:, 0]]
+            return np.cross(positions[t[:, 1]] - p0, positions[t[:, 2]] - p0)
+
+        nOld = triNormals(tri)
+        nNew = triNormals(newTri)
+
+        flipped = remaining & (np.einsum('ij,ij->i', nOld, nNew) <=
+                0.25 * np.linalg.norm(nOld, axis=1) * np.linalg.norm(nNew, axis=1))
+
+        flipping[chunkStart : chunkStart + chunkSize] = np.bincount(rows,
+                weights=flipped, minlength=len(src)) > 0
+
+    return flipping
+
+def simplifyMesh(indices, positions, vertexCount, targetIndexCount,
+        targetError=SIMPLIFY_TARGET_ERROR):
+    """
+    Reduce the number of triangles with quadric error guided edge collapses.
+    Vertices are collapsed onto their neighbors, so all vertex attributes stay
+    valid. Vertices on borders and attribute seams (UV/normal splits, material
+    boundaries) are never moved, collapses flipping triangles are rejected.
+    The error limit is relative to the mesh extent. Returns new indices
+    referencing the same vertices.
+    """
+
+    tris = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    pos = np.asarray(positions, dtype=np.float64).reshape(vertexCount, 3)
+
+    if len(tris) * 3 <= targetIndexCount:
+        return tris.reshape(-1)
+
+    # weld vertices by position, the topology is processed on welded
+    # positions, vertices split by attributes (wedges) are seams
+    uniquePos, posIds = np.unique(pos, axis=0, return_inverse=True)
+    posIds = posIds.reshape(-1)
+    numPos = len(uniquePos)
+
+    wedgeCounts = np.bincount(posIds, minlength=numPos)
+    posVertex = np.empty(numPos, dtype=np.int64)
+    posVertex[posIds] = np.arange(vertexCount)
+
+    extent = np.ptp(uniquePos, axis=0).max()
+    if extent <= 0:
+        return tris.reshape(-1)
+
+    maxError = (targetError * extent) ** 2
+
+    quadrics = calcQuadrics(uniquePos, posIds[tris], numPos)
+
+    while len(tris) * 3 > targetIndexCount:
+        ptris = posIds[tris]
+
+        # edges not shared by exactly 2 triangles are borders or non-manifold
+        edges = np.concatenate((ptris[:, [0, 1]], ptris[:, [1, 2]], ptris[:, [2, 0]]))
+        edgeKeys = np.minimum(edges[:, 0], edges[:, 1]) * numPos + np.maximum(edges[:, 0], edges[:, 1])
+        _, edgeInv, edgeCounts = np.unique(edgeKeys, return_inverse=True, return_counts=True)
+        edgeInv = edgeInv.reshape(-1)
+
+        locked = wedgeCounts > 1
+        border = edgeCounts[edgeInv] != 2
+        locked[edges[border, 0]] = True
+        locked[edges[border, 1]] = True
+
+        # candidate collapses src -> dst, both directions of each edge
+        src = np.concatenate([ptris[:, i] for i in (0, 1, 2, 1, 2, 0)])
+        dst = np.concatenate([ptris[:, i] for i in (1, 2, 0, 0, 1, 2)])
+        dstVert = np.concatenate([tris[:, i] for i in (1, 2, 0, 0, 1, 2)])
+
+        movable = ~locked[src]
+        src = src[movable]
+        dst = dst[movable]
+        dstVert = dstVert[movable]
+
+        if not len(src):
+            break
+
+        _, first, inv = np.unique(src * numPos + dst, return_index=True, return_inverse=True)
+        inv = inv.reshape(-1)
+
+        # the destination vertex must be the same in all triangles of the edge
+        minVert = np.full(len(first), np.iinfo(np.int64).max, dtype=np.int64)
+        maxVert = np.full(len(first), -1, dtype=np.int64)
+        np.minimum.at(minVert, inv, dstVert)
+        np.maximum.at(maxVert, inv, dstVert)
+        consistent = minVert == maxVert
+
+        cSrc = src[first][consistent]
+        cDst = dst[first][consistent]
+        cVert = dstVert[first][consistent]
+
+        cError = evalQuadrics(quadrics[cSrc] + quadrics[cDst], uniquePos[cDst])
+
+        valid = cError <= maxError
+        cSrc, cDst, cVert, cError = cSrc[valid], cDst[valid], cVert[valid], cError[valid]
+
+        valid = ~findFlippingCollapses(uniquePos, ptris, cSrc, cDst)
+        cSrc, cDst, cVert, cError = cSrc[valid], cDst[valid], cVert[valid], cError[valid]
+
+        if not len(cSrc):
+            break
+
+        # the cheapest collapse for each vertex, then all of them sorted by error
+        best = np.lexsort((cError, cSrc))
+        best = best[np.concatenate(([True], cSrc[best][1:] != cSrc[best][:-1]))]
+        best = best[np.argsort(cError[best], kind='stable')]
+
+        # triangles removed by each collapse
+        edgeTriCounts = dict(zip(edgeKeys.tolist(), edgeCounts[edgeInv].tolist()))
+
+        # vertex -> triangles adjacency, for locking one-rings of collapsed vertices
+        corners = ptris.reshape(-1)
+        cornerOrder = (np.argsort(corners, kind='stable') // 3).tolist()
+        offsets = np.zeros(numPos + 1, dtype=np.int64)
+        np.cumsum(np.bincount(corners, minlength=numPos), out=offsets[1:])
+        offsets = offsets.tolist()
+        ptriList = ptris.tolist()
+
+        passLocked = [False] * numPos
+        triCount = len(tris)
+        targetTriCount = targetIndexCount // 3
+
+        selSrc = []
+        selDst = []
+        selVert = []
+
+        for c in best.tolist():
+            if triCount <= targetTriCount:
+                break
+
+            s = int(cSrc[c])
+            d = int(cDst[c])
+
+            if passLocked[s] or passLocked[d]:
+                continue
+
+            # triangles around the collapsed vertex stay intact during the pass
+            for k in range(offsets[s], offsets[s + 1]):
+                for v in ptriList[cornerOrder[k]]:
+                    passLocked[v] = True
+
+            selSrc.append(s)
+            selDst.append(d)
+            selVert.append(int(cVert[c]))
+
+            triCount -= edgeTriCounts[min(s, d) * numPos + max(s, d)]
+
+        if not selSrc:
+            break
+
+        selSrc = np.array(selSrc, dtype=np.int64)
+        selDst = np.array(selDst, dtype=np.int64)
+
+        quadrics[selDst] += quadrics[selSrc]
+
+        vertRemap = np.arange(vertexCount, dtype=np.int64)
+        vertRemap[posVertex[selSrc]] = selVert
+
+        tris = vertRemap[tris]
+
+        ptris = posIds[tris]
+        degenerate = ((ptris[:, 0] == ptris[:, 1]) | (ptris[:, 1] == ptris[:, 2]) |
+                (ptris[:, 2] == ptris[:, 0]))
+        tris = tris[~degenerate]
+
+    return tris.reshape(-1)
+
+
+def normalizeVecs(vectors):
+    """
+    Normalize (N, 3) vectors in place, zero-length vectors are kept as is.
+    """
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms != 0)
+
+def rotationDifference(vecsFrom, vecsTo):
+    """
+    Batched mathutils.Vector.rotation_difference(), returns (N, 4) quaternions
+    (w, x, y, z) rotating vecsFrom onto vecsTo.
+    """
+
+    vecsFrom = np.array(vecsFrom, dtype=np.float64)
+    vecsTo = np.array(vecsTo, dtype=np.float64)
+    normalizeVecs(vecsFrom)
+    normalizeVecs(vecsTo)
+
+    axes = np.cross(vecsFrom, vecsTo)
+    axesLen = np.linalg.norm(axes, axis=1)
+    dots = np.einsum('ij,ij->i', vecsFrom, vecsTo)
+
+    # angle_normalized_v3v3(), stable for both small and obtuse angles
+    angles = np.where(dots >= 0,
+            2 * np.arcsin(np.clip(np.linalg.norm(vecsFrom - vecsTo, axis=1) / 2, -1, 1)),
+            np.pi - 2 * np.arcsin(np.clip(np.linalg.norm(vecsFrom + vecsTo, axis=1) / 2, -1, 1)))
+
+    # degenerate case: colinear vectors, zero or 180 degree rotation around
+    # an orthogonal axis (ortho_v3_v3())
+    colinear = axesLen <= np.finfo(np.float32).eps
+    opposed = colinear & (dots <= 0)
+
+    vecsOpp = vecsFrom[opposed]
+    absOpp = np.abs(vecsOpp)
+    dominant = np.where(absOpp[:, 0] > absOpp[:, 1],
+            np.where(absOpp[:, 0] > absOpp[:, 2], 0, 2),
+            np.where(absOpp[:, 1] > absOpp[:, 2], 1, 2))
+    x, y, z = vecsOpp[:, 0], vecsOpp[:, 1], vecsOpp[:, 2]
+    orthoAxes = np.select([dominant[:, np.newaxis] == 0, dominant[:, np.newaxis] == 1],
+            [np.stack((-y - z, x, x), axis=1), np.stack((y, -x - z, y), axis=1)],
+            np.stack((z, z, -x - y), axis=1))
+
+    axes[opposed] = orthoAxes
+    angles[opposed] = np.pi
+    normalizeVecs(axes)
+
+    quats = np.empty((len(axes), 4), dtype=np.float64)
+    quats[:, 0] = np.cos(angles / 2)
+    quats[:, 1:] = axes * np.sin(angles / 2)[:, np.newaxis]
+
+    # identity for same direction vectors and zero-length axes
+    identity = (colinear & ~opposed) | ~quats[:, 1:].any(axis=1)
+    quats[identity] = (1, 0, 0, 0)
+
+    return quats
+
+def rotateVecs(quats, vecs):
+    """
+    Batched mathutils.Vector.rotate() with (N, 4) quaternions (w, x, y, z).
+    """
+
+    w = quats[:, 0, np.newaxis]
+    u = quats[:, 1:]
+    uv = np.cross(u, vecs)
+    return vecs + 2 * (w * uv + np.cross(u, uv))
@@ -0,0 +1,98 @@
+"""
+Tests for the mesh cache storage format.
+"""
+
+import os, pickle, shutil, sys, tempfile, unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+
+from pluginUtils.cache import FileCache, CACHE_HEADER_NAME
+
+
+class PickleProbe():
+    loaded = False
+
+    def __reduce__(self):
+        return (setattr, (PickleProbe, 'loaded', True))
+
+
+class TestFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dirPath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirPath)
+
+    def testRoundTrip(self):
+        primitives = [{
+            'attributes': {
+                'POSITION': np.arange(9, dtype=np.float32),
+                'JOINTS_0': np.arange(4, dtype=np.uint16)
+            },
+            'indices': np.arange(3, dtype=np.uint32),
+            'max_index': np.uint32(2),
+            'useNodeAttrs': False,
+            'material': 'Material'
+        }]
+
+        FileCache(self.dirPath).put('key', primitives)
+        cached = FileCache(self.dirPath).get('key')
+
+        self.assertEqual(cached[0]['material'], 'Material')
+        self.assertEqual(cached[0]['max_index'], 2)
+        self.assertIs(cached[0]['useNodeAttrs'], False)
+        for name, data in primitives[0]['attributes'].items():
+            self.assertEqual(cached[0]['attributes'][name].dtype, data.dtype)
+            np.testing.assert_array_equal(cached[0]['attributes'][name], data)
+
+    def testMissing(self):
+        self.assertIsNone(FileCache(self.dirPath).get('key'))
+
+    def testPickledEntryIsNotLoaded(self):
+        with open(os.path.join(self.dirPath, 'key.npz'), 'wb') as f:
+            np.savez(f, **{
+                CACHE_HEADER_NAME: np.frombuffer(b'{"version": 2, "value": {"array": "a0"}}', dtype=np.uint8),
+                'a0': np.array([PickleProbe()], dtype=object)
+            })
+
+        self.assertIsNone(FileCache(self.dirPath).get('key'))
+        self.assertFalse(PickleProbe.loaded)
+
+    def testPrune(self):
+        cache = FileCache(self.dirPath)
+        cache.put('used', [np.zeros(3)])
+        FileCache(self.dirPath).put('unused', [np.zeros(3)])
+
+        with open(os.path.join(self.dirPath, 'legacy.pkl'), 'wb') as f:
+            pickle.dump(None, f)
+
+        cache.prune()
+
+        self.assertEqual(os.listdir(self.dirPath), ['used.npz'])
+
+    def testMarkUsed(self):
+        FileCache(self.dirPath).put('reused', [np.zeros(3)])
+        FileCache(self.dirPath).put('unused', [np.zeros(3)])
+
+        cache = FileCache(self.dirPath)
+        self.assertTrue(cache.markUsed('reused'))
+        self.assertFalse(cache.markUsed('missing'))
+        cache.prune()
+
+        self.assertEqual(os.listdir(self.dirPath), ['reused.npz'])
+
+    def testKeepUnused(self):
+        FileCache(self.dirPath).put('unused', [np.zeros(3)])
+
+        cache = FileCache(self.dirPath)
+        cache.keepUnused()
+        cache.prune()
+
+        self.assertEqual(os.listdir(self.dirPath), ['unused.npz'])
+
+
+if __name__ == '__main__':
+    unittest.main()
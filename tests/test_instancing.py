@@ -0,0 +1,86 @@
+"""
+Tests for EXT_mesh_gpu_instancing node merging. They export scenes through
+the add-on's operator, so they only run inside Blender with the add-on enabled:
+
+    blender -b --python-expr "import sys, unittest; sys.exit(not unittest.main(module='test_instancing', argv=['t'], exit=False).result.wasSuccessful())"
+
+(run from the tests directory) and are skipped otherwise.
+"""
+
+import json, os, shutil, tempfile, unittest
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+
+def exporterAvailable():
+    return bpy is not None and hasattr(bpy.types, 'EXPORT_SCENE_OT_v3d_gltf')
+
+
+@unittest.skipUnless(exporterAvailable(), 'requires Blender with the Verge3D add-on enabled')
+class TestInstancingScenes(unittest.TestCase):
+
+    def setUp(self):
+        bpy.ops.wm.read_homefile(use_empty=True)
+        self.dirPath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirPath)
+
+    def export(self):
+        filepath = os.path.join(self.dirPath, 'instancing.gltf')
+        bpy.ops.export_scene.v3d_gltf(filepath=filepath)
+
+        with open(filepath) as f:
+            return json.load(f)
+
+    def countSceneInstances(self, glTF, scene):
+        """
+        Number of mesh instances reachable from the scene's root nodes.
+        """
+
+        count = 0
+
+        stack = list(scene.get('nodes', []))
+        while stack:
+            node = glTF['nodes'][stack.pop()]
+            stack.extend(node.get('children', []))
+
+            if 'mesh' in node:
+                instancing = node.get('extensions', {}).get('EXT_mesh_gpu_instancing')
+                if instancing is not None:
+                    accessor = instancing['attributes']['TRANSLATION']
+                    count += glTF['accessors'][accessor]['count']
+                else:
+                    count += 1
+
+        return count
+
+    def testSharedMeshInTwoScenes(self):
+        mesh = bpy.data.meshes.new('Shared')
+        mesh.from_pydata([(0, 0, 0), (1, 0, 0), (0, 1, 0)], [], [(0, 1, 2)])
+
+        sceneA = bpy.data.scenes[0]
+        sceneB = bpy.data.scenes.new('SceneB')
+
+        for bl_scene, names in [(sceneA, ['A1', 'A2', 'A3']), (sceneB, ['B1', 'B2'])]:
+            for i, name in enumerate(names):
+                bl_obj = bpy.data.objects.new(name, mesh)
+                bl_obj.location.x = 2 * i
+                bl_scene.collection.objects.link(bl_obj)
+
+        sceneA.v3d_export.gpu_instancing = True
+
+        glTF = self.export()
+
+        self.assertIn('EXT_mesh_gpu_instancing', glTF.get('extensionsUsed', []))
+
+        scenes = {scene['name']: scene for scene in glTF['scenes']}
+        self.assertEqual(self.countSceneInstances(glTF, scenes[sceneA.name]), 3)
+        self.assertEqual(self.countSceneInstances(glTF, scenes[sceneB.name]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+"""
+Tests for the mesh processing routines. The batched morph tangent rotation
+helpers are compared with a scalar port of the Blender routines previously
+called per vertex: Vector.rotation_difference() (rotation_between_vecs_to_quat())
+and Vector.rotate() (mul_qt_v3()).
+"""
+
+import math, os, sys, unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+
+from pluginUtils.meshproc import rotationDifference, rotateVecs, simplifyMesh
+
+FLT_EPSILON = 1.1920928955078125e-07
+
+
+def normalize(v):
+    length = math.sqrt(v[0] * v[0] + v[1] * v[1] + v[2] * v[2])
+    if length == 0:
+        return list(v), 0.0
+    return [c / length for c in v], length
+
+def dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+def cross(a, b):
+    return [a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0]]
+
+def angleNormalized(v1, v2):
+    # angle_normalized_v3v3()
+    if dot(v1, v2) >= 0:
+        return 2 * math.asin(min(math.dist(v1, v2) / 2, 1))
+    else:
+        return math.pi - 2 * math.asin(min(math.dist(v1, [-c for c in v2]) / 2, 1))
+
+def orthoAxis(v):
+    # ortho_v3_v3()
+    x, y, z = abs(v[0]), abs(v[1]), abs(v[2])
+    axis = (0 if x > z else 2) if x > y else (1 if y > z else 2)
+    if axis == 0:
+        return [-v[1] - v[2], v[0], v[0]]
+    elif axis == 1:
+        return [v[1], -v[0] - v[2], v[1]]
+    else:
+        return [v[2], v[2], -v[0] - v[1]]
+
+def axisAngleToQuat(axis, angle):
+    axis, length = normalize(axis)
+    if length == 0:
+        return [1.0, 0.0, 0.0, 0.0]
+    s = math.sin(angle / 2)
+    return [math.cos(angle / 2), axis[0] * s, axis[1] * s, axis[2] * s]
+
+def scalarRotationDifference(vFrom, vTo):
+    vFrom = normalize(vFrom)[0]
+    vTo = normalize(vTo)[0]
+
+    axis, length = normalize(cross(vFrom, vTo))
+    if length > FLT_EPSILON:
+        return axisAngleToQuat(axis, angleNormalized(vFrom, vTo))
+    elif dot(vFrom, vTo) > 0:
+        return [1.0, 0.0, 0.0, 0.0]
+    else:
+        return axisAngleToQuat(orthoAxis(vFrom), math.pi)
+
+def scalarRotate(q, v):
+    w, u = q[0], q[1:]
+    uv = cross(u, v)
+    uuv = cross(u, uv)
+    return [v[i] + 2 * (w * uv[i] + uuv[i]) for i in range(3)]
+
+
+class TestMorphTangentRotation(unittest.TestCase):
+
+    def checkAgainstScalar(self, vecsFrom, vecsTo, vecs):
+        quats = rotationDifference(vecsFrom, vecsTo)
+        rotated = rotateVecs(quats, np.array(vecs, dtype=np.float64))
+
+        for i in range(len(vecsFrom)):
+            q = scalarRotationDifference(vecsFrom[i], vecsTo[i])
+            np.testing.assert_allclose(quats[i], q, atol=1e-6)
+            np.testing.assert_allclose(rotated[i], scalarRotate(q, vecs[i]), atol=1e-6)
+
+    def testRandom(self):
+        rng = np.random.default_rng(0)
+        vecsFrom = rng.normal(size=(1000, 3))
+        vecsTo = rng.normal(size=(1000, 3))
+        vecs = rng.normal(size=(1000, 3))
+
+        self.checkAgainstScalar(vecsFrom, vecsTo, vecs)
+
+    def testSmallAngles(self):
+        # normals slightly displaced by shape keys
+        rng = np.random.default_rng(1)
+        vecsTo = rng.normal(size=(200, 3))
+        vecsFrom = vecsTo + rng.normal(scale=1e-3, size=(200, 3))
+        vecs = rng.normal(size=(200, 3))
+
+        self.checkAgainstScalar(vecsFrom, vecsTo, vecs)
+
+    def testParallel(self):
+        rng = np.random.default_rng(2)
+        vecsFrom = np.vstack((rng.normal(size=(50, 3)), np.eye(3)))
+        vecsTo = vecsFrom * rng.uniform(0.1, 10, size=(53, 1))
+        vecs = rng.normal(size=(53, 3))
+
+        self.checkAgainstScalar(vecsFrom, vecsTo, vecs)
+
+        quats = rotationDifference(vecsFrom, vecsTo)
+        np.testing.assert_allclose(rotateVecs(quats, vecs), vecs, atol=1e-6)
+
+    def testOpposed(self):
+        rng = np.random.default_rng(3)
+        # cover all dominant axis branches of ortho_v3_v3()
+        vecsFrom = np.vstack((rng.normal(size=(50, 3)), np.eye(3), -np.eye(3),
+                [[1, 1, 1], [1, 2, 2], [2, 2, 1]]))
+        vecsTo = -vecsFrom * rng.uniform(0.1, 10, size=(len(vecsFrom), 1))
+        vecs = rng.normal(size=(len(vecsFrom), 3))
+
+        self.checkAgainstScalar(vecsFrom, vecsTo, vecs)
+
+        # opposed vectors are rotated onto each other
+        quats = rotationDifference(vecsFrom, vecsTo)
+        fromNorm = vecsFrom / np.linalg.norm(vecsFrom, axis=1, keepdims=True)
+        np.testing.assert_allclose(rotateVecs(quats, fromNorm), -fromNorm, atol=1e-6)
+
+    def testZeroLength(self):
+        vecsFrom = np.array([[0, 0, 0], [1, 0, 0]], dtype=np.float64)
+        vecsTo = np.array([[1, 0, 0], [0, 0, 0]], dtype=np.float64)
+        vecs = np.array([[0, 1, 0], [0, 0, 1]], dtype=np.float64)
+
+        self.checkAgainstScalar(vecsFrom, vecsTo, vecs)
+
+
+def flatGrid(size):
+    """
+    Flat size x size quad grid in the XY plane, triangles face +Z.
+    """
+
+    xs, ys = np.meshgrid(np.arange(size + 1), np.arange(size + 1))
+    positions = np.stack((xs.ravel(), ys.ravel(), np.zeros(xs.size)), axis=1).astype(np.float32)
+
+    v = np.arange((size + 1) * (size + 1)).reshape(size + 1, size + 1)
+    v00, v10, v01, v11 = v[:-1, :-1], v[:-1, 1:], v[1:, :-1], v[1:, 1:]
+    tris = np.concatenate((np.stack((v00, v10, v11), axis=-1).reshape(-1, 3),
+                           np.stack((v00, v11, v01), axis=-1).reshape(-1, 3)))
+
+    return tris.reshape(-1).astype(np.uint32), positions
+
+
+class TestSimplifyMesh(unittest.TestCase):
+
+    def testFlatGridKeepsOrientation(self):
+        indices, positions = flatGrid(100)
+
+        for ratio in [1 / 2, 1 / 4, 1 / 10]:
+            targetIndexCount = int(len(indices) * ratio) // 3 * 3
+            result = simplifyMesh(indices, positions, len(positions), targetIndexCount)
+
+            self.assertLess(len(result), len(indices))
+
+            tris = positions[result.reshape(-1, 3)].astype(np.float64)
+            normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+
+            # neither inverted nor zero-area triangles
+            self.assertTrue((normals[:, 2] > 0).all(), 'ratio {}'.format(ratio))
+
+
+if __name__ == '__main__':
+    unittest.main()
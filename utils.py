@@ -283,45 +283,123 @@ def objAddTriModifier(obj):
     if bpy.app.version < (4, 2, 0):
         mod.keep_custom_normals = True
 
-def objApplyModifiers(obj):
+def objsApplyModifiers(objs):
     """
-    Creates a new mesh from applying modifiers to the mesh of the given object.
-    Assignes the newly created mesh to the given object. The old mesh's user
-    count will be decreased by 1.
+    Creates new meshes from applying modifiers to the meshes of the given
+    objects. Assignes the newly created meshes to the objects. The old meshes'
+    user counts will be decreased by 1. All objects are evaluated with a single
+    view layer update.
     """
 
+    if not objs:
+        return
+
     dg = bpy.context.evaluated_depsgraph_get()
 
-    need_linking = dg.scene.collection.objects.find(obj.name) == -1
-    need_showing = obj.hide_viewport
+    scene_objs = dg.scene.collection.objects
+    scene_obj_names = set(scene_objs.keys())
+
+    linked_objs = []
+    shown_objs = []
 
-    # NOTE: link the object if it's not in the 'Master Collection' and update
-    # the view layer to make the depsgraph able to apply modifiers to the object
-    if need_linking:
-        dg.scene.collection.objects.link(obj)
+    for obj in objs:
+        # NOTE: link the object if it's not in the 'Master Collection' and update
+        # the view layer to make the depsgraph able to apply modifiers to the object
+        if obj.name not in scene_obj_names:
+            scene_objs.link(obj)
+            linked_objs.append(obj)
 
-    obj.update_tag()
+        obj.update_tag()
 
-    # a hidden object doesn't get its modifiers applied, need to make it visible
-    # before updating the view layer
-    if need_showing:
-        obj.hide_viewport = False
+        # a hidden object doesn't get its modifiers applied, need to make it visible
+        # before updating the view layer
+        if obj.hide_viewport:
+            obj.hide_viewport = False
+            shown_objs.append(obj)
 
     bpy.context.view_layer.update()
 
     # NOTE: some modifiers can remove UV layers from an object after applying
     # (e.g. Skin), which is a consistent behavior regarding uv usage in the
     # viewport (e.g. degenerate tangent space in the Normal Map node)
-    obj_eval = obj.evaluated_get(dg)
+    new_meshes = [bpy.data.meshes.new_from_object(obj.evaluated_get(dg),
+            preserve_all_data_layers=True, depsgraph=dg) for obj in objs]
+
+    # assign meshes only after all objects are evaluated, as this tags the
+    # depsgraph for update
+    for obj, mesh in zip(objs, new_meshes):
+        obj.data = mesh
+        obj.modifiers.clear()
+
+    for obj in linked_objs:
+        scene_objs.unlink(obj)
+    for obj in shown_objs:
+        obj.hide_viewport = True
 
-    obj.data = bpy.data.meshes.new_from_object(obj_eval,
-            preserve_all_data_layers=True, depsgraph=dg)
-    obj.modifiers.clear()
+def objArmatureModIsIdentity(mod):
+    """
+    Check if an ARMATURE modifier doesn't deform the mesh, i.e. the armature
+    is in its rest pose.
+    """
 
-    if need_linking:
-        dg.scene.collection.objects.unlink(obj)
-    if need_showing:
-        obj.hide_viewport = True
+    bl_arm = mod.object
+    if bl_arm is None or bl_arm.pose is None or bl_arm.data.pose_position == 'REST':
+        return True
+
+    ident = mathutils.Matrix.Identity(4)
+
+    for pose_bone in bl_arm.pose.bones:
+        if pose_bone.matrix_basis != ident or len(pose_bone.constraints):
+            return False
+
+    return True
+
+def objShapeKeysAreLinear(obj):
+    """
+    Check if the evaluated positions of the object depend only on its shape
+    keys, so that shape key positions can be calculated without evaluating
+    the object by depsgraph.
+    """
+
+    shape_keys = obj.data.shape_keys
+
+    if not shape_keys.use_relative or obj.show_only_shape_key:
+        return False
+
+    for mod in obj.modifiers:
+        if not mod.show_viewport:
+            continue
+
+        if mod.type != 'ARMATURE' or not objArmatureModIsIdentity(mod):
+            return False
+
+    return True
+
+def objGetVertexGroupWeights(obj, group_names):
+    """
+    Get per-vertex weights of the given vertex groups, 0 for vertices not in
+    a group. Returns a dict: group name -> float32 array, missing groups are
+    not included.
+    """
+
+    vert_count = len(obj.data.vertices)
+
+    group_indices = {}
+    for name in group_names:
+        bl_group = obj.vertex_groups.get(name)
+        if bl_group is not None:
+            group_indices[bl_group.index] = name
+
+    weights = {name: np.zeros(vert_count, dtype=np.float32) for name in group_indices.values()}
+
+    if group_indices:
+        for vertex in obj.data.vertices:
+            for elem in vertex.groups:
+                name = group_indices.get(elem.group)
+                if name is not None:
+                    weights[name][vertex.index] = elem.weight
+
+    return weights
 
 def objTransferShapeKeys(obj_from, obj_to, depsgraph):
     """
@@ -330,57 +408,116 @@ def objTransferShapeKeys(obj_from, obj_to, depsgraph):
         - obj_to should not have shape keys
         - obj_from (after evaluating) and obj_to should have the same amount of vertices
 
+    Shape key positions are calculated directly from relative key deltas if
+    the object has no deforming modifiers, otherwise each shape key is
+    evaluated by depsgraph.
+
     Returns a boolean flag indicating successful transfer.
     """
 
     if obj_from.data.shape_keys is None:
         return True
 
-    key_blocks_from = obj_from.data.shape_keys.key_blocks
+    shape_keys = obj_from.data.shape_keys
+    reference_key = shape_keys.reference_key
+
+    key_blocks_from = shape_keys.key_blocks
     keys_from = [key for key in key_blocks_from if key != key.relative_key
-            and key != obj_from.data.shape_keys.reference_key]
+            and key != reference_key]
 
     key_names = [key.name for key in keys_from]
     key_values = [key.value for key in keys_from]
 
-    key_positions = []
-    for key in keys_from:
-        key.value = 0
+    vert_count = len(obj_to.data.vertices)
+
+    def getKeyCos(key):
+        cos = np.empty(len(key.data) * 3, dtype=np.float32)
+        key.data.foreach_get('co', cos)
+        return cos.reshape(-1, 3)
 
-    same_vertex_count = True
+    # key -> delta from its relative key, None if the key is muted or has no effect
+    key_deltas = {}
     for key in keys_from:
+        delta = None
+        if not key.mute:
+            delta = getKeyCos(key) - getKeyCos(key.relative_key)
+            if not delta.any():
+                delta = None
+        key_deltas[key.name] = delta
+
+    key_positions = []
+
+    if objShapeKeysAreLinear(obj_from):
+        same_vertex_count = len(reference_key.data) == vert_count
 
-        key.value = 1
-        obj_from.update_tag()
-        bpy.context.view_layer.update()
+        if same_vertex_count:
+            ref_cos = getKeyCos(reference_key)
 
-        verts = obj_from.evaluated_get(depsgraph).data.vertices
-        if len(verts) != len(obj_to.data.vertices):
-            same_vertex_count = False
-            break
+            weights = objGetVertexGroupWeights(obj_from,
+                    {key.vertex_group for key in keys_from if key.vertex_group})
 
-        key_pos = [0] * 3 * len(verts)
-        verts.foreach_get('co', key_pos)
-        key_positions.append(key_pos)
-        key.value = 0
+            for key in keys_from:
+                delta = key_deltas[key.name]
+                if delta is None:
+                    key_positions.append(ref_cos)
+                elif key.vertex_group in weights:
+                    key_positions.append(ref_cos + delta * weights[key.vertex_group][:, np.newaxis])
+                else:
+                    key_positions.append(ref_cos + delta)
+
+    else:
+        for key in keys_from:
+            key.value = 0
+
+        def evalPositions():
+            obj_from.update_tag()
+            bpy.context.view_layer.update()
+
+            verts = obj_from.evaluated_get(depsgraph).data.vertices
+            if len(verts) != vert_count:
+                return None
+
+            cos = np.empty(len(verts) * 3, dtype=np.float32)
+            verts.foreach_get('co', cos)
+            return cos.reshape(-1, 3)
+
+        # positions with all keys disabled, used for keys having no effect
+        base_cos = evalPositions()
+        same_vertex_count = base_cos is not None
+
+        if same_vertex_count:
+            for key in keys_from:
+
+                if key_deltas[key.name] is None:
+                    key_positions.append(base_cos)
+                    continue
+
+                key.value = 1
+                key_cos = evalPositions()
+                key.value = 0
+
+                if key_cos is None:
+                    same_vertex_count = False
+                    break
+
+                key_positions.append(key_cos)
+
+        for i in range(len(keys_from)):
+            keys_from[i].value = key_values[i]
 
     if same_vertex_count:
         # basis shape key
-        obj_to.shape_key_add(name=obj_from.data.shape_keys.reference_key.name)
+        obj_to.shape_key_add(name=reference_key.name)
 
-        vert_co = [0] * 3 * len(obj_to.data.vertices)
         for i in range(len(key_names)):
 
             key_block = obj_to.shape_key_add(name=key_names[i])
             key_block.value = key_values[i]
-            key_block.data.foreach_set('co', key_positions[i])
+            key_block.data.foreach_set('co', key_positions[i].reshape(-1))
     else:
         # don't create nothing if vertex count isn't constant
         pass
 
-    for i in range(len(keys_from)):
-        keys_from[i].value = key_values[i]
-
     return same_vertex_count
 
 def meshNeedTangentsForExport(mesh, optimize_tangents):